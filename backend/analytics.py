@@ -0,0 +1,291 @@
+"""
+Workout history analytics: volume, estimated 1RM, PRs and weekly totals.
+
+A user's workouts are flattened once into columnar NumPy arrays with one row per
+completed set, sorted by exercise and date. Every statistic is then computed with
+array operations over those columns (segment sums and maxima with reduceat,
+running bests with accumulate) rather than by looping over workouts in Python.
+
+Exercises are identified by their exercise_id, or by name for workouts saved
+without one. A workout's date is its `date`, falling back to `created_at`; sets
+marked completed: false are ignored.
+"""
+from math import nan
+
+import numpy as np
+
+from rollups import MAX_E1RM_REPS
+
+# Stands in for a set that isn't an object
+_SKIPPED_SET = {'completed': False}
+
+# 1970-01-01 was a Thursday; adding this makes day numbers line up with Monday-based weeks
+_WEEK_OFFSET = 3
+
+
+class History:
+    """Columnar view of a workout history, one row per completed set."""
+
+    def __init__(self, workouts):
+        keys, names, codes = [], [], {}
+        # Per exercise entry: its code, workout index and number of sets
+        entry_codes, entry_workouts, entry_sets = [], [], []
+        workout_days, all_sets = [], []
+
+        for w in workouts:
+            date = w.get('date') or w.get('created_at')
+            workout_days.append(str(date)[:10] if date else 'NaT')
+            for entry in w.get('exercises') or ():
+                if not isinstance(entry, dict):
+                    continue
+                key = entry.get('exercise_id') or entry.get('name')
+                sets = entry.get('sets')
+                if not key or not isinstance(sets, list) or not sets:
+                    continue
+                code = codes.get(key)
+                if code is None:
+                    code = codes[key] = len(keys)
+                    keys.append(key)
+                    names.append(entry.get('name') or key)
+                entry_codes.append(code)
+                entry_workouts.append(len(workout_days) - 1)
+                entry_sets.append(len(sets))
+                all_sets.extend(sets)
+
+        self.keys = keys
+        self.names = names
+        self.workout_days = _days(workout_days)
+
+        if not all(isinstance(s, dict) for s in all_sets):
+            all_sets = [s if isinstance(s, dict) else _SKIPPED_SET for s in all_sets]
+        # One pass per column over every set, so flattening allocates a handful of large lists
+        # rather than many small ones, which would keep triggering garbage collections. Missing
+        # and zero values both become NaN; no statistic tells them apart.
+        reps = _numbers([s.get('reps') or nan for s in all_sets])
+        weight = _numbers([s.get('weight') or nan for s in all_sets])
+        duration = _numbers([s.get('duration') or nan for s in all_sets])
+        completed = np.array([s.get('completed') is not False for s in all_sets], dtype=bool)
+
+        entry_sets = np.array(entry_sets, dtype=np.int64)
+        exercise = np.repeat(np.array(entry_codes, dtype=np.int64), entry_sets)
+        workout = np.repeat(np.array(entry_workouts, dtype=np.int64), entry_sets)
+        # Position of each set within its exercise entry, from 1
+        set_number = np.arange(len(completed)) - np.repeat(np.cumsum(entry_sets) - entry_sets, entry_sets) + 1
+        day = self.workout_days[workout]
+        # Skip sets marked incomplete, and sets of undated workouts, which can't be placed on a curve
+        keep = completed & ~np.isnat(day)
+        order = np.lexsort((day[keep], exercise[keep]))
+
+        self.exercise = exercise[keep][order]
+        self.workout = workout[keep][order]
+        self.day = day[keep][order]
+        self.set_number = set_number[keep][order]
+        self.reps = reps[keep][order]
+        self.weight = weight[keep][order]
+        self.duration = duration[keep][order]
+
+    def __len__(self):
+        return len(self.exercise)
+
+    def volume(self):
+        """Reps × weight per set (0 when either is missing)."""
+        return np.nan_to_num(self.reps) * np.nan_to_num(self.weight)
+
+    def e1rm(self):
+        """Epley estimated one-rep max per set; NaN for sets without weight or with too many reps."""
+        valid = (self.weight > 0) & (self.reps >= 1) & (self.reps <= MAX_E1RM_REPS)
+        estimate = np.where(self.reps == 1, self.weight, self.weight * (1 + self.reps / 30))
+        return np.where(valid, estimate, np.nan)
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return nan
+
+
+def _numbers(values):
+    """Float array of a sequence of values, with anything non-numeric as NaN."""
+    try:
+        return np.fromiter(values, dtype=np.float64, count=len(values))
+    except (TypeError, ValueError):
+        return np.array([_number(v) for v in values], dtype=np.float64)
+
+
+def _days(strings):
+    """Parse YYYY-MM-DD prefixes into datetime64[D], NaT for anything unparseable."""
+    try:
+        return np.array(strings, dtype='datetime64[D]')
+    except ValueError:
+        days = np.empty(len(strings), dtype='datetime64[D]')
+        for i, s in enumerate(strings):
+            try:
+                days[i] = np.datetime64(s, 'D')
+            except ValueError:
+                days[i] = np.datetime64('NaT')
+        return days
+
+
+def _segments(*columns):
+    """Start offsets of runs of equal rows in sorted columns."""
+    if len(columns[0]) == 0:
+        return np.zeros(0, dtype=np.int64)
+    change = np.zeros(len(columns[0]), dtype=bool)
+    change[0] = True
+    for column in columns:
+        change[1:] |= column[1:] != column[:-1]
+    return np.flatnonzero(change)
+
+
+def _segment_max(values, starts):
+    """Max of each segment, ignoring NaN (NaN when a segment has no values)."""
+    if len(starts) == 0:
+        return np.zeros(0)
+    best = np.maximum.reduceat(np.where(np.isnan(values), -np.inf, values), starts)
+    return np.where(np.isneginf(best), np.nan, best)
+
+
+def _running_max(values, starts):
+    """Running max of values within each segment, ignoring NaN. Loops over segments, not values."""
+    best = np.empty_like(values)
+    for start, end in zip(starts.tolist(), np.append(starts[1:], len(values)).tolist()):
+        best[start:end] = np.fmax.accumulate(values[start:end])
+    return best
+
+
+def _round(values, digits=2):
+    """Rounded list of values, with None for NaN."""
+    rounded = np.round(values, digits)
+    missing = np.isnan(rounded)
+    if not missing.any():
+        return rounded.tolist()
+    rounded = rounded.astype(object)
+    rounded[missing] = None
+    return rounded.tolist()
+
+
+def _round_one(value, digits=2):
+    return None if np.isnan(value) else round(float(value), digits)
+
+
+def _dates(days):
+    return days.astype(str).tolist()
+
+
+def weekly_totals(history):
+    """Workouts, sets, reps, volume and set duration per Monday-based week."""
+    workout_days = history.workout_days[~np.isnat(history.workout_days)]
+    if len(workout_days) == 0:
+        return []
+    day_numbers = workout_days.astype(np.int64)
+    weeks, workouts = np.unique(day_numbers - (day_numbers + _WEEK_OFFSET) % 7, return_counts=True)
+
+    set_days = history.day.astype(np.int64)
+    set_weeks = np.searchsorted(weeks, set_days - (set_days + _WEEK_OFFSET) % 7)
+    sets = np.bincount(set_weeks, minlength=len(weeks))
+    reps = np.bincount(set_weeks, np.nan_to_num(history.reps), minlength=len(weeks))
+    volume = np.bincount(set_weeks, history.volume(), minlength=len(weeks))
+    duration = np.bincount(set_weeks, np.nan_to_num(history.duration), minlength=len(weeks))
+
+    return [
+        {'week': week, 'workouts': w, 'sets': s, 'reps': r, 'volume': v, 'duration_seconds': d}
+        for week, w, s, r, v, d in zip(
+            _dates(weeks.astype('datetime64[D]')), workouts.tolist(), sets.tolist(),
+            _round(reps), _round(volume), _round(duration),
+        )
+    ]
+
+
+def exercise_stats(history, exercise_id=None):
+    """Per-exercise totals, per-session curves and PR history, most trained exercise first."""
+    if len(history) == 0:
+        return []
+    volume = history.volume()
+    e1rm = history.e1rm()
+    reps = np.nan_to_num(history.reps)
+    duration = np.nan_to_num(history.duration)
+
+    # Sessions: one per exercise per day
+    starts = _segments(history.exercise, history.day)
+    session_exercise = history.exercise[starts]
+    session_day = history.day[starts]
+    session_sets = np.diff(np.append(starts, len(history)))
+    session_reps = np.add.reduceat(reps, starts)
+    session_volume = np.add.reduceat(volume, starts)
+    session_weight = _segment_max(history.weight, starts)
+    session_e1rm = _segment_max(e1rm, starts)
+
+    # A PR is a session whose best 1RM estimate beats every earlier session of the exercise
+    exercise_starts = _segments(session_exercise)
+    best_so_far = _running_max(session_e1rm, exercise_starts)
+    previous = np.concatenate(([np.nan], best_so_far[:-1]))
+    previous[exercise_starts] = np.nan
+    with np.errstate(invalid='ignore'):
+        is_pr = session_e1rm > previous
+
+    # Exercise totals over their sessions
+    exercise_ends = np.append(exercise_starts[1:], len(session_exercise))
+    totals = {
+        'sets': np.add.reduceat(session_sets, exercise_starts),
+        'reps': np.add.reduceat(session_reps, exercise_starts),
+        'volume': np.add.reduceat(session_volume, exercise_starts),
+        'duration': np.add.reduceat(duration, _segments(history.exercise)),
+        'best_weight': _segment_max(session_weight, exercise_starts),
+        'best_e1rm': _segment_max(session_e1rm, exercise_starts),
+    }
+
+    results = []
+    for i, (start, end) in enumerate(zip(exercise_starts.tolist(), exercise_ends.tolist())):
+        code = session_exercise[start]
+        key = history.keys[code]
+        if exercise_id is not None and key != exercise_id:
+            continue
+        days = _dates(session_day[start:end])
+        pr_index = np.flatnonzero(is_pr[start:end])
+        results.append({
+            'exercise_id': key,
+            'name': history.names[code],
+            'sessions': end - start,
+            'sets': int(totals['sets'][i]),
+            'reps': _round_one(totals['reps'][i]),
+            'volume': _round_one(totals['volume'][i]),
+            'duration_seconds': _round_one(totals['duration'][i]),
+            'best_weight': _round_one(totals['best_weight'][i]),
+            'best_e1rm': _round_one(totals['best_e1rm'][i]),
+            'first_date': days[0],
+            'last_date': days[-1],
+            'curve': {
+                'dates': days,
+                'sets': session_sets[start:end].tolist(),
+                'volume': _round(session_volume[start:end]),
+                'best_weight': _round(session_weight[start:end]),
+                'e1rm': _round(session_e1rm[start:end]),
+            },
+            'prs': [
+                {'date': days[j], 'e1rm': e, 'weight': w}
+                for j, e, w in zip(pr_index.tolist(), _round(session_e1rm[start:end][pr_index]),
+                                   _round(session_weight[start:end][pr_index]))
+            ],
+        })
+    results.sort(key=lambda entry: (-entry['sets'], entry['name']))
+    return results
+
+
+def user_stats(workouts, exercise_id=None):
+    """Analytics for one user's workouts: totals, per-exercise curves and PRs, and weekly totals."""
+    history = History(workouts)
+    dated = history.workout_days[~np.isnat(history.workout_days)]
+    return {
+        'workouts': len(history.workout_days),
+        'first_date': str(dated.min()) if len(dated) else None,
+        'last_date': str(dated.max()) if len(dated) else None,
+        'totals': {
+            'sets': len(history),
+            'reps': _round_one(np.nansum(history.reps)),
+            'volume': _round_one(history.volume().sum()),
+            'duration_seconds': _round_one(np.nansum(history.duration)),
+        },
+        'exercises': exercise_stats(history, exercise_id),
+        'weekly': weekly_totals(history),
+    }
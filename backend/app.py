@@ -1,18 +1,317 @@
-from flask import Flask, request, jsonify, redirect
+from flask import Flask, request, jsonify, redirect, Response, send_file, g
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import os
+import re
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime
 from dotenv import load_dotenv
 from firebase_handler import FirebaseHandler
+from speech import SpeechService, routine_intro_script
+from prerender import AudioPrerenderer
+from storage import storage_backend
+from conditional import Validators
+from compression import CompressionPolicy
+from profiler import RequestProfiler, SORT_KEYS
+import sync
+import fastjson
+import metrics
 
 # Load environment variables
 load_dotenv()
 
+# Maximum number of items accepted by the :batch endpoints
+MAX_BATCH_ITEMS = 500
+
+# Maximum number of sets logged to a workout in one request
+MAX_LOGGED_SETS = 50
+
+# Longest text accepted by the speech endpoints
+MAX_TTS_TEXT_LENGTH = 1000
+
+# Audio files are named by the SHA-256 of their content inputs
+AUDIO_FILENAME_PATTERN = re.compile(r'^[0-9a-f]{64}\.(mp3|wav)$')
+
+# Cache-Control for routine reads: routines are edited in the app, so clients revalidate every
+# time (a 304 when nothing changed)
+ROUTINE_CACHE_CONTROL = 'no-cache'
+# Catalog reads: the catalog rarely changes, so clients reuse it for a minute, then revalidate
+# in the background
+CATALOG_CACHE_CONTROL = 'public, max-age=60, stale-while-revalidate=300'
+
+# Accepted X-Request-ID values; anything else is replaced with a generated ID
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+
+# Lists with more items than this are encoded and sent as a stream
+STREAM_LIST_MIN_ITEMS = 100
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Encode jsonify responses with fastjson (orjson when installed)."""
+    
+    def response(self, *args, **kwargs):
+        return self._app.response_class(fastjson.dumps(self._prepare_response_obj(args, kwargs)), mimetype=self.mimetype)
+
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+app.json = FastJSONProvider(app)
+
+compression = CompressionPolicy()
+profiler = RequestProfiler()
+
+# Services are created by init_services() rather than at import time, so a server that forks
+# workers after importing this module (see gunicorn.conf.py) gives each worker its own
+# Firestore client and gRPC channel
+firebase = None
+speech = None
+prerenderer = None
+_services_lock = threading.Lock()
+
+# Set once warm_up() has finished, successfully or not; see /api/ready
+_warmed_up = threading.Event()
+_warm_up_error = None
+# Why the last try_init_services() failed, if it did
+_init_error = None
+
+def _env_flag(name, default=''):
+    return os.environ.get(name, default).lower() in ('1', 'true', 'yes')
+
+def init_services(db=None, warm_up_in_background=True):
+    """Create the Firestore handler, speech service and audio prerenderer for this process, then
+    warm them up (see warm_up) on a background thread, or in this thread if warm_up_in_background
+    is unset. db optionally replaces the Firestore client. Does nothing if the services already exist.
+    Creating the services opens no connection, so the process can answer requests right away; the
+    storage is opened by the warm-up or by the first request that needs it, whichever comes first.
+    """
+    global firebase, speech, prerenderer
+    with _services_lock:
+        if firebase is not None:
+            return
+        
+        handler = FirebaseHandler(db=db)
+        speech_service = SpeechService()
+        audio_prerenderer = AudioPrerenderer(handler, speech_service, workers=int(os.environ.get('AUDIO_PRERENDER_WORKERS', 4)))
+        
+        # Created now, though only started by the warm-up, so the ASGI app can share it
+        if _env_flag('CATALOG_MIRROR'):
+            if storage_backend() != 'firestore':
+                print("Warning: CATALOG_MIRROR needs Firestore snapshot listeners; ignoring it for this storage backend")
+            else:
+                handler.enable_catalog_mirror()
+        
+        _warmed_up.clear()
+        firebase, speech, prerenderer = handler, speech_service, audio_prerenderer
+    
+    if warm_up_in_background:
+        _start_warm_up(handler, audio_prerenderer)
+    else:
+        warm_up(handler, audio_prerenderer)
+
+def try_init_services():
+    """Like init_services, but a failure (e.g. a bad storage or speech setting) is printed and kept
+    for /api/ready instead of raised, so the process stays alive and answers its liveness check.
+    Returns the error, or None once the services exist.
+    """
+    global _init_error
+    try:
+        init_services()
+        _init_error = None
+    except Exception as e:
+        print(f"Error initializing services: {e}")
+        _init_error = str(e)
+    return _init_error
+
+def _start_warm_up(handler, audio_prerenderer):
+    _warmed_up.clear()
+    threading.Thread(target=warm_up, args=(handler, audio_prerenderer), name='warm-up', daemon=True).start()
+
+def warm_up(handler, audio_prerenderer):
+    """Open the storage and start everything that needs it: the catalog mirror, the catalog cache,
+    the orphan sweeper and audio prerendering. Errors are reported by /api/ready, which also retries
+    the warm-up; every step is safe to repeat.
+    """
+    global _warm_up_error
+    try:
+        handler.connect()
+        
+        # Optionally serve catalog reads from an in-memory mirror kept current by snapshot listeners
+        if handler.mirror is not None:
+            handler.start_catalog_mirror(timeout=float(os.environ.get('CATALOG_MIRROR_READY_TIMEOUT', 10)))
+        
+        # Warm the catalog cache so the first requests don't wait on Firestore
+        if _env_flag('PRELOAD_CATALOG', 'true'):
+            handler.preload_catalog()
+        
+        # Optionally delete routine_exercises links left behind by interrupted deletes in the background
+        orphan_sweep_interval = float(os.environ.get('ORPHAN_SWEEP_INTERVAL', 0))
+        if orphan_sweep_interval > 0:
+            handler.start_orphan_sweeper(orphan_sweep_interval)
+        
+        # Optionally render every routine's cues in the background, and re-render routines as they are edited
+        if _env_flag('AUDIO_PRERENDER'):
+            audio_prerenderer.start()
+        _warm_up_error = None
+    except Exception as e:
+        print(f"Error warming up: {e}")
+        _warm_up_error = str(e)
+    finally:
+        _warmed_up.set()
+
+def shutdown_services():
+    """Stop background jobs and close the Firestore client."""
+    global firebase, speech, prerenderer
+    with _services_lock:
+        if firebase is None:
+            return
+        prerenderer.stop()
+        firebase.close()
+        firebase, speech, prerenderer = None, None, None
+
+# Answered without services, so a process whose services can't be created still reports that it is
+# alive, and why it isn't ready
+SERVICE_FREE_ENDPOINTS = ('health_check', 'readiness_check')
+
+@app.before_request
+def _ensure_services():
+    # Servers that don't call init_services() themselves initialize on the first request
+    if firebase is None and request.endpoint not in SERVICE_FREE_ENDPOINTS:
+        if try_init_services() is not None:
+            return jsonify({"error": "Service unavailable"}), 503
+
+def request_id_from(header_value):
+    """Return the client's request ID if it is well-formed, otherwise a new one."""
+    if header_value and REQUEST_ID_PATTERN.match(header_value):
+        return header_value
+    return uuid.uuid4().hex
+
+@app.before_request
+def _start_request_metrics():
+    g.request_stats, g.request_stats_token = metrics.start_request(request_id_from(request.headers.get('X-Request-ID')))
+
+@app.before_request
+def _start_profile():
+    if not profiler.enabled or not profiler.should_profile(request.headers.get('X-Profile')):
+        return
+    profile = profiler.start()
+    if profile is not None:
+        g.profile, g.profile_started = profile, time.perf_counter()
+
+# Registered first, so it runs last: the profile includes compression and request accounting
+@app.after_request
+def _finish_profile(response):
+    profile = g.pop('profile', None)
+    if profile is None:
+        return response
+    profile.disable()
+    name = profiler.store.new_name(g.request_stats.request_id)
+    response.headers['X-Profile-ID'] = name
+    info = {
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'route': request.url_rule.rule if request.url_rule else 'unmatched',
+        'status': response.status_code,
+        'time': time.time(),
+    }
+    started = g.profile_started
+    
+    def save():
+        info['duration_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        try:
+            profiler.store.save(profile, name, info)
+        except OSError as e:
+            print(f"Error saving profile {name}: {e}")
+    
+    if response.is_streamed:
+        response.response = profiler.profiled(profile, response.response)
+        response.call_on_close(save)
+    else:
+        save()
+    return response
+
+# Registered before _compress, so it runs after it and sees the compressed body
+@app.after_request
+def _record_request(response):
+    stats = g.get('request_stats')
+    if stats is None:
+        return response
+    response.headers['X-Request-ID'] = stats.request_id
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    method, path, status = request.method, request.path, response.status_code
+    
+    if response.is_streamed:
+        sent = [0]
+        body = response.response
+        
+        def counted():
+            # Reads made while the body is generated belong to this request, whichever thread pulls it
+            iterator, done = iter(body), object()
+            while True:
+                token = metrics.activate(stats)
+                try:
+                    chunk = next(iterator, done)
+                finally:
+                    metrics.end_request(token)
+                if chunk is done:
+                    return
+                sent[0] += len(chunk)
+                yield chunk
+        
+        response.response = counted()
+        response.call_on_close(lambda: metrics.finish_request(stats, method, route, path, status, sent[0]))
+    else:
+        size = response.calculate_content_length() or 0
+        response.call_on_close(lambda: metrics.finish_request(stats, method, route, path, status, size))
+    return response
+
+@app.after_request
+def _compress(response):
+    return compression.apply(response, request.headers.get('Accept-Encoding'))
 
-# Initialize Firebase
-firebase = FirebaseHandler()
+@app.teardown_request
+def _stop_profile(exc):
+    # A request that failed before _finish_profile ran is not saved
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile.disable()
+
+@app.teardown_request
+def _end_request_metrics(exc):
+    token = g.pop('request_stats_token', None)
+    if token is not None:
+        metrics.end_request(token)
+
+def _service_metrics():
+    """Cache and coalescing counters, read at scrape time."""
+    if firebase is None:
+        return
+    caches = [('catalog', firebase.cache.stats())]
+    if speech is not None:
+        caches.append(('audio', speech.cache.stats()))
+    for name, kind, documentation, field in [
+        ('cache_hits_total', 'counter', 'Cache lookups answered from the cache.', 'hits'),
+        ('cache_misses_total', 'counter', 'Cache lookups that missed.', 'misses'),
+        ('cache_evictions_total', 'counter', 'Entries evicted to stay within the cache size.', 'evictions'),
+    ]:
+        for cache_name, stats in caches:
+            yield name, kind, documentation, (('cache', cache_name),), stats[field]
+    flights = firebase.flights.stats()
+    yield 'read_coalescing_calls_total', 'counter', 'Catalog fetches requested.', (), flights['calls']
+    yield 'read_coalescing_coalesced_total', 'counter', 'Catalog fetches that joined one in flight.', (), flights['coalesced']
+    sets = firebase.set_buffer.stats()
+    yield 'workout_set_appends_total', 'counter', 'Requests logging sets to a workout.', (), sets['appends']
+    yield 'workout_set_writes_total', 'counter', 'Transactions writing logged sets.', (), sets['writes']
+
+metrics.REGISTRY.add_collector(_service_metrics)
+if _env_flag('ACCESS_LOG', 'true'):
+    metrics.configure_access_log()
+
+def create_app(db=None):
+    """Return the Flask app with its services initialized."""
+    init_services(db=db)
+    return app
 
 @app.route('/', methods=['GET'])
 def root():
@@ -21,18 +320,168 @@ def root():
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Health check endpoint to verify the API is running."""
+    """Liveness check: the process is serving requests. Touches no storage."""
     return jsonify({"status": "healthy", "message": "API is running"})
 
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """Readiness check: 200 once this process has created its services, opened its storage and
+    warmed up; 503 until then, or with the error if any of that failed. A failed warm-up is retried
+    in the background.
+    """
+    if firebase is None and try_init_services() is not None:
+        return jsonify({"status": "unavailable", "error": _init_error}), 503
+    error = _warm_up_error
+    if error is not None:
+        # Reported until a retry succeeds
+        with _services_lock:
+            if firebase is not None and _warmed_up.is_set():
+                _start_warm_up(firebase, prerenderer)
+        return jsonify({"status": "unavailable", "error": error}), 503
+    if not _warmed_up.is_set():
+        return jsonify({"status": "starting"}), 503
+    return jsonify({"status": "ready"})
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Request, Firestore and cache metrics for this process in the Prometheus text format."""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+def _profiles_authorized():
+    """None if the caller may read profiles, otherwise the error response."""
+    if not profiler.token:
+        return jsonify({"error": "Profiling is disabled"}), 404
+    authorization = request.headers.get('Authorization', '')
+    if not profiler.authorized(authorization[7:] if authorization.startswith('Bearer ') else None):
+        return jsonify({"error": "Unauthorized"}), 401
+    return None
+
+@app.route('/api/admin/profiles', methods=['GET'])
+def list_profiles():
+    """List saved request profiles, newest first."""
+    error = _profiles_authorized()
+    if error:
+        return error
+    return jsonify({"profiles": profiler.store.list()})
+
+@app.route('/api/admin/profiles/<name>', methods=['GET'])
+def get_profile(name):
+    """Download a saved profile in pstats format.
+    Optional query parameters:
+    - format: "text" for a pstats report instead
+    - sort: report order, one of SORT_KEYS (default cumulative)
+    - limit: functions in the report (default 40)
+    """
+    error = _profiles_authorized()
+    if error:
+        return error
+    if request.args.get('format') == 'text':
+        sort = request.args.get('sort', 'cumulative')
+        if sort not in SORT_KEYS:
+            return jsonify({"error": f"sort must be one of {', '.join(SORT_KEYS)}"}), 400
+        try:
+            limit = int(request.args.get('limit', 40))
+        except ValueError:
+            return jsonify({"error": "limit must be an integer"}), 400
+        report = profiler.store.report(name, sort, limit)
+        if report is None:
+            return jsonify({"error": "Profile not found"}), 404
+        return Response(report, mimetype='text/plain')
+    
+    path = profiler.store.path_for(name)
+    if path is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return send_file(os.path.abspath(path), mimetype='application/octet-stream', as_attachment=True,
+                     download_name=f"{name}.prof")
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters for the routine and exercise catalog read cache, and read coalescing counters."""
+    return jsonify({"cache": firebase.cache.stats(), "coalescing": firebase.flights.stats()})
+
 @app.route('/api/workouts', methods=['GET'])
 def get_workouts():
-    """Get all workouts for a user."""
+    """Get all workouts for a user.
+    Optional query parameters:
+    - limit: return one page of at most limit workouts, newest first, with a next_cursor
+    - start_after: the next_cursor from the previous page
+    - fields: comma-separated list of fields to return for each workout
+    """
     user_id = request.args.get('user_id')
     if not user_id:
         return jsonify({"error": "user_id is required"}), 400
     
-    workouts = firebase.get_workouts(user_id)
-    return jsonify({"workouts": workouts})
+    fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+    limit = request.args.get('limit')
+    
+    if limit is None:
+        workouts = firebase.get_workouts(user_id, fields=fields or None)
+        return _json_list({"workouts": workouts}, 'workouts')
+    
+    if not limit.isdigit() or int(limit) < 1:
+        return jsonify({"error": "limit must be a positive integer"}), 400
+    
+    try:
+        page = firebase.get_workouts_page(
+            user_id, int(limit), start_after=request.args.get('start_after'), fields=fields or None
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if page is None:
+        return jsonify({"error": "Failed to get workouts"}), 500
+    workouts, next_cursor = page
+    return jsonify({"workouts": workouts, "next_cursor": next_cursor})
+
+@app.route('/api/workouts/export', methods=['GET'])
+def export_workouts():
+    """Stream a user's full workout history as NDJSON, one workout per line, oldest first.
+    Optional query parameters:
+    - gzip: if true, the response body is gzip-compressed
+    - start_after: ID of the last workout received by an interrupted export, to resume after it
+    """
+    user_id = request.args.get('user_id')
+    if not user_id:
+        return jsonify({"error": "user_id is required"}), 400
+    
+    export_format = request.args.get('format', 'ndjson')
+    if export_format != 'ndjson':
+        return jsonify({"error": "format must be ndjson"}), 400
+    
+    use_gzip = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    start_after = request.args.get('start_after')
+    
+    workouts = firebase.iter_workouts(user_id, start_after=start_after)
+    try:
+        # Pull the first workout before responding so a bad resume token is a 400, not a broken stream
+        first = next(workouts, None)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    def generate_lines():
+        if first is None:
+            return
+        yield fastjson.dumps(first) + b'\n'
+        for workout in workouts:
+            yield fastjson.dumps(workout) + b'\n'
+    
+    def generate_gzip():
+        compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+        for line in generate_lines():
+            chunk = compressor.compress(line)
+            if chunk:
+                yield chunk
+        yield compressor.flush()
+    
+    filename = f"workouts-{user_id}.ndjson" + ('.gz' if use_gzip else '')
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+    if use_gzip:
+        headers['Content-Encoding'] = 'gzip'
+    
+    return Response(
+        generate_gzip() if use_gzip else generate_lines(),
+        mimetype='application/x-ndjson',
+        headers=headers,
+    )
 
 @app.route('/api/workouts', methods=['POST'])
 def create_workout():
@@ -79,13 +528,111 @@ def delete_workout(workout_id):
     
     return jsonify({"message": "Workout deleted successfully"})
 
+@app.route('/api/workouts/<workout_id>/sets', methods=['POST'])
+def log_workout_sets(workout_id):
+    """Append completed sets to a workout, e.g. while it is in progress, instead of PUTting the whole
+    workout. The body is {"sets": [{"exercise_id" and/or "name", "set_id", "reps", "weight", ...}]}.
+    Sets whose set_id the workout already has are skipped, so a retried request is harmless; sets
+    without one get IDs derived from the Idempotency-Key header, or random ones.
+    With a Prefer: respond-async header, the sets are queued and a 202 is returned right away, once
+    the workout is known to exist. Returns 404 for an unknown workout.
+    """
+    data = request.json
+    sets = data.get('sets') if isinstance(data, dict) else None
+    if not isinstance(sets, list) or not sets:
+        return jsonify({"error": "sets must be a non-empty list"}), 400
+    if len(sets) > MAX_LOGGED_SETS:
+        return jsonify({"error": f"sets can contain at most {MAX_LOGGED_SETS} entries"}), 400
+    
+    idempotency_key = request.headers.get('Idempotency-Key')
+    records = []
+    for index, s in enumerate(sets):
+        if not isinstance(s, dict) or not (s.get('exercise_id') or s.get('name')):
+            return jsonify({"error": f"sets[{index}] must be an object with an exercise_id or name"}), 400
+        if any(not isinstance(s.get(field, 0), (int, float)) or isinstance(s.get(field), bool)
+               for field in ('reps', 'weight', 'duration')):
+            return jsonify({"error": f"sets[{index}]: reps, weight and duration must be numbers"}), 400
+        set_id = s.get('set_id') or (f"{idempotency_key}-{index}" if idempotency_key else str(uuid.uuid4()))
+        if not isinstance(set_id, str) or len(set_id) > 128:
+            return jsonify({"error": f"sets[{index}]: set_id must be a string of at most 128 characters"}), 400
+        records.append(dict(s, set_id=set_id, logged_at=s.get('logged_at') or datetime.now().isoformat()))
+    
+    if 'respond-async' in request.headers.get('Prefer', ''):
+        exists = firebase.workout_exists(workout_id)
+        if exists is None:
+            return jsonify({"error": "Failed to log sets"}), 500
+        if not exists:
+            return jsonify({"error": "Workout not found"}), 404
+        firebase.log_workout_sets(workout_id, records, wait=False)
+        return jsonify({"accepted": [s['set_id'] for s in records]}), 202
+    
+    try:
+        appended = firebase.log_workout_sets(workout_id, records)
+    except KeyError:
+        return jsonify({"error": "Workout not found"}), 404
+    if appended is None:
+        return jsonify({"error": "Failed to log sets"}), 500
+    duplicates = [s['set_id'] for s in records if s['set_id'] not in appended]
+    return jsonify({"appended": appended, "duplicates": duplicates}), (201 if appended else 200)
+
+@app.route('/api/users/<user_id>/stats', methods=['GET'])
+def get_user_stats(user_id):
+    """Get progress analytics over a user's workout history: totals, per-exercise volume and
+    estimated 1RM curves, PRs, and weekly totals.
+    Optional query parameters:
+    - exercise_id: only report this exercise (weekly totals still cover every exercise)
+    """
+    # Imported here so that loading NumPy doesn't slow down startup
+    import analytics
+    
+    workouts = firebase.get_workouts(user_id, fields=['date', 'created_at', 'exercises'])
+    stats = analytics.user_stats(workouts, exercise_id=request.args.get('exercise_id'))
+    return jsonify(dict(stats, user_id=user_id))
+
+@app.route('/api/users/<user_id>/summary', methods=['GET'])
+def get_user_summary(user_id):
+    """Get a user's home screen summary from their rollup document: totals, streaks, and per-routine
+    and per-exercise totals, best sets and last-performed dates. One document read, kept up to date
+    on every workout write.
+    """
+    stats = firebase.get_user_stats(user_id)
+    if stats is None:
+        return jsonify({"error": "Failed to get user summary"}), 500
+    return jsonify({"summary": stats})
+
+@app.route('/api/sync', methods=['GET'])
+def sync_changes():
+    """Get the routines, catalog exercises, routine exercises and workouts changed or deleted since a
+    previous sync, for a client-side offline cache.
+    Optional query parameters:
+    - since: the cursor from the previous sync; without it, everything is returned with full: true
+    - user_id: also sync this user's workouts
+    Keep syncing with the returned cursor while has_more is true.
+    """
+    since = request.args.get('since')
+    try:
+        position = sync.decode(since) if since else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    result = firebase.get_changes(position, user_id=request.args.get('user_id'))
+    if result is None:
+        return jsonify({"error": "Failed to get changes"}), 500
+    return jsonify({
+        "changes": result['changes'],
+        "deleted": result['deleted'],
+        "cursor": sync.encode(result['position']),
+        "has_more": result['has_more'],
+        "full": result['full'],
+    })
+
 # Routines Endpoints
 
 @app.route('/api/routines', methods=['GET'])
 def get_routines():
     """Get all workout routines."""
     routines = firebase.get_routines()
-    return jsonify({"routines": routines})
+    return _conditional_json({"routines": routines}, Validators(routines, ROUTINE_CACHE_CONTROL), list_key='routines')
 
 @app.route('/api/routines/<routine_id>', methods=['GET'])
 def get_routine(routine_id):
@@ -94,7 +641,16 @@ def get_routine(routine_id):
     if not routine:
         return jsonify({"error": "Routine not found"}), 404
     
-    return jsonify({"routine": routine})
+    return _conditional_json({"routine": routine}, Validators(routine, ROUTINE_CACHE_CONTROL, single_document=True))
+
+@app.route('/api/routines/<routine_id>/plan', methods=['GET'])
+def get_routine_plan(routine_id):
+    """Get a routine with its ordered exercises and per-routine settings in one read."""
+    plan = firebase.get_routine_plan(routine_id)
+    if not plan:
+        return jsonify({"error": "Routine not found"}), 404
+    
+    return _conditional_json({"plan": plan}, Validators(plan, ROUTINE_CACHE_CONTROL, single_document=True))
 
 @app.route('/api/routines', methods=['POST'])
 def create_routine():
@@ -121,7 +677,7 @@ def update_routine(routine_id):
 
 @app.route('/api/routines/<routine_id>', methods=['DELETE'])
 def delete_routine(routine_id):
-    """Delete a specific routine."""
+    """Delete a specific routine and its routine-exercise links."""
     success = firebase.delete_routine(routine_id)
     if not success:
         return jsonify({"error": "Failed to delete routine"}), 500
@@ -137,13 +693,14 @@ def get_exercises():
     """
     routine_id = request.args.get('routine_id')
     exercises = firebase.get_exercises(routine_id)
-    return jsonify({"exercises": exercises})
+    cache_control = ROUTINE_CACHE_CONTROL if routine_id else CATALOG_CACHE_CONTROL
+    return _conditional_json({"exercises": exercises}, Validators(exercises, cache_control), list_key='exercises')
     
 @app.route('/api/exercises/catalog', methods=['GET'])
 def get_exercise_catalog():
     """Get all exercises from the catalog."""
     exercises = firebase.get_exercises()
-    return jsonify({"exercises": exercises})
+    return _conditional_json({"exercises": exercises}, Validators(exercises, CATALOG_CACHE_CONTROL), list_key='exercises')
     
 @app.route('/api/routine-exercises', methods=['GET'])
 def get_routine_exercises():
@@ -160,7 +717,7 @@ def get_routine_exercises():
         routine_exercise['id'] = doc.id
         routine_exercises.append(routine_exercise)
         
-    return jsonify({"routineExercises": routine_exercises})
+    return _json_list({"routineExercises": routine_exercises}, 'routineExercises')
 
 @app.route('/api/exercises/catalog/<exercise_id>', methods=['GET'])
 def get_exercise_catalog_item(exercise_id):
@@ -169,7 +726,7 @@ def get_exercise_catalog_item(exercise_id):
     if not exercise:
         return jsonify({"error": "Exercise not found"}), 404
     
-    return jsonify({"exercise": exercise})
+    return _conditional_json({"exercise": exercise}, Validators(exercise, CATALOG_CACHE_CONTROL, single_document=True))
     
 @app.route('/api/routine-exercises/<routine_exercise_id>', methods=['GET'])
 def get_routine_exercise(routine_exercise_id):
@@ -230,9 +787,7 @@ def update_routine_exercise(routine_exercise_id):
 
 @app.route('/api/exercises/catalog/<exercise_id>', methods=['DELETE'])
 def delete_exercise_catalog_item(exercise_id):
-    """Delete a specific exercise from the catalog.
-    Note: This won't delete routine_exercise links automatically.
-    """
+    """Delete a specific exercise from the catalog and every routine-exercise link to it."""
     success = firebase.delete_exercise(exercise_id)
     if not success:
         return jsonify({"error": "Failed to delete exercise"}), 500
@@ -249,8 +804,206 @@ def delete_routine_exercise(routine_exercise_id):
         
     return jsonify({"message": "Routine exercise deleted successfully"})
 
+# Batch Endpoints
+
+def _batch_items(required_fields):
+    """Validate a batch payload of the form {"items": [...]}.
+    Returns (items, None) if every item is valid, otherwise (None, error_response).
+    """
+    data = request.json
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return None, (jsonify({"error": "items must be a non-empty list"}), 400)
+    if len(items) > MAX_BATCH_ITEMS:
+        return None, (jsonify({"error": f"items can contain at most {MAX_BATCH_ITEMS} entries"}), 400)
+    
+    # Validate the whole payload before writing anything
+    errors = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({"index": index, "error": "item must be an object"})
+            continue
+        missing = [field for field in required_fields if item.get(field) in (None, '')]
+        if missing:
+            errors.append({"index": index, "error": f"{', '.join(missing)} is required"})
+    if errors:
+        return None, (jsonify({"error": "Invalid items; nothing was written", "results": errors}), 400)
+    
+    return items, None
+
+def _batch_response(results):
+    """201 if every item was written, 207 with per-item results if some failed."""
+    failed = sum(1 for result in results if result['status'] != 'created')
+    body = {
+        "created": len(results) - failed,
+        "failed": failed,
+        "results": results,
+    }
+    return jsonify(body), (201 if failed == 0 else 207)
+
+@app.route('/api/workouts:batch', methods=['POST'])
+def create_workouts_batch():
+    """Create several workouts in one request."""
+    items, error = _batch_items(['user_id', 'workout_data'])
+    if error:
+        return error
+    
+    return _batch_response(firebase.create_workouts_batch(items))
+
+@app.route('/api/exercises/catalog:batch', methods=['POST'])
+def create_exercise_catalog_batch():
+    """Create several exercises in the catalog in one request."""
+    items, error = _batch_items(['name'])
+    if error:
+        return error
+    
+    return _batch_response(firebase.create_exercises_batch(items))
+
+@app.route('/api/routine-exercises:batch', methods=['POST'])
+def create_routine_exercises_batch():
+    """Create several routine-exercise links in one request, e.g. a whole routine from the editor."""
+    items, error = _batch_items(['routine_id', 'exercise_id', 'order', 'sets', 'reps', 'rest_time'])
+    if error:
+        return error
+    
+    return _batch_response(firebase.create_routine_exercises_batch(items))
+
+# Speech Endpoints
+
+def _speech_text():
+    """Validate the text field of a speech request. Returns (text, None) or (None, error_response)."""
+    data = request.get_json(silent=True) or {}
+    text = (data.get('text') or '').strip()
+    if not text:
+        return None, (jsonify({"error": "text is required"}), 400)
+    if len(text) > MAX_TTS_TEXT_LENGTH:
+        return None, (jsonify({"error": f"text can be at most {MAX_TTS_TEXT_LENGTH} characters"}), 400)
+    return text, None
+
+def _json_list(body, list_key):
+    """Return body as JSON, streaming it if the list under list_key is long."""
+    if len(body[list_key]) > STREAM_LIST_MIN_ITEMS:
+        return Response(fastjson.iter_dumps(body, list_key), mimetype='application/json')
+    return jsonify(body)
+
+def _conditional_json(body, validators, list_key=None):
+    """Return body as JSON with its validators, or an empty 304 if the client's copy is current.
+    list_key names a list in body that may be streamed (see _json_list).
+    """
+    if validators.not_modified(request.headers.get('If-None-Match'), request.headers.get('If-Modified-Since')):
+        response = Response(status=304)
+    elif list_key is not None:
+        response = _json_list(body, list_key)
+    else:
+        response = jsonify(body)
+    response.headers.update(validators.headers())
+    return response
+
+def _send_audio(filename):
+    """Send a cached audio file with a strong ETag, range support and long-lived caching."""
+    response = send_file(
+        speech.path_for(filename),
+        mimetype=speech.mimetype,
+        conditional=True,
+        etag=filename.split('.', 1)[0],
+        max_age=365 * 24 * 3600,
+    )
+    # Content-addressed files never change
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/api/tts/voices', methods=['GET'])
+def get_tts_voices():
+    """Get the voices available from the speech engine."""
+    try:
+        return jsonify({"voices": speech.voices()})
+    except Exception as e:
+        print(f"Error getting voices: {e}")
+        return jsonify({"error": "Failed to get voices"}), 502
+
+@app.route('/api/tts/generate', methods=['POST'])
+def generate_tts():
+    """Synthesize text and return the audio."""
+    text, error = _speech_text()
+    if error:
+        return error
+    
+    try:
+        filename = speech.synthesize(text, (request.get_json(silent=True) or {}).get('voice_id'))
+    except Exception as e:
+        print(f"Error generating speech: {e}")
+        return jsonify({"error": "Failed to generate speech"}), 502
+    
+    return _send_audio(filename)
+
+@app.route('/api/announcements/generate', methods=['POST'])
+def generate_announcement():
+    """Synthesize a workout announcement and return its audio URL."""
+    text, error = _speech_text()
+    if error:
+        return error
+    
+    try:
+        filename = speech.synthesize(text)
+    except Exception as e:
+        print(f"Error generating announcement: {e}")
+        return jsonify({"error": "Failed to generate announcement"}), 502
+    
+    return jsonify({"audio_url": speech.audio_url(filename)})
+
+@app.route('/api/routines/<routine_id>/intro-script', methods=['GET'])
+def get_routine_intro_script(routine_id):
+    """Get the spoken introduction for a routine."""
+    plan = firebase.get_routine_plan(routine_id)
+    if not plan:
+        return jsonify({"error": "Routine not found"}), 404
+    
+    return jsonify({"script": routine_intro_script(plan['routine'], plan['exercises'])})
+
+@app.route('/api/routines/<routine_id>/generate-intro', methods=['POST'])
+def generate_routine_intro(routine_id):
+    """Synthesize the spoken introduction for a routine and return its audio URL."""
+    plan = firebase.get_routine_plan(routine_id)
+    if not plan:
+        return jsonify({"error": "Routine not found"}), 404
+    
+    try:
+        filename = speech.synthesize(routine_intro_script(plan['routine'], plan['exercises']))
+    except Exception as e:
+        print(f"Error generating routine intro: {e}")
+        return jsonify({"error": "Failed to generate intro"}), 502
+    
+    return jsonify({"message": "Intro generated successfully", "audio_url": speech.audio_url(filename)})
+
+@app.route('/api/routines/<routine_id>/audio-manifest', methods=['GET'])
+def get_routine_audio_manifest(routine_id):
+    """Get the text and audio URL of every cue in a routine, so the workout page can prefetch them."""
+    plan = firebase.get_routine_plan(routine_id)
+    if not plan:
+        return jsonify({"error": "Routine not found"}), 404
+    
+    manifest = prerenderer.manifest(routine_id, plan)
+    # Cues not rendered yet are picked up by the background pre-renderer
+    if prerenderer.running and manifest['ready'] < manifest['total']:
+        prerenderer.schedule(routine_id, plan)
+    return jsonify({"manifest": manifest})
+
+@app.route('/api/audio/<filename>', methods=['GET'])
+def get_audio(filename):
+    """Serve a synthesized audio file from the cache."""
+    # lookup() also finds files other workers synthesized into the shared cache directory
+    if not AUDIO_FILENAME_PATTERN.match(filename) or speech.cache.lookup(filename.split('.', 1)[0]) != filename:
+        return jsonify({"error": "Audio not found"}), 404
+    
+    return _send_audio(filename)
+
+@app.route('/api/audio/stats', methods=['GET'])
+def audio_stats():
+    """Hit/miss and size counters for the audio cache."""
+    return jsonify({"audio_cache": speech.cache.stats()})
+
 if __name__ == '__main__':
-    # Get port from environment variable or use 5002 as default
+    # Development server; use gunicorn.conf.py in production
     port = int(os.environ.get('PORT', 5002))
     # Run the app with host set to 0.0.0.0 to make it externally visible
-    app.run(host='0.0.0.0', port=port, debug=True)
+    create_app().run(host='0.0.0.0', port=port, debug=_env_flag('FLASK_DEBUG'))
@@ -0,0 +1,264 @@
+"""
+ASGI entry point for the API.
+
+The catalog read endpoints that workout pages hit hardest run on
+AsyncFirebaseHandler, so a worker keeps serving other requests while it waits on
+Firestore. Every other request is passed to the Flask app in app.py on a worker
+thread. With STORAGE_BACKEND=sqlite, every request goes to the Flask app. Run it
+with any ASGI server, for example:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import io
+import re
+import sys
+from urllib.parse import parse_qs
+
+import app as flask_module
+from async_firebase_handler import AsyncFirebaseHandler
+import fastjson
+import metrics
+from conditional import Validators
+from storage import storage_backend
+
+flask_app = flask_module.app
+# As in gunicorn's post_fork: if the services can't be created, the server still starts, /api/health
+# answers and /api/ready reports the error, and the Flask app retries on later requests
+flask_module.try_init_services()
+
+# Created from the Flask app's services once they exist (see async_firebase)
+firebase = None
+
+
+def async_firebase():
+    """Return the async handler, or None while the Flask app has no services or the storage
+    backend isn't Firestore (the async handler needs Firestore; other backends are served by
+    the Flask routes alone). It shares the Flask handler's cache and catalog mirror, so writes
+    made through the Flask routes invalidate the reads served here.
+    """
+    global firebase
+    handler = flask_module.firebase
+    if handler is None:
+        return None
+    try:
+        if storage_backend() != 'firestore':
+            return None
+    except ValueError:
+        # The Flask routes and /api/ready report the bad setting
+        return None
+    if firebase is None or firebase.cache is not handler.cache:
+        firebase = AsyncFirebaseHandler(cache=handler.cache, mirror=handler.mirror)
+    return firebase
+
+
+# Async routes: each returns (status, body, validators), with the same validators and
+# Cache-Control policies as the Flask routes
+
+ROUTINE_CACHE_CONTROL = flask_module.ROUTINE_CACHE_CONTROL
+CATALOG_CACHE_CONTROL = flask_module.CATALOG_CACHE_CONTROL
+
+async def get_routines(query):
+    """Get all workout routines."""
+    routines = await firebase.get_routines()
+    return 200, {"routines": routines}, Validators(routines, ROUTINE_CACHE_CONTROL)
+
+async def get_routine(query, routine_id):
+    """Get a specific routine by ID."""
+    routine = await firebase.get_routine(routine_id)
+    if not routine:
+        return 404, {"error": "Routine not found"}, None
+    return 200, {"routine": routine}, Validators(routine, ROUTINE_CACHE_CONTROL, single_document=True)
+
+async def get_routine_plan(query, routine_id):
+    """Get a routine with its ordered exercises and per-routine settings in one read."""
+    plan = await firebase.get_routine_plan(routine_id)
+    if not plan:
+        return 404, {"error": "Routine not found"}, None
+    return 200, {"plan": plan}, Validators(plan, ROUTINE_CACHE_CONTROL, single_document=True)
+
+async def get_exercises(query):
+    """Get all exercises, or a routine's exercises with their specific settings."""
+    routine_id = query.get('routine_id', [None])[0]
+    exercises = await firebase.get_exercises(routine_id)
+    cache_control = ROUTINE_CACHE_CONTROL if routine_id else CATALOG_CACHE_CONTROL
+    return 200, {"exercises": exercises}, Validators(exercises, cache_control)
+
+async def get_exercise_catalog(query):
+    """Get all exercises in the catalog."""
+    exercises = await firebase.get_exercises()
+    return 200, {"exercises": exercises}, Validators(exercises, CATALOG_CACHE_CONTROL)
+
+async def get_exercise_catalog_item(query, exercise_id):
+    """Get a specific exercise from the catalog by ID."""
+    exercise = await firebase.get_exercise(exercise_id)
+    if not exercise:
+        return 404, {"error": "Exercise not found"}, None
+    return 200, {"exercise": exercise}, Validators(exercise, CATALOG_CACHE_CONTROL, single_document=True)
+
+# Rules use Flask's syntax, so metrics label routes the same way on both paths
+ROUTES = [
+    ('/api/routines', get_routines),
+    ('/api/routines/<routine_id>', get_routine),
+    ('/api/routines/<routine_id>/plan', get_routine_plan),
+    ('/api/exercises', get_exercises),
+    ('/api/exercises/catalog', get_exercise_catalog),
+    ('/api/exercises/catalog/<exercise_id>', get_exercise_catalog_item),
+]
+ROUTE_PATTERNS = [
+    (re.compile(re.sub(r'<(\w+)>', r'(?P<\1>[^/:]+)', rule)), rule, handler) for rule, handler in ROUTES
+]
+
+
+def match_route(method, path):
+    """Return (handler, path parameters, rule) for an async route, or (None, None, None)."""
+    if method != 'GET' or async_firebase() is None:
+        return None, None, None
+    for pattern, rule, handler in ROUTE_PATTERNS:
+        match = pattern.fullmatch(path)
+        if match:
+            return handler, match.groupdict(), rule
+    return None, None, None
+
+
+def request_header(scope, name):
+    """Return a request header's value (repeated headers joined with commas), or None."""
+    values = [value.decode('latin-1') for key, value in scope.get('headers', []) if key == name]
+    return ','.join(values) if values else None
+
+
+async def send_json(send, status, body, validators=None, accept_encoding=None, request_id=None):
+    """Send body as a JSON response. Returns the number of body bytes sent."""
+    # Matches the CORS headers flask-cors adds to the Flask routes
+    headers = [(b'access-control-allow-origin', b'*')]
+    if request_id is not None:
+        headers.append((b'x-request-id', request_id.encode('latin-1')))
+    if validators is not None:
+        headers.extend((name.lower().encode('latin-1'), value.encode('latin-1'))
+                       for name, value in validators.headers().items())
+
+    if status == 304:
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b''})
+        return 0
+
+    payload = fastjson.dumps(body)
+    # Same negotiation as the Flask routes' after_request hook
+    compression = flask_module.compression
+    if compression.compressible('application/json'):
+        headers.append((b'vary', b'Accept-Encoding'))
+        encoding = compression.choose(accept_encoding, 'application/json', len(payload))
+        if encoding is not None:
+            payload = compression.compress(payload, encoding)
+            headers.append((b'content-encoding', encoding.encode('latin-1')))
+    headers.extend([
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(payload)).encode('latin-1')),
+    ])
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': payload})
+    return len(payload)
+
+
+# Flask fallback
+
+def wsgi_environ(scope, body):
+    """Build a PEP 3333 environ for an ASGI HTTP scope."""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+            continue
+        key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def call_flask(scope, receive, send):
+    """Run a request through the Flask app on a worker thread, streaming its response body."""
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+
+    loop = asyncio.get_running_loop()
+    iterable = await loop.run_in_executor(None, flask_app, wsgi_environ(scope, body), start_response)
+    iterator = iter(iterable)
+    started = False
+    try:
+        while True:
+            # Chunks are pulled one at a time so streamed responses (e.g. the workout export) stay streamed
+            chunk = await loop.run_in_executor(None, next, iterator, None)
+            if not started:
+                await send({'type': 'http.response.start', 'status': response['status'], 'headers': response['headers']})
+                started = True
+            if chunk is None:
+                break
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(iterable, 'close'):
+            await loop.run_in_executor(None, iterable.close)
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                flask_module.shutdown_services()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    if scope['type'] != 'http':
+        return
+
+    handler, params, rule = match_route(scope['method'], scope['path'])
+    if handler is None:
+        await call_flask(scope, receive, send)
+        return
+
+    stats, token = metrics.start_request(flask_module.request_id_from(request_header(scope, b'x-request-id')))
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    try:
+        status, body, validators = await handler(query, **params)
+    except Exception as e:
+        print(f"Error handling {scope['path']}: {e}")
+        status, body, validators = 500, {"error": "Internal server error"}, None
+    finally:
+        metrics.end_request(token)
+    if validators is not None and validators.not_modified(
+            request_header(scope, b'if-none-match'), request_header(scope, b'if-modified-since')):
+        status = 304
+    size = await send_json(send, status, body, validators, request_header(scope, b'accept-encoding'), stats.request_id)
+    metrics.finish_request(stats, scope['method'], rule, scope['path'], status, size)
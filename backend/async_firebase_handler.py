@@ -0,0 +1,259 @@
+"""
+Async read path for routines and the exercise catalog, on the async Firestore client.
+
+Independent reads within one call run concurrently with asyncio.gather, so an
+ASGI worker keeps serving other requests during every Firestore round trip.
+Results are cached under the same keys and tags as FirebaseHandler, so the two
+handlers can share one cache and writes made through FirebaseHandler
+invalidate reads made here. Concurrent identical catalog misses share one fetch,
+and reads are counted in metrics, as in FirebaseHandler.
+"""
+import asyncio
+import os
+from cache import TTLCache
+from firebase_handler import GET_ALL_CHUNK_SIZE, FirebaseHandler, initialize_firebase_app
+from firestore_metrics import AsyncInstrumentedClient
+from singleflight import AsyncSingleFlight
+from storage import LazyClient
+
+
+class AsyncFirebaseHandler:
+    """Async handler for Firestore reads used by the ASGI app."""
+
+    # Merging, plan building and cache tagging don't touch Firestore
+    _merge_routine_exercises = FirebaseHandler._merge_routine_exercises
+    _merge_routine_exercise = FirebaseHandler._merge_routine_exercise
+    _routine_plan = FirebaseHandler._routine_plan
+    _cache_routine_exercises = FirebaseHandler._cache_routine_exercises
+
+    def __init__(self, db=None, cache=None, mirror=None):
+        """Initialize the async Firestore client.
+        If db is provided, it is used instead of initializing Firebase, which otherwise happens on
+        first use.
+        If cache is not provided, a TTLCache sized from CACHE_MAX_ENTRIES / CACHE_TTL_SECONDS is used.
+        mirror is an optional CatalogMirror (see FirebaseHandler.start_catalog_mirror) that serves
+        catalog reads from memory while it is live.
+        """
+        self.app = None
+        self.db = db
+        self.mirror = mirror
+        self.cache = cache if cache is not None else TTLCache(
+            max_entries=int(os.environ.get('CACHE_MAX_ENTRIES', 1024)),
+            ttl=float(os.environ.get('CACHE_TTL_SECONDS', 300)),
+        )
+        # Concurrent identical catalog reads share one Firestore fetch
+        self.flights = AsyncSingleFlight()
+        if self.db is None:
+            self.db = LazyClient(self._initialize_firebase)
+        # Counts reads and round trips per collection and per request (see metrics.py)
+        self.db = AsyncInstrumentedClient(self.db)
+
+    def _initialize_firebase(self):
+        """Initialize Firebase and return an async Firestore client with the app's credentials."""
+        from firebase_admin import firestore
+
+        self.app = initialize_firebase_app()
+        if self.app is None:
+            raise RuntimeError("Firebase could not be initialized; see the error above")
+
+        return firestore.AsyncClient(
+            project=self.app.project_id,
+            credentials=self.app.credential.get_credential(),
+        )
+
+    def _mirror_live(self):
+        return self.mirror is not None and self.mirror.is_live()
+
+    def _coalesce(self, key, fetch):
+        """Share a fetch of key with concurrent callers.
+        Writes go through FirebaseHandler on other threads and can't detach flights here, so the key
+        includes the cache's invalidation generation: callers arriving after a write start a new fetch.
+        """
+        return self.flights.do((key, self.cache.generation()), fetch)
+
+    async def _stream(self, query):
+        """Run a query and return its documents as dicts with their IDs."""
+        documents = []
+        async for doc in query.stream():
+            document_data = doc.to_dict()
+            document_data['id'] = doc.id
+            documents.append(document_data)
+        return documents
+
+    async def _get_document(self, collection, doc_id):
+        """Get one document as a dict with its ID, or None if it doesn't exist."""
+        doc = await self.db.collection(collection).document(doc_id).get()
+        if not doc.exists:
+            return None
+        document_data = doc.to_dict()
+        document_data['id'] = doc.id
+        return document_data
+
+    async def _get_documents_by_ids(self, collection, doc_ids):
+        """Get documents with concurrent chunked get_all() reads.
+        Duplicate IDs are fetched once. Returns a dict of doc_id -> data for documents that exist.
+        """
+        unique_ids = list(dict.fromkeys(doc_ids))
+
+        async def get_chunk(chunk):
+            refs = [self.db.collection(collection).document(doc_id) for doc_id in chunk]
+            return [doc async for doc in self.db.get_all(refs)]
+
+        chunks = await asyncio.gather(*(
+            get_chunk(unique_ids[start:start + GET_ALL_CHUNK_SIZE])
+            for start in range(0, len(unique_ids), GET_ALL_CHUNK_SIZE)
+        ))
+
+        documents = {}
+        for docs in chunks:
+            for doc in docs:
+                if doc.exists:
+                    document_data = doc.to_dict()
+                    document_data['id'] = doc.id
+                    documents[doc.id] = document_data
+        return documents
+
+    # Routines and exercise catalog
+
+    async def get_routines(self):
+        """Get all workout routines."""
+        try:
+            if self._mirror_live():
+                return self.mirror.get_routines()
+
+            hit, routines = self.cache.get(('routines',))
+            if hit:
+                return routines
+
+            since = self.cache.generation()
+            routines = await self._stream(self.db.collection('routines'))
+            self.cache.set(('routines',), routines, since=since)
+            return routines
+        except Exception as e:
+            print(f"Error getting routines: {e}")
+            return []
+
+    async def get_routine(self, routine_id):
+        """Get a specific routine by ID."""
+        try:
+            if self._mirror_live():
+                return self.mirror.get_routine(routine_id)
+
+            hit, routine_data = self.cache.get(('routine', routine_id))
+            if hit:
+                return routine_data
+
+            return await self._coalesce(('routine', routine_id), lambda: self._fetch_routine(routine_id))
+        except Exception as e:
+            print(f"Error getting routine: {e}")
+            return None
+
+    async def _fetch_routine(self, routine_id):
+        """Read a routine from Firestore and cache it."""
+        since = self.cache.generation()
+        routine_data = await self._get_document('routines', routine_id)
+        if routine_data:
+            self.cache.set(('routine', routine_id), routine_data, since=since)
+        return routine_data
+
+    async def get_exercises(self, routine_id=None):
+        """Get all exercises with their details.
+        If routine_id is provided, returns exercises for that routine with their specific settings.
+        """
+        try:
+            if self._mirror_live():
+                if routine_id:
+                    routine_exercises = self.mirror.get_routine_links(routine_id)
+                    catalog = self.mirror.get_exercises_by_ids([re['exercise_id'] for re in routine_exercises])
+                    return self._merge_routine_exercises(routine_exercises, catalog)
+                return self.mirror.get_exercises()
+
+            hit, exercises = self.cache.get(('exercises', routine_id))
+            if hit:
+                return exercises
+
+            return await self._coalesce(('exercises', routine_id), lambda: self._load_exercises(routine_id))
+        except Exception as e:
+            print(f"Error getting exercises: {e}")
+            return []
+
+    async def _load_exercises(self, routine_id):
+        """Read a routine's merged exercises, or the whole catalog, from Firestore and cache them."""
+        since = self.cache.generation()
+        if routine_id:
+            routine_exercises, exercises = await self._fetch_routine_exercises(routine_id)
+            self._cache_routine_exercises(routine_id, routine_exercises, exercises, since)
+            return exercises
+
+        exercises = await self._stream(self.db.collection('exercises'))
+        self.cache.set(('exercises', None), exercises, since=since)
+        return exercises
+
+    async def _fetch_routine_exercises(self, routine_id):
+        """Read a routine's links, then its catalog exercises concurrently.
+        Returns (routine_exercises, exercises), both sorted by order.
+        """
+        links_ref = self.db.collection('routine_exercises').where('routine_id', '==', routine_id)
+        routine_exercises = await self._stream(links_ref)
+        routine_exercises.sort(key=lambda x: x.get('order', 0))
+
+        catalog = await self._get_documents_by_ids('exercises', [re['exercise_id'] for re in routine_exercises])
+        return routine_exercises, self._merge_routine_exercises(routine_exercises, catalog)
+
+    async def get_exercise(self, exercise_id):
+        """Get a specific exercise from the catalog by ID."""
+        try:
+            if self._mirror_live():
+                return self.mirror.get_exercise(exercise_id)
+
+            hit, exercise_data = self.cache.get(('exercise', exercise_id))
+            if hit:
+                return exercise_data
+
+            return await self._coalesce(('exercise', exercise_id), lambda: self._fetch_exercise(exercise_id))
+        except Exception as e:
+            print(f"Error getting exercise: {e}")
+            return None
+
+    async def _fetch_exercise(self, exercise_id):
+        """Read a catalog exercise from Firestore and cache it."""
+        since = self.cache.generation()
+        exercise_data = await self._get_document('exercises', exercise_id)
+        if exercise_data:
+            self.cache.set(('exercise', exercise_id), exercise_data, since=since)
+        return exercise_data
+
+    # Routine Plans
+
+    async def get_routine_plan(self, routine_id):
+        """Get a routine with its ordered, merged exercises from its routine_plans document.
+        Plans that don't exist yet are built on first read.
+        """
+        try:
+            plan_ref = self.db.collection('routine_plans').document(routine_id)
+            doc = await plan_ref.get()
+            plan = doc.to_dict() if doc.exists else await self._build_routine_plan(plan_ref, routine_id)
+            if plan is None:
+                return None
+
+            plan['id'] = routine_id
+            # Lookup arrays are only used to find plans affected by writes
+            plan.pop('exercise_ids', None)
+            plan.pop('routine_exercise_ids', None)
+            return plan
+        except Exception as e:
+            print(f"Error getting routine plan: {e}")
+            return None
+
+    async def _build_routine_plan(self, plan_ref, routine_id):
+        """Build and store a missing routine plan, reading the routine and its links concurrently."""
+        routine_data, (routine_exercises, exercises) = await asyncio.gather(
+            self._get_document('routines', routine_id),
+            self._fetch_routine_exercises(routine_id),
+        )
+        if routine_data is None:
+            return None
+
+        plan = self._routine_plan(routine_data, routine_exercises, exercises)
+        await plan_ref.set(plan)
+        return plan
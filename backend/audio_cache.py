@@ -0,0 +1,167 @@
+"""
+Content-addressed on-disk cache for synthesized audio.
+
+Each clip is stored under the SHA-256 of everything that determines its bytes
+(engine, text, voice and settings), so identical requests map to the same file
+and the key doubles as a strong ETag. Total size is bounded; the least recently
+used files are evicted first.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+def audio_key(engine, text, voice_id, settings=None):
+    """Hash of everything that determines a clip's bytes."""
+    payload = json.dumps(
+        {'engine': engine, 'text': text, 'voice_id': voice_id, 'settings': settings or {}},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AudioCache:
+    """Size-bounded LRU cache of audio files in a directory.
+
+    Files are named <key>.<extension> in a subdirectory named after the first two
+    characters of the key. The LRU order is kept in memory and rebuilt from file
+    modification times at startup; hits touch the file so the order survives restarts.
+    Several processes (e.g. gunicorn workers) can share a directory: a file another
+    process stored is found on disk and adopted into this process's index.
+    """
+
+    def __init__(self, directory, max_bytes=500 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (filename, size), least recently used first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name.split('.', 1)[0]] = (name, size)
+            self._total_bytes += size
+
+    def path_for(self, filename):
+        return os.path.join(self.directory, filename[:2], filename)
+
+    def lookup(self, key):
+        """Return the cached filename for key, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            return self._adopt(key)
+        try:
+            os.utime(self.path_for(entry[0]))
+        except FileNotFoundError:
+            with self._lock:
+                self._forget(key)
+            return None
+        return entry[0]
+
+    def _adopt(self, key):
+        """Index a file for key that another process stored. Returns its filename, or None."""
+        try:
+            names = os.listdir(os.path.join(self.directory, key[:2]))
+        except FileNotFoundError:
+            return None
+        for name in names:
+            if name.split('.', 1)[0] == key and not name.endswith('.tmp'):
+                try:
+                    size = os.stat(self.path_for(name)).st_size
+                except FileNotFoundError:
+                    return None
+                self._add(key, name, size)
+                return name
+        return None
+
+    def get_or_create(self, key, extension, render):
+        """Return the filename for key, calling render() to produce the bytes on a miss.
+        Concurrent misses for the same key render once.
+        """
+        filename = self.lookup(key)
+        if filename:
+            with self._lock:
+                self.hits += 1
+            return filename
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                filename = self.lookup(key)
+                if filename:
+                    with self._lock:
+                        self.hits += 1
+                    return filename
+
+                with self._lock:
+                    self.misses += 1
+                audio = render()
+                filename = f"{key}.{extension}"
+                self._store(key, filename, audio)
+                return filename
+        finally:
+            with self._lock:
+                self._key_locks.pop(key, None)
+
+    def _store(self, key, filename, audio):
+        path = self.path_for(filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(audio)
+        os.replace(tmp_path, path)
+        self._add(key, filename, len(audio))
+
+    def _add(self, key, filename, size):
+        """Index a stored file and evict the least recently used files over max_bytes."""
+        with self._lock:
+            self._forget(key)
+            self._entries[key] = (filename, size)
+            self._total_bytes += size
+            evicted = []
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key = next(iter(self._entries))
+                evicted.append(self._entries[old_key][0])
+                self._forget(old_key)
+                self.evictions += 1
+        for old_filename in evicted:
+            try:
+                os.remove(self.path_for(old_filename))
+            except FileNotFoundError:
+                pass
+
+    def _forget(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[1]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'files': len(self._entries),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+            }
@@ -0,0 +1,196 @@
+"""
+Benchmark the workout analytics behind /api/users/<id>/stats.
+
+Generates synthetic histories (one workout a day, six exercises of four sets
+each) and times analytics.user_stats in two stages: flattening the workout dicts
+into columns, and computing the statistics from them. For comparison it also runs
+a straightforward per-set Python loop that builds the same response (totals,
+per-exercise totals, curves and PRs, and weekly totals), and checks both agree
+field by field.
+
+Usage (from the backend directory):
+    python -m benchmarks.analytics --workouts 1000 10000 50000
+"""
+import argparse
+import math
+import statistics
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+import analytics
+from benchmarks.responses import workout_history
+
+
+def _value(value):
+    """A set's reps, weight or duration as a float, with missing, zero and non-numeric values as 0."""
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _day(value):
+    try:
+        return date.fromisoformat(str(value)[:10]) if value else None
+    except ValueError:
+        return None
+
+
+def _max(values):
+    values = [v for v in values if v is not None]
+    return max(values) if values else None
+
+
+def _rounded(value):
+    return None if value is None else round(value, 2)
+
+
+def loop_stats(workouts, exercise_id=None):
+    """The same response as analytics.user_stats, computed set by set in plain Python."""
+    names = {}
+    sessions = defaultdict(dict)  # exercise key -> day -> session totals
+    weekly = {}
+    totals = {'sets': 0, 'reps': 0.0, 'volume': 0.0, 'duration_seconds': 0.0}
+    days = []
+    for w in workouts:
+        day = _day(w.get('date') or w.get('created_at'))
+        if day is not None:
+            days.append(day)
+            monday = day - timedelta(days=day.weekday())
+            week = weekly.get(monday)
+            if week is None:
+                week = weekly[monday] = {'workouts': 0, 'sets': 0, 'reps': 0.0, 'volume': 0.0, 'duration_seconds': 0.0}
+            week['workouts'] += 1
+        for entry in w.get('exercises') or ():
+            if not isinstance(entry, dict):
+                continue
+            key = entry.get('exercise_id') or entry.get('name')
+            sets = entry.get('sets')
+            if not key or not isinstance(sets, list) or not sets:
+                continue
+            names.setdefault(key, entry.get('name') or key)
+            if day is None:
+                continue
+            for s in sets:
+                if not isinstance(s, dict) or s.get('completed') is False:
+                    continue
+                reps, weight, duration = _value(s.get('reps')), _value(s.get('weight')), _value(s.get('duration'))
+                volume = reps * weight
+                e1rm = None
+                if weight > 0 and 1 <= reps <= analytics.MAX_E1RM_REPS:
+                    e1rm = weight if reps == 1 else weight * (1 + reps / 30)
+                session = sessions[key].get(day)
+                if session is None:
+                    session = sessions[key][day] = {'sets': 0, 'reps': 0.0, 'volume': 0.0, 'duration': 0.0,
+                                                    'best_weight': None, 'e1rm': None}
+                session['sets'] += 1
+                session['reps'] += reps
+                session['volume'] += volume
+                session['duration'] += duration
+                if weight and (session['best_weight'] is None or weight > session['best_weight']):
+                    session['best_weight'] = weight
+                if e1rm is not None and (session['e1rm'] is None or e1rm > session['e1rm']):
+                    session['e1rm'] = e1rm
+                for bucket in (totals, week):
+                    bucket['sets'] += 1
+                    bucket['reps'] += reps
+                    bucket['volume'] += volume
+                    bucket['duration_seconds'] += duration
+
+    exercises = []
+    for key, by_day in sessions.items():
+        if exercise_id is not None and key != exercise_id:
+            continue
+        ordered = sorted(by_day)
+        curve = [by_day[d] for d in ordered]
+        prs, best = [], None
+        for d, session in zip(ordered, curve):
+            if best is not None and session['e1rm'] is not None and session['e1rm'] > best:
+                prs.append({'date': d.isoformat(), 'e1rm': _rounded(session['e1rm']),
+                            'weight': _rounded(session['best_weight'])})
+            best = _max([best, session['e1rm']])
+        exercises.append({
+            'exercise_id': key,
+            'name': names[key],
+            'sessions': len(curve),
+            'sets': sum(c['sets'] for c in curve),
+            'reps': _rounded(sum(c['reps'] for c in curve)),
+            'volume': _rounded(sum(c['volume'] for c in curve)),
+            'duration_seconds': _rounded(sum(c['duration'] for c in curve)),
+            'best_weight': _rounded(_max(c['best_weight'] for c in curve)),
+            'best_e1rm': _rounded(_max(c['e1rm'] for c in curve)),
+            'first_date': ordered[0].isoformat(),
+            'last_date': ordered[-1].isoformat(),
+            'curve': {
+                'dates': [d.isoformat() for d in ordered],
+                'sets': [c['sets'] for c in curve],
+                'volume': [_rounded(c['volume']) for c in curve],
+                'best_weight': [_rounded(c['best_weight']) for c in curve],
+                'e1rm': [_rounded(c['e1rm']) for c in curve],
+            },
+            'prs': prs,
+        })
+    exercises.sort(key=lambda entry: (-entry['sets'], entry['name']))
+
+    return {
+        'workouts': len(workouts),
+        'first_date': min(days).isoformat() if days else None,
+        'last_date': max(days).isoformat() if days else None,
+        'totals': {name: value if name == 'sets' else _rounded(value) for name, value in totals.items()},
+        'exercises': exercises,
+        'weekly': [
+            dict({'week': week.isoformat()},
+                 **{name: value if name in ('workouts', 'sets') else _rounded(value) for name, value in t.items()})
+            for week, t in sorted(weekly.items())
+        ],
+    }
+
+
+def check(result, reference, path='stats'):
+    """Assert two responses are equal, allowing for rounding differences in floats."""
+    if isinstance(reference, float) and isinstance(result, (int, float)):
+        assert math.isclose(result, reference, rel_tol=1e-9, abs_tol=0.011), (path, result, reference)
+    elif isinstance(reference, dict):
+        assert isinstance(result, dict) and result.keys() == reference.keys(), (path, result.keys(), reference.keys())
+        for key in reference:
+            check(result[key], reference[key], f"{path}.{key}")
+    elif isinstance(reference, list):
+        assert isinstance(result, list) and len(result) == len(reference), (path, len(result), len(reference))
+        for i, (a, b) in enumerate(zip(result, reference)):
+            check(a, b, f"{path}[{i}]")
+    else:
+        assert result == reference, (path, result, reference)
+
+
+def timed(fn, repeat):
+    """Return (result, median milliseconds) over repeat calls."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        durations.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workouts', type=int, nargs='+', default=[1000, 10000, 50000],
+                        help='history sizes to measure')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement')
+    args = parser.parse_args()
+
+    print(f"{'workouts':>9} {'sets':>9} {'flatten ms':>11} {'compute ms':>11} {'total ms':>9} {'loop ms':>9}")
+    for count in args.workouts:
+        workouts = workout_history(count)['workouts']
+        history, flatten_ms = timed(lambda: analytics.History(workouts), args.repeat)
+        _, compute_ms = timed(lambda: (analytics.exercise_stats(history), analytics.weekly_totals(history)),
+                              args.repeat)
+        result, total_ms = timed(lambda: analytics.user_stats(workouts), args.repeat)
+        reference, loop_ms = timed(lambda: loop_stats(workouts), args.repeat)
+        check(result, reference)
+        print(f"{count:>9} {len(history):>9} {flatten_ms:>11.1f} {compute_ms:>11.1f} {total_ms:>9.1f} {loop_ms:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
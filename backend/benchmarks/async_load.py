@@ -0,0 +1,99 @@
+"""
+Load test the sync and async data layers under concurrent requests.
+
+Each request loads a routine screen: the routine document plus its merged
+exercises. The sync path runs FirebaseHandler on a fixed pool of threads, like
+a threaded WSGI worker. The async path runs AsyncFirebaseHandler on one event
+loop and reads the routine and its exercises concurrently with asyncio.gather.
+Both use in-memory fake clients with the same injected latency and the read
+cache disabled, so every request goes to the (fake) backend.
+
+Usage (from the backend directory):
+    python -m benchmarks.async_load --requests 400 --threads 8 --latency 0.02
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from async_firebase_handler import AsyncFirebaseHandler
+from cache import TTLCache
+from fake_firestore import FakeAsyncFirestore, FakeFirestore, seed_routine
+from firebase_handler import FirebaseHandler
+
+
+def seed(db, routines, exercises):
+    for i in range(routines):
+        seed_routine(db, f"routine-{i}", exercises)
+
+
+def report(name, latencies, elapsed, db):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p95 = latencies[int(len(latencies) * 0.95)]
+    print(f"{name:<22} {len(latencies) / elapsed:8.1f} req/s   p50 {p50 * 1000:7.1f} ms   "
+          f"p95 {p95 * 1000:7.1f} ms   round trips {db.round_trips}")
+
+
+def run_sync(args):
+    db = FakeFirestore(latency=args.latency)
+    seed(db, args.routines, args.exercises)
+    handler = FirebaseHandler(db=db, cache=TTLCache(max_entries=0))
+
+    def load_routine(i):
+        start = time.perf_counter()
+        routine_id = f"routine-{i % args.routines}"
+        handler.get_routine(routine_id)
+        handler.get_exercises(routine_id)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        latencies = list(pool.map(load_routine, range(args.requests)))
+    report(f"sync ({args.threads} threads)", latencies, time.perf_counter() - start, db)
+
+
+def run_async(args):
+    db = FakeAsyncFirestore(latency=args.latency)
+    seed(db, args.routines, args.exercises)
+    handler = AsyncFirebaseHandler(db=db, cache=TTLCache(max_entries=0))
+
+    async def load_routine(i):
+        start = time.perf_counter()
+        routine_id = f"routine-{i % args.routines}"
+        await asyncio.gather(handler.get_routine(routine_id), handler.get_exercises(routine_id))
+        return time.perf_counter() - start
+
+    async def main():
+        # Bound in-flight requests like an ASGI server's connection limit
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def bounded(i):
+            async with semaphore:
+                return await load_routine(i)
+
+        return await asyncio.gather(*(bounded(i) for i in range(args.requests)))
+
+    start = time.perf_counter()
+    latencies = asyncio.run(main())
+    report(f"async (≤{args.concurrency} in flight)", latencies, time.perf_counter() - start, db)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--threads', type=int, default=8, help='threads serving the sync path')
+    parser.add_argument('--concurrency', type=int, default=100, help='requests in flight on the async path')
+    parser.add_argument('--routines', type=int, default=50, help='distinct routines requested')
+    parser.add_argument('--exercises', type=int, default=12, help='exercises per routine')
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds per round trip')
+    args = parser.parse_args()
+
+    print(f"{args.requests} routine loads over {args.routines} routines with {args.exercises} exercises, "
+          f"{args.latency * 1000:.0f} ms per round trip")
+    run_sync(args)
+    run_async(args)
+
+
+if __name__ == '__main__':
+    main()
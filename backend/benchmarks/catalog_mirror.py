@@ -0,0 +1,92 @@
+"""
+Exercise the snapshot-listener catalog mirror against FakeFirestore's change stream.
+
+Checks that mirrored reads match direct reads after routine, exercise and link
+writes, that reads fall back to Firestore when a listener drops, and reports
+round trips and latency per read for both paths.
+
+Usage (from the backend directory):
+    python -m benchmarks.catalog_mirror --exercises 12 --latency 0.01
+"""
+import argparse
+import time
+
+from cache import TTLCache
+from fake_firestore import FakeFirestore, seed_routine
+from firebase_handler import FirebaseHandler
+
+
+def snapshot(handler, routine_id):
+    return {
+        'routines': sorted(handler.get_routines(), key=lambda r: r['id']),
+        'catalog': sorted(handler.get_exercises(), key=lambda e: e['id']),
+        'exercises': handler.get_exercises(routine_id),
+        'link': handler.get_routine_exercise(f"{routine_id}-link-0"),
+    }
+
+
+def check(direct, mirrored, routine_id, step):
+    if snapshot(direct, routine_id) != snapshot(mirrored, routine_id):
+        raise SystemExit(f"Mirror diverged from Firestore after: {step}")
+    print(f"ok  {step}")
+
+
+def measure(name, fn, db, iterations):
+    db.reset_counters()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<10} round trips/read: {db.round_trips / iterations:5.1f}   "
+          f"latency/read: {elapsed / iterations * 1000:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--exercises', type=int, default=12, help='exercises in the routine')
+    parser.add_argument('--latency', type=float, default=0.01, help='seconds per round trip')
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    db = FakeFirestore()
+    routine_id = 'routine-1'
+    seed_routine(db, routine_id, args.exercises)
+
+    # The direct handler has caching disabled so it always reflects Firestore
+    direct = FirebaseHandler(db=db, cache=TTLCache(max_entries=0))
+    mirrored = FirebaseHandler(db=db, cache=TTLCache(max_entries=0))
+    if not mirrored.start_catalog_mirror(timeout=1):
+        raise SystemExit("Mirror did not become ready")
+
+    check(direct, mirrored, routine_id, 'initial snapshot')
+    mirrored.update_exercise(f"{routine_id}-exercise-0", {'name': 'Renamed'})
+    check(direct, mirrored, routine_id, 'catalog exercise update')
+    mirrored.update_routine_exercise(f"{routine_id}-link-0", {'order': args.exercises + 1, 'sets': 6})
+    check(direct, mirrored, routine_id, 'link reorder')
+    mirrored.create_routine_exercise({'routine_id': routine_id, 'exercise_id': f"{routine_id}-exercise-1", 'order': 0})
+    check(direct, mirrored, routine_id, 'link create with repeated exercise')
+    mirrored.delete_exercise(f"{routine_id}-exercise-2")
+    check(direct, mirrored, routine_id, 'catalog exercise delete')
+    mirrored.create_routine({'id': 'routine-2', 'name': 'Second'})
+    check(direct, mirrored, routine_id, 'routine create')
+
+    db.latency = args.latency
+    measure('direct', lambda: direct.get_exercises(routine_id), db, args.iterations)
+    measure('mirror', lambda: mirrored.get_exercises(routine_id), db, args.iterations)
+
+    for watch in mirrored.mirror._watches.values():
+        watch.drop()
+    mirrored.mirror.resubscribe_interval = float('inf')
+    measure('dropped', lambda: mirrored.get_exercises(routine_id), db, args.iterations)
+    db.latency = 0
+    check(direct, mirrored, routine_id, 'fallback to direct reads after listener drop')
+
+    mirrored.mirror.resubscribe_interval = 0
+    mirrored.get_routines()
+    if not mirrored.mirror.is_live():
+        raise SystemExit("Mirror did not recover after resubscribing")
+    check(direct, mirrored, routine_id, 'resubscribe after drop')
+
+
+if __name__ == '__main__':
+    main()
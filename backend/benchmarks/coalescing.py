@@ -0,0 +1,81 @@
+"""
+Benchmark a thundering herd of identical FirebaseHandler.get_exercises(routine_id) calls.
+
+Starts many threads that all load the same routine at once, as when a class
+starts a routine together, and counts Firestore round trips with and without
+single-flight coalescing. The read cache is disabled so every call misses.
+
+Usage (from the backend directory):
+    python -m benchmarks.coalescing --clients 50 --latency 0.05
+"""
+import argparse
+import threading
+import time
+
+from cache import TTLCache
+from fake_firestore import FakeFirestore, seed_routine
+from firebase_handler import FirebaseHandler
+
+
+class NoFlights:
+    """Stand-in for SingleFlight that runs every call."""
+
+    def do(self, key, fn):
+        return fn()
+
+    def forget(self, *keys):
+        pass
+
+
+def herd(handler, routine_id, clients):
+    """Call get_exercises from clients threads released at the same moment."""
+    barrier = threading.Barrier(clients)
+    results = [None] * clients
+
+    def client(index):
+        barrier.wait()
+        results[index] = handler.get_exercises(routine_id)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def measure(name, handler, db, clients):
+    db.reset_counters()
+    start = time.perf_counter()
+    results = herd(handler, 'routine-1', clients)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<12} round trips: {db.round_trips:5d}   wall time: {elapsed * 1000:8.2f} ms")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=50, help='concurrent callers')
+    parser.add_argument('--exercises', type=int, default=12, help='exercises in the routine')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per round trip')
+    args = parser.parse_args()
+
+    db = FakeFirestore(latency=args.latency)
+    seed_routine(db, 'routine-1', args.exercises)
+
+    print(f"{args.clients} concurrent loads of a routine with {args.exercises} exercises, "
+          f"{args.latency * 1000:.0f} ms per round trip")
+    uncoalesced = FirebaseHandler(db=db, cache=TTLCache(max_entries=0))
+    uncoalesced.flights = NoFlights()
+    baseline = measure('independent', uncoalesced, db, args.clients)
+
+    handler = FirebaseHandler(db=db, cache=TTLCache(max_entries=0))
+    coalesced = measure('coalesced', handler, db, args.clients)
+    print(f"coalescing stats: {handler.flights.stats()}")
+
+    if baseline != coalesced:
+        raise SystemExit("Coalesced results differ from independent results")
+
+
+if __name__ == '__main__':
+    main()
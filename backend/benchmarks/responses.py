@@ -0,0 +1,99 @@
+"""
+Microbenchmark JSON encoding and compression of a workout history response.
+
+Builds a realistic /api/workouts body (workouts with several exercises and
+logged sets), then measures CPU time per response and bytes on the wire for each
+available JSON encoder, whole-body versus streamed encoding, and each
+compression encoding.
+
+Usage (from the backend directory):
+    python -m benchmarks.responses --workouts 200 --repeat 50
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import fastjson
+from compression import CompressionPolicy, brotli
+
+EXERCISES = ['Squats', 'Romanian Deadlifts', 'Leg Press', 'Calf Raises', 'Bench Press', 'Barbell Rows',
+             'Overhead Press', 'Pull-ups', 'Lunges', 'Plank']
+
+
+def workout_history(count, seed=0):
+    """Return count workouts shaped like the ones the workout page saves."""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, 7, 0)
+    workouts = []
+    for i in range(count):
+        created_at = start + timedelta(days=i, minutes=rng.randrange(120))
+        exercises = []
+        for order, name in enumerate(rng.sample(EXERCISES, 6), start=1):
+            exercises.append({
+                'exercise_id': name.lower().replace(' ', '-'),
+                'name': name,
+                'order': order,
+                'sets': [
+                    {'set_number': n, 'reps': rng.randint(6, 12), 'weight': round(rng.uniform(20, 140), 1),
+                     'rep_time': 3, 'completed': True}
+                    for n in range(1, 5)
+                ],
+                'rest_time': 90,
+            })
+        workouts.append({
+            'id': f"workout-{i:05d}",
+            'user_id': 'user-1',
+            'routine_id': f"routine-{i % 4}",
+            'routine_name': ['Legs', 'Push', 'Pull', 'Core'][i % 4],
+            'exercises': exercises,
+            'duration_seconds': rng.randint(1800, 4200),
+            'notes': rng.choice(['', 'Felt strong today.', 'Cut the last set short.']),
+            'created_at': created_at.isoformat(),
+            'updated_at': created_at.isoformat(),
+        })
+    return {'workouts': workouts}
+
+
+def timed(fn, repeat):
+    """Return (result, median milliseconds) over repeat calls."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        durations.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workouts', type=int, default=200, help='workouts in the response')
+    parser.add_argument('--repeat', type=int, default=50, help='runs per measurement')
+    args = parser.parse_args()
+
+    body = workout_history(args.workouts)
+    print(f"Response: {args.workouts} workouts")
+    print(f"{'encoder':<8} {'mode':<8} {'ms':>8} {'bytes':>10}")
+    payload = None
+    for name in fastjson.ENCODERS:
+        encoder = fastjson.get_encoder(name)
+        encoded, ms = timed(lambda: encoder(body), args.repeat)
+        print(f"{name:<8} {'whole':<8} {ms:>8.2f} {len(encoded):>10}")
+        streamed, ms = timed(lambda: b''.join(fastjson.iter_dumps(body, 'workouts', encoder)), args.repeat)
+        print(f"{name:<8} {'streamed':<8} {ms:>8.2f} {len(streamed):>10}")
+        payload = encoded
+
+    policy = CompressionPolicy(enabled=True)
+    print()
+    print(f"{'encoding':<8} {'ms':>8} {'bytes':>10} {'ratio':>7}")
+    print(f"{'identity':<8} {0:>8.2f} {len(payload):>10} {1:>7.1f}")
+    for encoding in ['gzip'] + (['br'] if brotli is not None else []):
+        compressed, ms = timed(lambda: policy.compress(payload, encoding), args.repeat)
+        print(f"{encoding:<8} {ms:>8.2f} {len(compressed):>10} {len(payload) / len(compressed):>7.1f}")
+    if brotli is None:
+        print("(install brotli to measure br)")
+
+
+if __name__ == '__main__':
+    main()
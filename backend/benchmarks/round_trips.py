@@ -0,0 +1,68 @@
+"""
+Benchmark Firestore round trips for FirebaseHandler.get_exercises(routine_id).
+
+Compares the batched catalog read against the previous per-link get() loop
+using the in-memory FakeFirestore, with optional injected latency.
+
+Usage (from the backend directory):
+    python -m benchmarks.round_trips --exercises 12 --latency 0.02
+"""
+import argparse
+import time
+
+from cache import TTLCache
+from fake_firestore import FakeFirestore, seed_routine
+from firebase_handler import FirebaseHandler
+
+
+def per_link_get_exercises(handler, routine_id):
+    """The previous implementation: one catalog get() per routine exercise."""
+    links = []
+    for doc in handler.db.collection('routine_exercises').where('routine_id', '==', routine_id).stream():
+        re_data = doc.to_dict()
+        re_data['id'] = doc.id
+        links.append(re_data)
+    links.sort(key=lambda x: x.get('order', 0))
+
+    exercises = []
+    for re_data in links:
+        exercise_doc = handler.db.collection('exercises').document(re_data['exercise_id']).get()
+        if exercise_doc.exists:
+            exercise_data = exercise_doc.to_dict()
+            exercise_data['id'] = exercise_doc.id
+            exercises.append(handler._merge_routine_exercise(exercise_data, re_data))
+    return exercises
+
+
+def measure(name, fn, db, iterations):
+    db.reset_counters()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<12} round trips/request: {db.round_trips / iterations:6.1f}   "
+          f"latency/request: {elapsed / iterations * 1000:8.2f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--exercises', type=int, default=12, help='exercises in the routine')
+    parser.add_argument('--latency', type=float, default=0.01, help='seconds per round trip')
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    db = FakeFirestore(latency=args.latency)
+    seed_routine(db, 'routine-1', args.exercises)
+    handler = FirebaseHandler(db=db, cache=TTLCache(max_entries=0))
+
+    print(f"Routine with {args.exercises} exercises, {args.latency * 1000:.0f} ms per round trip")
+    legacy = measure('per-link', lambda: per_link_get_exercises(handler, 'routine-1'), db, args.iterations)
+    batched = measure('batched', lambda: handler.get_exercises('routine-1'), db, args.iterations)
+
+    if legacy != batched:
+        raise SystemExit("Batched result differs from per-link result")
+
+
+if __name__ == '__main__':
+    main()
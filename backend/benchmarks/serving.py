@@ -0,0 +1,123 @@
+"""
+Compare read-endpoint throughput of the Flask development server and gunicorn.
+
+Each server runs the real app against an in-memory FakeFirestore seeded with
+routines, with injected latency per round trip. Client threads cycle through
+GET /api/routines, /api/routines/<id>, /api/exercises?routine_id=<id> and
+/api/routines/<id>/plan over keep-alive connections for a fixed duration.
+
+Usage (from the backend directory):
+    python -m benchmarks.serving --duration 10 --connections 32
+"""
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from fake_firestore import FakeFirestore, seed_routine
+
+ROUTINES = 20
+
+
+def fake_app():
+    """App factory for the benchmark servers: the real app on a seeded FakeFirestore."""
+    import app
+    db = FakeFirestore(latency=float(os.environ.get('BENCHMARK_LATENCY', 0.005)))
+    for i in range(ROUTINES):
+        seed_routine(db, f"routine-{i}", 12)
+    return app.create_app(db=db)
+
+
+def wait_for_server(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/api/health')
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f"Server on port {port} did not start")
+
+
+def load(port, duration, connections):
+    """Run client threads for duration seconds. Returns (requests per second, error count)."""
+    paths = []
+    for i in range(ROUTINES):
+        paths += ['/api/routines', f"/api/routines/routine-{i}",
+                  f"/api/exercises?routine_id=routine-{i}", f"/api/routines/routine-{i}/plan"]
+    counts = [0] * connections
+    errors = [0] * connections
+    deadline = time.monotonic() + duration
+
+    def client(index):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        n = index
+        while time.monotonic() < deadline:
+            try:
+                connection.request('GET', paths[n % len(paths)])
+                response = connection.getresponse()
+                response.read()
+                if response.status == 200:
+                    counts[index] += 1
+                else:
+                    errors[index] += 1
+            except (OSError, http.client.HTTPException):
+                errors[index] += 1
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            n += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / duration, sum(errors)
+
+
+def run(name, command, port, args):
+    env = dict(os.environ, BENCHMARK_LATENCY=str(args.latency), PYTHONUNBUFFERED='1')
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_server(port)
+        throughput, errors = load(port, args.duration, args.connections)
+        print(f"{name:<34} {throughput:8.1f} req/s   {errors} errors")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=10, help='seconds of load per server')
+    parser.add_argument('--connections', type=int, default=32, help='concurrent client connections')
+    parser.add_argument('--latency', type=float, default=0.005, help='seconds per Firestore round trip')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() * 2 + 1, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker')
+    args = parser.parse_args()
+
+    print(f"{args.connections} connections for {args.duration:.0f}s, {args.latency * 1000:.0f} ms per round trip, "
+          f"{os.cpu_count()} CPUs")
+    run('flask dev server (debug=True)',
+        [sys.executable, '-c', "from benchmarks.serving import fake_app; "
+                               "fake_app().run(host='127.0.0.1', port=5101, debug=True, use_reloader=False)"],
+        5101, args)
+    run('flask dev server (threaded)',
+        [sys.executable, '-c', "from benchmarks.serving import fake_app; "
+                               "fake_app().run(host='127.0.0.1', port=5102, threaded=True)"],
+        5102, args)
+    run(f"gunicorn ({args.workers} workers x {args.threads} threads)",
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', '127.0.0.1:5103',
+         '--workers', str(args.workers), '--threads', str(args.threads),
+         # No worker recycling mid-run, which would drop keep-alive connections
+         '--max-requests', '0', 'benchmarks.serving:fake_app()'],
+        5103, args)
+
+
+if __name__ == '__main__':
+    main()
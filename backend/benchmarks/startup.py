@@ -0,0 +1,125 @@
+"""
+Benchmark cold start: how long the app takes to import, and how long a freshly
+started server takes to answer.
+
+Import time is measured in fresh interpreters (`import app`), with the modules
+that contribute most to it from `python -X importtime`. Time to first response
+starts a server process and polls it, timing from the spawn until the first 200
+from /api/health (liveness), the first 200 from a data endpoint (/api/routines,
+which opens the storage if the warm-up hasn't yet), and the first 200 from
+/api/ready. Servers use a SQLite database seeded with a few routines, or
+Firestore with the credentials in the environment when run with
+--storage firestore.
+
+Usage (from the backend directory):
+    python -m benchmarks.startup --runs 5
+"""
+import argparse
+import http.client
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.storage import seed
+from sqlite_store import SQLiteStore
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def import_time(env):
+    """Milliseconds to import app in a fresh interpreter."""
+    code = "import time; start = time.perf_counter(); import app; print((time.perf_counter() - start) * 1000)"
+    output = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def heaviest_imports(env, count):
+    """The count modules imported directly by app (or its local modules) that take longest, with
+    their cumulative import time in milliseconds.
+    """
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], env=env,
+                            capture_output=True, text=True, check=True)
+    modules, pending = [], []
+    for line in output.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        # Children are listed before their parent: depth 1 lines belong to the next depth 0 line,
+        # which is app or something the interpreter imports at startup (site)
+        if len(match.group(3)) == 3:
+            pending.append((int(match.group(2)) / 1000, match.group(4)))
+        elif len(match.group(3)) == 1:
+            if match.group(4) == 'app':
+                modules.extend(pending)
+            pending = []
+    return sorted(modules, reverse=True)[:count]
+
+
+def first_ok(port, path, deadline):
+    """Poll path until it answers 200; return the time it did."""
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            connection.close()
+            if response.status == 200:
+                return time.monotonic()
+        except OSError:
+            pass
+        time.sleep(0.005)
+    raise SystemExit(f"{path} on port {port} did not answer 200")
+
+
+def time_to_responses(command, port, env, timeout=60):
+    """Milliseconds from starting command until health, data and readiness first answer 200."""
+    start = time.monotonic()
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = start + timeout
+        return [(first_ok(port, path, deadline) - start) * 1000
+                for path in ('/api/health', '/api/routines', '/api/ready')]
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='measurements per figure (the median is reported)')
+    parser.add_argument('--storage', choices=('sqlite', 'firestore'), default='sqlite')
+    parser.add_argument('--top', type=int, default=8, help='heaviest imports to list')
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONUNBUFFERED='1', STORAGE_BACKEND=args.storage)
+    with tempfile.TemporaryDirectory() as directory:
+        if args.storage == 'sqlite':
+            env['SQLITE_PATH'] = os.path.join(directory, 'startup.db')
+            store = SQLiteStore(env['SQLITE_PATH'])
+            seed(store, routines=5, exercises_per_routine=12, users=1, workouts_per_user=1)
+            store.close()
+
+        imports = [import_time(env) for _ in range(args.runs)]
+        print(f"import app: {statistics.median(imports):.0f} ms (median of {args.runs})")
+        for milliseconds, module in heaviest_imports(env, args.top):
+            print(f"  {module:<28} {milliseconds:7.1f} ms")
+
+        servers = [
+            ('flask dev server', [sys.executable, 'app.py'], 5111, {'PORT': '5111'}),
+            ('gunicorn (1 worker)', [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+                                     '--bind', '127.0.0.1:5112', '--workers', '1'], 5112, {}),
+        ]
+        print(f"\n{'server':<22} {'health ms':>10} {'first data ms':>14} {'ready ms':>9}")
+        for name, command, port, overrides in servers:
+            timings = [time_to_responses(command, port, dict(env, **overrides)) for _ in range(args.runs)]
+            health, data, ready = (statistics.median(column) for column in zip(*timings))
+            print(f"{name:<22} {health:>10.0f} {data:>14.0f} {ready:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
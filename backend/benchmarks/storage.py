@@ -0,0 +1,131 @@
+"""
+Benchmark FirebaseHandler on the SQLite storage backend.
+
+Seeds a SQLite database file with routines, catalog exercises and workout
+histories, then times the handler's hottest reads with the read cache disabled,
+so every call reaches the database: a page of a user's workouts, a routine's
+exercises and a routine plan. Each operation runs from one thread and then
+from --threads threads at once.
+
+Usage (from the backend directory):
+    python -m benchmarks.storage --users 1000 --workouts 50 --threads 8
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from cache import TTLCache
+from firebase_handler import BATCH_WRITE_LIMIT, FirebaseHandler
+from sqlite_store import SQLiteStore
+
+
+def seed(db, routines, exercises_per_routine, users, workouts_per_user):
+    """Write the benchmark data set in batches."""
+    writes = []
+    for r in range(routines):
+        routine_id = f"routine-{r}"
+        writes.append((db.collection('routines').document(routine_id), {'name': f"Routine {r}"}))
+        for i in range(exercises_per_routine):
+            exercise_id = f"{routine_id}-exercise-{i}"
+            writes.append((db.collection('exercises').document(exercise_id), {
+                'name': f"Exercise {r}-{i}",
+                'default_sets': 3,
+                'default_reps': 10,
+                'default_rep_time': 2,
+                'default_rest_time': 60,
+            }))
+            writes.append((db.collection('routine_exercises').document(f"{routine_id}-link-{i}"), {
+                'routine_id': routine_id,
+                'exercise_id': exercise_id,
+                'order': i + 1,
+                'sets': 4,
+                'reps': 8,
+                'rest_time': 90,
+                'rep_time': 3,
+            }))
+    for u in range(users):
+        for w in range(workouts_per_user):
+            writes.append((db.collection('workouts').document(f"user-{u}-workout-{w}"), {
+                'user_id': f"user-{u}",
+                'routine_id': f"routine-{w % routines}",
+                'created_at': f"2024-{w // 28 % 12 + 1:02d}-{w % 28 + 1:02d}T07:{u % 60:02d}:00",
+                'exercises': [{'name': f"Exercise {w % routines}-{i}", 'reps': 8, 'weight': 60} for i in range(4)],
+            }))
+
+    for start in range(0, len(writes), BATCH_WRITE_LIMIT):
+        batch = db.batch()
+        for reference, data in writes[start:start + BATCH_WRITE_LIMIT]:
+            batch.set(reference, data)
+        batch.commit()
+    return len(writes)
+
+
+def run(operation, calls, threads):
+    """Run operation calls times across threads; return (ops/s, per-call latencies in ms)."""
+    latencies = []
+    lock = threading.Lock()
+    per_thread = calls // threads
+
+    def worker():
+        local = []
+        for _ in range(per_thread):
+            start = time.perf_counter()
+            operation()
+            local.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000, help='users with a workout history')
+    parser.add_argument('--workouts', type=int, default=50, help='workouts per user')
+    parser.add_argument('--routines', type=int, default=20, help='routines in the catalog')
+    parser.add_argument('--exercises', type=int, default=12, help='exercises per routine')
+    parser.add_argument('--calls', type=int, default=2000, help='calls per operation and thread count')
+    parser.add_argument('--threads', type=int, default=8, help='threads for the concurrent run')
+    parser.add_argument('--page-size', type=int, default=20, help='workouts per page')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = SQLiteStore(os.path.join(directory, 'benchmark.db'))
+        start = time.perf_counter()
+        documents = seed(db, args.routines, args.exercises, args.users, args.workouts)
+        print(f"Seeded {documents} documents in {time.perf_counter() - start:.1f} s")
+
+        # Every call reaches SQLite
+        handler = FirebaseHandler(db=db, cache=TTLCache(max_entries=0))
+        rng = random.Random(0)
+        operations = [
+            ('workouts page', lambda: handler.get_workouts_page(f"user-{rng.randrange(args.users)}", args.page_size)),
+            ('routine exercises', lambda: handler.get_exercises(f"routine-{rng.randrange(args.routines)}")),
+            ('routine plan', lambda: handler.get_routine_plan(f"routine-{rng.randrange(args.routines)}")),
+        ]
+        for _, operation in operations:
+            operation()  # Builds the routine plans and opens this thread's connection
+
+        print(f"{'operation':<18} {'threads':>7} {'ops/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+        for name, operation in operations:
+            for threads in sorted({1, args.threads}):
+                throughput, latencies = run(operation, args.calls, threads)
+                latencies.sort()
+                p99 = latencies[int(len(latencies) * 0.99) - 1]
+                print(f"{name:<18} {threads:>7} {throughput:>9.0f} {statistics.median(latencies):>8.3f} {p99:>8.3f}")
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
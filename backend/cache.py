@@ -0,0 +1,155 @@
+"""
+Bounded in-process LRU cache with per-entry TTL and tag-based invalidation.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after ``ttl`` seconds.
+
+    Entries can be stored with tags; invalidate_tag() drops every entry that
+    carries a tag, which lets writers invalidate derived results (e.g. a
+    routine's merged exercise list) without knowing their exact keys.
+    Values are deep-copied on the way in and out so callers can mutate what
+    they get back.
+
+    A read that races with a write must not cache what it read before the
+    write. Readers take generation() before reading and pass it to set() as
+    since; set() then skips the store if the key, or any of its tags, was
+    invalidated after that.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self._tags = {}  # tag -> set of keys
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_sets = 0
+        self._generation = 0  # bumped by every invalidation
+        self._invalidated_keys = {}  # key -> generation of its last invalidation
+        self._invalidated_tags = {}  # tag -> generation of its last invalidation
+        # Reads that started before this generation are never stored
+        self._floor = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.ttl > 0
+
+    def get(self, key):
+        """Return (True, value) on a hit, (False, None) on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            expires_at, value, _ = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return True, copy.deepcopy(value)
+
+    def generation(self):
+        """Return the current invalidation generation, to pass to set() as since."""
+        with self._lock:
+            return self._generation
+
+    def set(self, key, value, tags=(), since=None):
+        """Store value under key. With since (a generation() taken before value was read), the
+        value is not stored if key or one of its tags has been invalidated since.
+        """
+        if not self.enabled:
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            if since is not None and self._invalidated_since(since, key, tags):
+                self.stale_sets += 1
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, *keys):
+        """Drop the given keys."""
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._invalidated_keys[key] = self._generation
+                if key in self._entries:
+                    self._remove(key)
+                    self.invalidations += 1
+            self._trim_generations()
+
+    def invalidate_tag(self, *tags):
+        """Drop every entry stored with any of the given tags."""
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                self._invalidated_tags[tag] = self._generation
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+            self._trim_generations()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._generation += 1
+            self._floor = self._generation
+            self._invalidated_keys.clear()
+            self._invalidated_tags.clear()
+
+    def _invalidated_since(self, since, key, tags):
+        if since < self._floor or self._invalidated_keys.get(key, 0) > since:
+            return True
+        return any(self._invalidated_tags.get(tag, 0) > since for tag in tags)
+
+    def _trim_generations(self):
+        # Forget per-key generations once there are many of them; reads in flight across the
+        # trim are treated as invalidated, which only costs them their store
+        if len(self._invalidated_keys) + len(self._invalidated_tags) > 4 * max(self.max_entries, 256):
+            self._floor = self._generation
+            self._invalidated_keys.clear()
+            self._invalidated_tags.clear()
+
+    def _remove(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self):
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'stale_sets': self.stale_sets,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+            }
@@ -0,0 +1,193 @@
+"""
+Live in-memory mirror of the routines, exercises and routine_exercises collections.
+
+The mirror subscribes to Firestore snapshot listeners for the three catalog
+collections and keeps a materialized copy of every document, plus an index of
+routine_id -> links sorted by order, so FirebaseHandler can answer catalog reads
+without a network round trip.
+"""
+import copy
+import threading
+import time
+
+MIRRORED_COLLECTIONS = ('routines', 'exercises', 'routine_exercises')
+
+
+class CatalogMirror:
+    """Snapshot-listener-backed mirror of the catalog collections.
+
+    The mirror is only "live" once every listener has delivered its initial
+    snapshot and while all listeners are still active. Callers should check
+    is_live() and fall back to direct reads otherwise.
+    """
+
+    def __init__(self, db, resubscribe_interval=30):
+        self.db = db
+        self.resubscribe_interval = resubscribe_interval
+        self._docs = {name: {} for name in MIRRORED_COLLECTIONS}
+        self._links_by_routine = {}  # routine_id -> [link, ...] sorted by order
+        self._ready = {name: threading.Event() for name in MIRRORED_COLLECTIONS}
+        self._watches = {}
+        self._lock = threading.RLock()
+        self._last_subscribe = 0.0
+
+    # Lifecycle
+
+    def start(self, timeout=None):
+        """Subscribe to all collections and wait up to timeout seconds for readiness.
+        Returns True if the mirror is live.
+        """
+        self.stop()
+        with self._lock:
+            self._last_subscribe = time.monotonic()
+            for name in MIRRORED_COLLECTIONS:
+                self._docs[name] = {}
+                self._ready[name].clear()
+            self._links_by_routine = {}
+            for name in MIRRORED_COLLECTIONS:
+                self._watches[name] = self.db.collection(name).on_snapshot(self._listener(name))
+        return self.wait_ready(timeout)
+
+    def stop(self):
+        """Unsubscribe all listeners."""
+        with self._lock:
+            watches, self._watches = self._watches, {}
+            for name in MIRRORED_COLLECTIONS:
+                self._ready[name].clear()
+        for watch in watches.values():
+            try:
+                watch.unsubscribe()
+            except Exception as e:
+                print(f"Error unsubscribing catalog listener: {e}")
+
+    def wait_ready(self, timeout=None):
+        """Block until every listener has delivered its initial snapshot."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for event in self._ready.values():
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not event.wait(remaining):
+                return False
+        return True
+
+    def is_live(self):
+        """True if the mirror can serve reads.
+        If a listener has dropped, the mirror resubscribes in the background (at most once
+        every resubscribe_interval seconds) and reports not live until it is ready again.
+        """
+        if not self._watches:
+            return False
+        dropped = [name for name, watch in self._watches.items() if not getattr(watch, 'is_active', True)]
+        if dropped:
+            self._resubscribe(dropped)
+            return False
+        return all(event.is_set() for event in self._ready.values())
+
+    def _resubscribe(self, names):
+        with self._lock:
+            if time.monotonic() - self._last_subscribe < self.resubscribe_interval:
+                return
+            self._last_subscribe = time.monotonic()
+            print(f"Catalog listener dropped for {', '.join(names)}; resubscribing")
+            for name in names:
+                self._ready[name].clear()
+                try:
+                    self._watches[name] = self.db.collection(name).on_snapshot(self._listener(name))
+                except Exception as e:
+                    print(f"Error resubscribing catalog listener for {name}: {e}")
+
+    # Change stream handling
+
+    def _listener(self, name):
+        def on_snapshot(docs, changes, read_time):
+            try:
+                self._apply(name, docs, changes)
+            except Exception as e:
+                print(f"Error applying {name} snapshot: {e}")
+        return on_snapshot
+
+    def _apply(self, name, docs, changes):
+        with self._lock:
+            store = self._docs[name]
+            if not self._ready[name].is_set():
+                # The first snapshot is authoritative; reset to exactly its contents
+                store.clear()
+                for doc in docs:
+                    store[doc.id] = self._with_id(doc)
+                affected = None
+            else:
+                affected = set()
+                for change in changes:
+                    doc = change.document
+                    previous = store.get(doc.id)
+                    if change.type.name == 'REMOVED':
+                        store.pop(doc.id, None)
+                    else:
+                        store[doc.id] = self._with_id(doc)
+                    if name == 'routine_exercises':
+                        for link in (previous, store.get(doc.id)):
+                            if link:
+                                affected.add(link.get('routine_id'))
+            if name == 'routine_exercises':
+                self._reindex(affected)
+            self._ready[name].set()
+
+    def _with_id(self, doc):
+        data = doc.to_dict()
+        data['id'] = doc.id
+        return data
+
+    def _reindex(self, routine_ids=None):
+        """Rebuild the ordered link index, for all routines or just the given ones."""
+        links = self._docs['routine_exercises'].values()
+        if routine_ids is None:
+            index = {}
+            for link in links:
+                index.setdefault(link.get('routine_id'), []).append(link)
+            self._links_by_routine = index
+            routine_ids = list(index)
+        else:
+            for routine_id in routine_ids:
+                self._links_by_routine[routine_id] = [
+                    link for link in links if link.get('routine_id') == routine_id
+                ]
+        for routine_id in routine_ids:
+            routine_links = self._links_by_routine[routine_id]
+            if routine_links:
+                routine_links.sort(key=lambda x: x.get('order', 0))
+            else:
+                del self._links_by_routine[routine_id]
+
+    # Reads
+
+    def get_routines(self):
+        with self._lock:
+            return copy.deepcopy(list(self._docs['routines'].values()))
+
+    def get_routine(self, routine_id):
+        with self._lock:
+            return copy.deepcopy(self._docs['routines'].get(routine_id))
+
+    def get_exercises(self):
+        with self._lock:
+            return copy.deepcopy(list(self._docs['exercises'].values()))
+
+    def get_exercise(self, exercise_id):
+        with self._lock:
+            return copy.deepcopy(self._docs['exercises'].get(exercise_id))
+
+    def get_routine_links(self, routine_id):
+        """Links for a routine, sorted by order."""
+        with self._lock:
+            return copy.deepcopy(self._links_by_routine.get(routine_id, []))
+
+    def get_routine_link(self, routine_exercise_id):
+        with self._lock:
+            return copy.deepcopy(self._docs['routine_exercises'].get(routine_exercise_id))
+
+    def get_exercises_by_ids(self, exercise_ids):
+        with self._lock:
+            exercises = self._docs['exercises']
+            return {
+                exercise_id: copy.deepcopy(exercises[exercise_id])
+                for exercise_id in set(exercise_ids) if exercise_id in exercises
+            }
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Script to check users' user_stats rollups against their workout history, and rebuild those that differ.
+"""
+import sys
+from dotenv import load_dotenv
+from firebase_handler import FirebaseHandler
+
+# Load environment variables
+load_dotenv()
+
+def check_user_stats(user_ids=None, fix=False, rebuild=False):
+    """Compare each user's rollup with one rebuilt from their workouts. With fix set, rebuild the
+    inconsistent ones; with rebuild set, rebuild every rollup without comparing.
+    Returns the number of users whose rollup was inconsistent or could not be checked.
+    """
+    firebase = FirebaseHandler()
+    
+    problems = 0
+    for user_id in user_ids or firebase.get_user_ids():
+        if rebuild:
+            stats = firebase.rebuild_user_stats(user_id)
+            print(f"{user_id}: {'rebuilt' if stats is not None else 'rebuild failed'}")
+            problems += stats is None
+            continue
+        
+        differences = firebase.check_user_stats(user_id)
+        if differences is None:
+            print(f"{user_id}: check failed")
+            problems += 1
+            continue
+        if not differences:
+            continue
+        problems += 1
+        print(f"{user_id}: {len(differences)} differences")
+        for difference in differences:
+            print(f"  {difference}")
+        if fix:
+            print(f"  {'rebuilt' if firebase.rebuild_user_stats(user_id) is not None else 'rebuild failed'}")
+    
+    print(f"{problems} users with problems.")
+    return problems
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    users = [args[i + 1] for i, arg in enumerate(args[:-1]) if arg == '--user']
+    problems = check_user_stats(users, fix='--fix' in args, rebuild='--rebuild' in args)
+    sys.exit(1 if problems and '--fix' not in args and '--rebuild' not in args else 0)
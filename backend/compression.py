@@ -0,0 +1,108 @@
+"""
+Negotiated response compression.
+
+Responses with a compressible content type are gzip- or brotli-encoded according
+to the request's Accept-Encoding, once they reach COMPRESSION_MIN_BYTES. Brotli is
+offered only when the brotli package is installed. Streamed responses are
+compressed chunk by chunk as they are sent.
+"""
+import os
+import zlib
+
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+# Levels that keep per-request CPU low; the top levels cost several times more for a few percent
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def _env_int(name, default):
+    value = os.environ.get(name, '')
+    return int(value) if value.strip() else default
+
+
+class Compressor:
+    """Incremental gzip or brotli encoder for one response body."""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, data):
+        if self.encoding == 'br':
+            return self._brotli.process(data)
+        return self._zlib.compress(data)
+
+    def flush(self):
+        if self.encoding == 'br':
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+class CompressionPolicy:
+    """Decide whether and how to encode a response."""
+
+    def __init__(self, enabled=None, min_bytes=None):
+        if enabled is None:
+            enabled = os.environ.get('RESPONSE_COMPRESSION', 'true').lower() in ('1', 'true', 'yes')
+        self.enabled = enabled
+        self.min_bytes = min_bytes if min_bytes is not None else _env_int('COMPRESSION_MIN_BYTES', 1024)
+        self.encodings = ['br', 'gzip'] if brotli is not None else ['gzip']
+
+    def compressible(self, content_type):
+        return self.enabled and any(content_type.startswith(prefix) for prefix in COMPRESSIBLE_TYPES)
+
+    def choose(self, accept_encoding, content_type, length=None):
+        """Return 'br', 'gzip' or None for a response of content_type (length None if streamed)."""
+        if not accept_encoding or not self.compressible(content_type or ''):
+            return None
+        if length is not None and length < self.min_bytes:
+            return None
+        return parse_accept_header(accept_encoding).best_match(self.encodings)
+
+    def compress(self, data, encoding):
+        compressor = Compressor(encoding)
+        return compressor.compress(data) + compressor.flush()
+
+    def compress_stream(self, chunks, encoding):
+        compressor = Compressor(encoding)
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    def apply(self, response, accept_encoding):
+        """Compress a Werkzeug response in place if the client accepts it. Returns the response."""
+        if response.status_code < 200 or response.status_code in (204, 206, 304):
+            return response
+        if 'Content-Encoding' in response.headers or response.direct_passthrough:
+            return response
+        if not self.compressible(response.mimetype or ''):
+            return response
+        response.vary.add('Accept-Encoding')
+
+        length = None if response.is_streamed else response.calculate_content_length()
+        encoding = self.choose(accept_encoding, response.mimetype, length)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            body = response.response
+            chunks = (chunk.encode('utf-8') if isinstance(chunk, str) else chunk for chunk in body)
+            response.response = self.compress_stream(chunks, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            response.set_data(self.compress(response.get_data(), encoding))
+        response.headers['Content-Encoding'] = encoding
+        return response
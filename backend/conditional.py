@@ -0,0 +1,79 @@
+"""
+Validators for conditional GETs of routine and catalog responses.
+
+ETags are derived from each document's ID and updated_at, which FirebaseHandler
+stamps on every write, so checking If-None-Match costs a hash over a few short
+strings instead of serializing the response. Last-Modified is the newest
+updated_at among the documents.
+"""
+import hashlib
+import json
+from datetime import datetime, timezone
+
+from werkzeug.http import http_date, parse_date, parse_etags
+
+# Fields a routine_exercises link copies onto its catalog exercise; the exercise's
+# updated_at doesn't change when the link is edited
+ROUTINE_SETTING_FIELDS = ('routine_exercise_id', 'sets', 'reps', 'rep_time', 'rest_time', 'order')
+
+
+def _document_version(document):
+    if document.get('updated_at') is None:
+        # Documents written outside the app may not be stamped; fall back to their content
+        return json.dumps(document, sort_keys=True, default=str)
+    version = [str(document.get('id')), str(document['updated_at'])]
+    version.extend(str(document.get(field)) for field in ROUTINE_SETTING_FIELDS if field in document)
+    return '\x1f'.join(version)
+
+
+def _as_datetime(value):
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    # Timestamps stamped by FirebaseHandler are naive local time
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+
+class Validators:
+    """ETag, Last-Modified and Cache-Control for a response built from documents.
+
+    If-Modified-Since is only honored for single documents (single_document=True):
+    removing a document from a list doesn't move the list's Last-Modified.
+    """
+
+    def __init__(self, documents, cache_control, single_document=False):
+        if isinstance(documents, dict):
+            documents = [documents]
+        digest = hashlib.sha1()
+        for document in documents:
+            digest.update(_document_version(document).encode('utf-8'))
+            digest.update(b'\x1e')
+        self.tag = digest.hexdigest()
+        # Weak, so the tag survives content encodings applied downstream
+        self.etag = f'W/"{self.tag}"'
+        modified = [_as_datetime(document.get('updated_at')) for document in documents]
+        modified = [value for value in modified if value is not None]
+        self.last_modified = max(modified) if modified else None
+        self.cache_control = cache_control
+        self.single_document = single_document
+
+    def not_modified(self, if_none_match=None, if_modified_since=None):
+        """Whether the client's copy is current, given the request's conditional headers."""
+        if if_none_match:
+            # If-Modified-Since is ignored when If-None-Match is present (RFC 9110 13.1.3)
+            return parse_etags(if_none_match).contains_weak(self.tag)
+        if if_modified_since and self.single_document and self.last_modified is not None:
+            since = parse_date(if_modified_since)
+            return since is not None and self.last_modified <= since
+        return False
+
+    def headers(self):
+        """Response headers carrying the validators and caching policy."""
+        headers = {'ETag': self.etag, 'Cache-Control': self.cache_control}
+        if self.last_modified is not None:
+            headers['Last-Modified'] = http_date(self.last_modified)
+        return headers
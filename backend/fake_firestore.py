@@ -0,0 +1,469 @@
+"""
+In-memory stand-in for the Firestore client.
+
+Implements the subset of the google-cloud-firestore API that FirebaseHandler
+uses, and counts every call that would be a network round trip so scripts
+can measure how many reads and writes a request costs.
+"""
+import asyncio
+import copy
+import enum
+import operator
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from storage import transformed
+
+RANGE_OPERATORS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge, '!=': operator.ne}
+
+
+class ChangeType(enum.Enum):
+    ADDED = 1
+    REMOVED = 2
+    MODIFIED = 3
+
+
+class FakeDocumentChange:
+    """A single document change delivered to a snapshot listener."""
+
+    def __init__(self, change_type, document):
+        self.type = change_type
+        self.document = document
+
+
+class FakeWatch:
+    """Handle returned by on_snapshot(), mirroring firestore's Watch."""
+
+    def __init__(self, client, collection_path, callback):
+        self._client = client
+        self._collection_path = collection_path
+        self._callback = callback
+        self.is_active = True
+
+    def unsubscribe(self):
+        self.is_active = False
+        self._client._remove_listener(self)
+
+    def drop(self):
+        """Simulate the listener stream failing."""
+        self.unsubscribe()
+
+
+class FakeDocumentSnapshot:
+    """Snapshot of a single document."""
+
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        if self._data is None:
+            return None
+        return copy.deepcopy(self._data)
+
+    def get(self, field_path):
+        value = self._data
+        for part in field_path.split('.'):
+            value = value[part]
+        return copy.deepcopy(value)
+
+
+class FakeDocumentReference:
+    """Reference to a single document in a FakeFirestore."""
+
+    def __init__(self, client, collection_path, doc_id):
+        self._client = client
+        self._collection_path = collection_path
+        self.id = doc_id
+
+    @property
+    def path(self):
+        return f"{self._collection_path}/{self.id}"
+
+    def _store(self):
+        return self._client._data.setdefault(self._collection_path, {})
+
+    def get(self, field_paths=None, transaction=None):
+        self._client._round_trip('read', self._collection_path)
+        return self._snapshot()
+
+    def _snapshot(self):
+        data = self._store().get(self.id)
+        return FakeDocumentSnapshot(self, copy.deepcopy(data) if data is not None else None)
+
+    def set(self, document_data, merge=False):
+        self._client._round_trip('write', self._collection_path)
+        self._set(document_data, merge)
+
+    def _set(self, document_data, merge=False):
+        existed = self.id in self._store()
+        if merge and existed:
+            self._store()[self.id].update(copy.deepcopy(document_data))
+        else:
+            self._store()[self.id] = copy.deepcopy(document_data)
+        self._client._notify(self, ChangeType.MODIFIED if existed else ChangeType.ADDED)
+
+    def update(self, field_updates):
+        self._client._round_trip('write', self._collection_path)
+        self._update(field_updates)
+
+    def _update(self, field_updates):
+        if self.id not in self._store():
+            raise KeyError(f"No document to update: {self.path}")
+        data = self._store()[self.id]
+        for field, value in copy.deepcopy(field_updates).items():
+            data[field] = transformed(data.get(field), value)
+        self._client._notify(self, ChangeType.MODIFIED)
+
+    def delete(self):
+        self._client._round_trip('write', self._collection_path)
+        self._delete()
+
+    def _delete(self):
+        data = self._store().pop(self.id, None)
+        if data is not None:
+            self._client._notify(self, ChangeType.REMOVED, data)
+
+    def collection(self, collection_id):
+        return self._client.collection(f"{self.path}/{collection_id}")
+
+
+class FakeQuery:
+    """Query over a single collection supporting where/order_by/limit."""
+
+    def __init__(self, client, collection_path, filters=None, orders=None, limit_count=None,
+                 start_after_id=None, projection=None):
+        self._client = client
+        self._collection_path = collection_path
+        self._filters = filters or []
+        self._orders = orders or []
+        self._limit = limit_count
+        self._start_after_id = start_after_id
+        self._projection = projection
+
+    def _copy(self, **overrides):
+        params = {
+            'filters': list(self._filters),
+            'orders': list(self._orders),
+            'limit_count': self._limit,
+            'start_after_id': self._start_after_id,
+            'projection': self._projection,
+        }
+        params.update(overrides)
+        return self._client._query_class(self._client, self._collection_path, **params)
+
+    def where(self, field_path, op_string, value):
+        return self._copy(filters=self._filters + [(field_path, op_string, value)])
+
+    def order_by(self, field_path, direction='ASCENDING'):
+        return self._copy(orders=self._orders + [(field_path, direction)])
+
+    def limit(self, count):
+        return self._copy(limit_count=count)
+
+    def start_after(self, document_snapshot):
+        return self._copy(start_after_id=document_snapshot.id)
+
+    def select(self, field_paths):
+        return self._copy(projection=list(field_paths))
+
+    def _matches(self, data):
+        # Like Firestore, documents without an ordered field are left out
+        if any(data.get(field_path) is None for field_path, _ in self._orders):
+            return False
+        for field_path, op_string, value in self._filters:
+            actual = data.get(field_path)
+            if op_string == '==' and actual != value:
+                return False
+            if op_string in RANGE_OPERATORS and (actual is None or not RANGE_OPERATORS[op_string](actual, value)):
+                return False
+            if op_string == 'in' and actual not in value:
+                return False
+            if op_string == 'array_contains' and value not in (actual or []):
+                return False
+            if op_string == 'array_contains_any' and not set(value) & set(actual or []):
+                return False
+        return True
+
+    def _results(self):
+        store = self._client._data.get(self._collection_path, {})
+        results = [
+            (doc_id, data) for doc_id, data in store.items() if self._matches(data)
+        ]
+        for field_path, direction in reversed(self._orders):
+            results.sort(
+                key=lambda item: item[1].get(field_path),
+                reverse=direction == 'DESCENDING',
+            )
+        if self._start_after_id is not None:
+            ids = [doc_id for doc_id, _ in results]
+            if self._start_after_id in ids:
+                results = results[ids.index(self._start_after_id) + 1:]
+        if self._limit is not None:
+            results = results[:self._limit]
+        if self._projection is not None:
+            results = [
+                (doc_id, {field: data[field] for field in self._projection if field in data})
+                for doc_id, data in results
+            ]
+        return results
+
+    def stream(self, transaction=None):
+        self._client._round_trip('read', self._collection_path)
+        for doc_id, data in self._results():
+            reference = self._client._document_class(self._client, self._collection_path, doc_id)
+            yield FakeDocumentSnapshot(reference, copy.deepcopy(data))
+
+    def get(self, transaction=None):
+        return list(self.stream(transaction=transaction))
+
+    def on_snapshot(self, callback):
+        """Register a listener; it immediately receives every matching document as ADDED."""
+        return self._client._add_listener(self, callback)
+
+
+class FakeCollectionReference(FakeQuery):
+    """Reference to a collection in a FakeFirestore."""
+
+    def __init__(self, client, collection_path):
+        super().__init__(client, collection_path)
+        self.id = collection_path.rsplit('/', 1)[-1]
+
+    def document(self, document_id=None):
+        return self._client._document_class(
+            self._client, self._collection_path, document_id or uuid.uuid4().hex
+        )
+
+
+class FakeWriteBatch:
+    """Batch of writes committed atomically in one round trip."""
+
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append(lambda: reference._set(document_data, merge))
+
+    def update(self, reference, field_updates):
+        self._writes.append(lambda: reference._update(field_updates))
+
+    def delete(self, reference):
+        self._writes.append(reference._delete)
+
+    def commit(self):
+        if len(self._writes) > 500:
+            raise ValueError("A batch can contain at most 500 writes")
+        self._client._round_trip('write', 'batch')
+        # Roll back every write in the batch if any of them fails
+        snapshot = copy.deepcopy(self._client._data)
+        try:
+            for write in self._writes:
+                write()
+        except Exception:
+            self._client._data = snapshot
+            raise
+        self._writes = []
+
+
+class FakeTransaction(FakeWriteBatch):
+    """Transaction run by run(fn) (see storage.py). Transactions on a client run one at a time,
+    so their reads stay valid until they commit.
+    """
+
+    def run(self, fn):
+        with self._client._transaction_lock:
+            result = fn(self)
+            self.commit()
+        return result
+
+
+class FakeFirestore:
+    """In-memory Firestore client that records round trips.
+
+    Every stream(), document get(), get_all() and write counts as one round
+    trip. ``latency`` (seconds) is slept on each round trip to approximate a
+    remote backend.
+    """
+
+    _query_class = FakeQuery
+    _document_class = FakeDocumentReference
+    _collection_class = FakeCollectionReference
+
+    def __init__(self, latency=0.0):
+        self._data = {}
+        self._listeners = []  # (query, watch)
+        self._lock = threading.Lock()
+        self._transaction_lock = threading.RLock()
+        self.latency = latency
+        self.reset_counters()
+
+    def reset_counters(self):
+        """Reset the round trip counters."""
+        self.round_trips = 0
+        self.reads = {}
+        self.writes = {}
+
+    def _round_trip(self, kind, collection_path):
+        self._count(kind, collection_path)
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _count(self, kind, collection_path):
+        with self._lock:
+            self.round_trips += 1
+            counters = self.reads if kind == 'read' else self.writes
+            counters[collection_path] = counters.get(collection_path, 0) + 1
+
+    def _add_listener(self, query, callback):
+        watch = FakeWatch(self, query._collection_path, callback)
+        self._listeners.append((query, watch))
+        docs = []
+        for doc_id, data in query._results():
+            reference = FakeDocumentReference(self, query._collection_path, doc_id)
+            docs.append(FakeDocumentSnapshot(reference, copy.deepcopy(data)))
+        changes = [FakeDocumentChange(ChangeType.ADDED, doc) for doc in docs]
+        callback(docs, changes, datetime.now(timezone.utc))
+        return watch
+
+    def _remove_listener(self, watch):
+        self._listeners = [(query, w) for query, w in self._listeners if w is not watch]
+
+    def _notify(self, reference, change_type, removed_data=None):
+        """Deliver a single-document change to matching listeners, synchronously."""
+        for query, watch in list(self._listeners):
+            if query._collection_path != reference._collection_path:
+                continue
+            data = removed_data if change_type == ChangeType.REMOVED else reference._store()[reference.id]
+            if not query._matches(data):
+                continue
+            snapshot = FakeDocumentSnapshot(reference, copy.deepcopy(data))
+            docs = [
+                FakeDocumentSnapshot(FakeDocumentReference(self, query._collection_path, doc_id), copy.deepcopy(d))
+                for doc_id, d in query._results()
+            ]
+            watch._callback(docs, [FakeDocumentChange(change_type, snapshot)], datetime.now(timezone.utc))
+
+    def collection(self, collection_path):
+        return self._collection_class(self, collection_path)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def transaction(self):
+        return FakeTransaction(self)
+
+    def document(self, document_path):
+        collection_path, doc_id = document_path.rsplit('/', 1)
+        return self._document_class(self, collection_path, doc_id)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        references = list(references)
+        if not references:
+            return
+        # A batchGet is a single RPC regardless of how many documents it names
+        self._round_trip('read', references[0]._collection_path)
+        for reference in references:
+            yield reference._snapshot()
+
+    def load(self, collection_path, documents):
+        """Seed a collection without counting round trips."""
+        store = self._data.setdefault(collection_path, {})
+        for doc_id, data in documents.items():
+            store[doc_id] = copy.deepcopy(data)
+
+
+class FakeAsyncDocumentReference(FakeDocumentReference):
+    """Document reference whose round trips are coroutines, like firestore's AsyncDocumentReference."""
+
+    async def get(self, field_paths=None, transaction=None):
+        await self._client._async_round_trip('read', self._collection_path)
+        return self._snapshot()
+
+    async def set(self, document_data, merge=False):
+        await self._client._async_round_trip('write', self._collection_path)
+        self._set(document_data, merge)
+
+    async def update(self, field_updates):
+        await self._client._async_round_trip('write', self._collection_path)
+        self._update(field_updates)
+
+    async def delete(self):
+        await self._client._async_round_trip('write', self._collection_path)
+        self._delete()
+
+
+class FakeAsyncQuery(FakeQuery):
+    """Query whose stream() is an async generator, like firestore's AsyncQuery."""
+
+    async def stream(self, transaction=None):
+        await self._client._async_round_trip('read', self._collection_path)
+        for doc_id, data in self._results():
+            reference = self._client._document_class(self._client, self._collection_path, doc_id)
+            yield FakeDocumentSnapshot(reference, copy.deepcopy(data))
+
+    async def get(self, transaction=None):
+        return [doc async for doc in self.stream(transaction=transaction)]
+
+
+class FakeAsyncCollectionReference(FakeAsyncQuery, FakeCollectionReference):
+    """Reference to a collection in a FakeAsyncFirestore."""
+
+
+class FakeAsyncFirestore(FakeFirestore):
+    """In-memory stand-in for firestore.AsyncClient.
+
+    Round trips are counted like FakeFirestore's, but latency is awaited with
+    asyncio.sleep so concurrent reads overlap instead of blocking a thread.
+    """
+
+    _query_class = FakeAsyncQuery
+    _document_class = FakeAsyncDocumentReference
+    _collection_class = FakeAsyncCollectionReference
+
+    async def _async_round_trip(self, kind, collection_path):
+        self._count(kind, collection_path)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def get_all(self, references, field_paths=None, transaction=None):
+        references = list(references)
+        if not references:
+            return
+        await self._async_round_trip('read', references[0]._collection_path)
+        for reference in references:
+            yield reference._snapshot()
+
+
+def seed_routine(db, routine_id='routine-1', exercise_count=12):
+    """Seed one routine with ``exercise_count`` linked catalog exercises."""
+    db.load('routines', {routine_id: {'name': f"Routine {routine_id}"}})
+    exercises = {}
+    links = {}
+    for i in range(exercise_count):
+        exercise_id = f"{routine_id}-exercise-{i}"
+        exercises[exercise_id] = {
+            'name': f"Exercise {i}",
+            'default_sets': 3,
+            'default_reps': 10,
+            'default_rep_time': 2,
+            'default_rest_time': 60,
+        }
+        links[f"{routine_id}-link-{i}"] = {
+            'routine_id': routine_id,
+            'exercise_id': exercise_id,
+            'order': i + 1,
+            'sets': 4,
+            'reps': 8,
+            'rest_time': 90,
+            'rep_time': 3,
+        }
+    db.load('exercises', exercises)
+    db.load('routine_exercises', links)
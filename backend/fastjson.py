@@ -0,0 +1,77 @@
+"""
+JSON encoding for API responses.
+
+Uses orjson when it is installed and the standard library otherwise; set
+JSON_ENCODER to "orjson" or "stdlib" to choose explicitly. Both produce the same
+compact UTF-8 output with sorted keys. Dates and datetimes are written in ISO 8601
+and other unknown types as their str().
+"""
+import json
+import os
+from datetime import date, datetime
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Streamed list responses are written in chunks of about this many bytes
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _dumps_stdlib(obj):
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=_default).encode('utf-8')
+
+
+def _dumps_orjson(obj):
+    try:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    except orjson.JSONEncodeError:
+        # e.g. integers wider than 64 bits
+        return _dumps_stdlib(obj)
+
+
+ENCODERS = {'stdlib': _dumps_stdlib}
+if orjson is not None:
+    ENCODERS['orjson'] = _dumps_orjson
+
+
+def get_encoder(name=None):
+    """Return the dumps function for an encoder name, JSON_ENCODER, or the fastest available."""
+    name = (name or os.environ.get('JSON_ENCODER') or ('orjson' if orjson is not None else 'stdlib')).lower()
+    if name not in ENCODERS:
+        raise ValueError(f"JSON encoder '{name}' is not available (available: {', '.join(ENCODERS)})")
+    return ENCODERS[name]
+
+
+dumps = get_encoder()
+
+
+def iter_dumps(body, list_key, encoder=None):
+    """Encode body, a dict holding a list under list_key, as a stream of byte chunks.
+    Items are encoded one at a time, so the full document is never held in memory.
+    The other keys are written first, then the list.
+    """
+    encoder = encoder or dumps
+    head = encoder({key: value for key, value in body.items() if key != list_key})
+    prefix = head[:-1] + (b',' if len(head) > 2 else b'') + encoder(list_key) + b':['
+
+    buffer = [prefix]
+    size = len(prefix)
+    for index, item in enumerate(body[list_key]):
+        encoded = encoder(item)
+        if index:
+            buffer.append(b',')
+        buffer.append(encoded)
+        size += len(encoded) + 1
+        if size >= STREAM_CHUNK_BYTES:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    buffer.append(b']}')
+    yield b''.join(buffer)
@@ -1,57 +1,190 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
 import os
 import json
+import threading
 import uuid
 from datetime import datetime
+from cache import TTLCache
+from catalog_mirror import CatalogMirror
+from singleflight import SingleFlight
+from set_buffer import SetBuffer
+from storage import LazyClient, array_union, storage_from_env, transformed
+from firestore_metrics import InstrumentedClient
+import logged_sets
+import rollups
+import sync
+
+# Maximum number of documents requested in a single get_all() call
+GET_ALL_CHUNK_SIZE = 100
+
+# Largest page of workouts returned by get_workouts_page
+MAX_WORKOUTS_PAGE_SIZE = 100
+
+# Documents fetched per query when streaming a full workout history
+EXPORT_PAGE_SIZE = 500
+
+# Firestore allows at most 500 writes in a single batch
+BATCH_WRITE_LIMIT = 500
+
+# Workouts created per transaction by create_workouts_batch; with one rollup per user, a chunk
+# stays within BATCH_WRITE_LIMIT writes
+WORKOUT_TRANSACTION_SIZE = BATCH_WRITE_LIMIT // 2
+
+# Firestore allows at most 30 values in an array_contains_any filter
+ARRAY_CONTAINS_ANY_LIMIT = 30
+
+# Same value as firestore.Query.DESCENDING, without importing the Firestore client
+DESCENDING = 'DESCENDING'
+
+def initialize_firebase_app():
+    """Initialize the default Firebase app from FIREBASE_CREDENTIALS_PATH or FIREBASE_CREDENTIALS_JSON,
+    or return it if it is already initialized. Returns None if the credentials are missing or invalid.
+    """
+    # Imported here, as it takes longer than the rest of the app; SQLite deployments never load it
+    import firebase_admin
+    from firebase_admin import credentials
+    
+    # Check if Firebase is already initialized
+    if firebase_admin._apps:
+        return firebase_admin.get_app()
+    
+    # Check if credentials file exists
+    cred_path = os.environ.get('FIREBASE_CREDENTIALS_PATH')
+    
+    if cred_path and os.path.exists(cred_path):
+        # Initialize with credential file
+        cred = credentials.Certificate(cred_path)
+        return firebase_admin.initialize_app(cred)
+    
+    # Try to initialize with JSON string from environment variable
+    cred_json = os.environ.get('FIREBASE_CREDENTIALS_JSON')
+    if cred_json:
+        try:
+            cred_dict = json.loads(cred_json)
+            cred = credentials.Certificate(cred_dict)
+            return firebase_admin.initialize_app(cred)
+        except json.JSONDecodeError:
+            print("Error: Invalid JSON in FIREBASE_CREDENTIALS_JSON")
+            return None
+    
+    # Application default credentials, e.g. on Google Cloud or against the Firestore emulator
+    if os.environ.get('GOOGLE_APPLICATION_CREDENTIALS') or os.environ.get('FIRESTORE_EMULATOR_HOST'):
+        return firebase_admin.initialize_app()
+    
+    print("Error: No Firebase credentials found. Set FIREBASE_CREDENTIALS_PATH or FIREBASE_CREDENTIALS_JSON, "
+          "GOOGLE_APPLICATION_CREDENTIALS or FIRESTORE_EMULATOR_HOST, or use STORAGE_BACKEND=sqlite")
+    return None
+
+def run_transaction(db, fn):
+    """Call fn(transaction) in a new transaction on db and commit it, returning fn's result.
+    Firestore retries fn if the transaction conflicts with another; fn must only read and write
+    through the transaction. See storage.py for other backends.
+    """
+    transaction = db.transaction()
+    run = getattr(transaction, 'run', None)
+    if run is not None:
+        return run(fn)
+    from firebase_admin import firestore
+    return firestore.transactional(fn)(transaction)
+
+def _batch_results(ids, errors):
+    """Per-document results of a batch create: {'index', 'id', 'status': 'created'} or
+    {'index', 'id', 'status': 'failed', 'error'}.
+    """
+    results = []
+    for index, (doc_id, error) in enumerate(zip(ids, errors)):
+        result = {'index': index, 'id': doc_id, 'status': 'created' if error is None else 'failed'}
+        if error is not None:
+            result['error'] = error
+        results.append(result)
+    return results
 
 class FirebaseHandler:
     """Handler for Firebase Firestore operations for workout tracking."""
     
-    def __init__(self):
-        """Initialize Firebase connection."""
+    def __init__(self, db=None, cache=None):
+        """Initialize Firebase connection.
+        If db is provided, it is used as the Firestore client instead of initializing Firebase.
+        Otherwise the storage selected by STORAGE_BACKEND is opened on first use (see storage.py);
+        call connect() to open it up front.
+        If cache is not provided, a TTLCache sized from CACHE_MAX_ENTRIES / CACHE_TTL_SECONDS is used
+        for routine and exercise catalog reads.
+        """
         self.app = None
-        self.db = None
-        self._initialize_firebase()
+        self.db = db
+        self.cache = cache if cache is not None else TTLCache(
+            max_entries=int(os.environ.get('CACHE_MAX_ENTRIES', 1024)),
+            ttl=float(os.environ.get('CACHE_TTL_SECONDS', 300)),
+        )
+        self.mirror = None
+        self._sweeper_stop = None
+        # Concurrent identical catalog reads share one Firestore fetch
+        self.flights = SingleFlight()
+        # Sets logged to the same workout within WORKOUT_SET_COALESCE_SECONDS are written together
+        self.set_buffer = SetBuffer(
+            self._append_workout_sets, delay=float(os.environ.get('WORKOUT_SET_COALESCE_SECONDS', '') or 0)
+        )
+        # Callables invoked with (routine_id, plan) after a routine plan is rebuilt
+        self.plan_listeners = []
+        self._storage = LazyClient(self._open_storage) if self.db is None else None
+        # Counts reads, writes and round trips per collection and per request (see metrics.py)
+        self.db = InstrumentedClient(self._storage or self.db)
+    
+    def _open_storage(self):
+        return storage_from_env() or self._initialize_firebase()
     
     def _initialize_firebase(self):
-        """Initialize Firebase using credentials."""
-        # Check if Firebase is already initialized
-        if not firebase_admin._apps:
-            # Check if credentials file exists
-            cred_path = os.environ.get('FIREBASE_CREDENTIALS_PATH')
-            
-            if cred_path and os.path.exists(cred_path):
-                # Initialize with credential file
-                cred = credentials.Certificate(cred_path)
-                self.app = firebase_admin.initialize_app(cred)
-            else:
-                # Try to initialize with JSON string from environment variable
-                cred_json = os.environ.get('FIREBASE_CREDENTIALS_JSON')
-                if cred_json:
-                    try:
-                        cred_dict = json.loads(cred_json)
-                        cred = credentials.Certificate(cred_dict)
-                        self.app = firebase_admin.initialize_app(cred)
-                    except json.JSONDecodeError:
-                        print("Error: Invalid JSON in FIREBASE_CREDENTIALS_JSON")
-                        return
-                else:
-                    print("Warning: No Firebase credentials found. Using local emulator or default app.")
-                    self.app = firebase_admin.initialize_app()
-        else:
-            self.app = firebase_admin.get_app()
+        """Initialize Firebase using credentials and return a Firestore client."""
+        from firebase_admin import firestore
+        
+        self.app = initialize_firebase_app()
+        if self.app is None:
+            raise RuntimeError("Firebase could not be initialized; see the error above")
             
-        self.db = firestore.client()
+        return firestore.client()
+    
+    @property
+    def connected(self):
+        """Whether the storage has been opened."""
+        return self._storage is None or self._storage.connected
+    
+    def connect(self):
+        """Open the storage now rather than on first use. Raises if it can't be opened."""
+        if self._storage is not None:
+            self._storage.connect()
+
+    def start_catalog_mirror(self, timeout=None):
+        """Mirror routines, exercises and routine_exercises in memory via snapshot listeners.
+        Waits up to timeout seconds for the initial snapshots. Catalog reads are served from the
+        mirror while it is live and fall back to Firestore (through the cache) otherwise.
+        Returns True if the mirror became ready within the timeout.
+        """
+        self.enable_catalog_mirror()
+        ready = self.mirror.start(timeout=timeout)
+        if not ready:
+            print("Warning: Catalog mirror not ready; serving catalog reads from Firestore until it is")
+        return ready
+
+    def enable_catalog_mirror(self):
+        """Create the catalog mirror without starting it, so it can be shared before it is live."""
+        if self.mirror is None:
+            self.mirror = CatalogMirror(self.db)
+        return self.mirror
+
+    def _mirror_live(self):
+        return self.mirror is not None and self.mirror.is_live()
 
-    def get_workouts(self, user_id):
-        """Get all workouts for a specific user."""
+    def get_workouts(self, user_id, fields=None):
+        """Get all workouts for a specific user.
+        If fields is provided, only those fields of each workout are returned.
+        """
         try:
             workouts_ref = self.db.collection('workouts').where('user_id', '==', user_id)
+            if fields:
+                workouts_ref = workouts_ref.select(self._with_logged_sets_field(fields))
             workouts = []
             
             for doc in workouts_ref.stream():
-                workout_data = doc.to_dict()
+                workout_data = logged_sets.with_logged_sets(doc.to_dict())
                 workout_data['id'] = doc.id
                 workouts.append(workout_data)
                 
@@ -60,6 +193,102 @@ class FirebaseHandler:
             print(f"Error getting workouts: {e}")
             return []
 
+    def get_workouts_page(self, user_id, limit, start_after=None, fields=None):
+        """Get one page of a user's workouts, newest first.
+        start_after is the cursor returned with the previous page (the ID of its last workout).
+        If fields is provided, only those fields of each workout are returned.
+        Returns (workouts, next_cursor); next_cursor is None on the last page. Returns None if the read
+        failed (e.g. a missing index, see firestore.indexes.json), and raises ValueError for a cursor
+        that isn't one of the user's workouts.
+        Requires a composite index on workouts (user_id ASC, created_at DESC).
+        """
+        limit = max(1, min(int(limit), MAX_WORKOUTS_PAGE_SIZE))
+        try:
+            cursor_doc = self.db.collection('workouts').document(start_after).get() if start_after else None
+        except Exception as e:
+            print(f"Error getting workouts page: {e}")
+            return None
+        if cursor_doc is not None and (not cursor_doc.exists or cursor_doc.to_dict().get('user_id') != user_id):
+            raise ValueError(f"Invalid workouts cursor '{start_after}'")
+        
+        try:
+            workouts_ref = (
+                self.db.collection('workouts')
+                .where('user_id', '==', user_id)
+                .order_by('created_at', direction=DESCENDING)
+            )
+            if cursor_doc is not None:
+                workouts_ref = workouts_ref.start_after(cursor_doc)
+            
+            if fields:
+                workouts_ref = workouts_ref.select(self._with_logged_sets_field(fields))
+            
+            # Fetch one extra document to learn whether another page exists
+            workouts = []
+            for doc in workouts_ref.limit(limit + 1).stream():
+                workout_data = logged_sets.with_logged_sets(doc.to_dict())
+                workout_data['id'] = doc.id
+                workouts.append(workout_data)
+            
+            next_cursor = None
+            if len(workouts) > limit:
+                workouts = workouts[:limit]
+                next_cursor = workouts[-1]['id']
+            
+            if fields and 'exercise_count' in fields:
+                self._fill_exercise_counts(workouts)
+            return workouts, next_cursor
+        except Exception as e:
+            print(f"Error getting workouts page: {e}")
+            return None
+
+    def _with_logged_sets_field(self, fields):
+        """Projected fields, plus the logged sets that belong in exercises (see logged_sets.py)."""
+        return list(fields) + [logged_sets.FIELD] if 'exercises' in fields else fields
+
+    def _fill_exercise_counts(self, workouts):
+        """Add exercise_count to projected workouts saved before it was stored, reading their
+        exercises in one batched read. migrate_schema.py backfills the field for good.
+        """
+        missing = [workout for workout in workouts if 'exercise_count' not in workout]
+        if not missing:
+            return
+        documents = self._get_documents_by_ids('workouts', [workout['id'] for workout in missing])
+        for workout in missing:
+            exercises = logged_sets.with_logged_sets(documents.get(workout['id'], {})).get('exercises')
+            workout['exercise_count'] = len(exercises) if isinstance(exercises, list) else 0
+
+    def iter_workouts(self, user_id, start_after=None):
+        """Yield every workout for a user, oldest first, without loading the history into memory.
+        Workouts are read in pages of EXPORT_PAGE_SIZE so no single query stream stays open for long.
+        start_after is the ID of the last workout already received, for resuming.
+        Unlike the other methods, errors are raised so a caller streaming a response can abort it.
+        Requires a composite index on workouts (user_id ASC, created_at ASC).
+        """
+        query = (
+            self.db.collection('workouts')
+            .where('user_id', '==', user_id)
+            .order_by('created_at')
+        )
+        
+        cursor = None
+        if start_after:
+            cursor = self.db.collection('workouts').document(start_after).get()
+            if not cursor.exists or cursor.to_dict().get('user_id') != user_id:
+                raise ValueError(f"Invalid resume token '{start_after}'")
+        
+        while True:
+            page_query = query.start_after(cursor) if cursor is not None else query
+            count = 0
+            for doc in page_query.limit(EXPORT_PAGE_SIZE).stream():
+                workout_data = logged_sets.with_logged_sets(doc.to_dict())
+                workout_data['id'] = doc.id
+                yield workout_data
+                cursor = doc
+                count += 1
+            if count < EXPORT_PAGE_SIZE:
+                return
+
     def get_workout(self, workout_id):
         """Get a specific workout by ID."""
         try:
@@ -67,7 +296,7 @@ class FirebaseHandler:
             doc = doc_ref.get()
             
             if doc.exists:
-                workout_data = doc.to_dict()
+                workout_data = logged_sets.with_logged_sets(doc.to_dict())
                 workout_data['id'] = doc.id
                 return workout_data
             else:
@@ -76,6 +305,14 @@ class FirebaseHandler:
             print(f"Error getting workout: {e}")
             return None
 
+    def workout_exists(self, workout_id):
+        """Whether a workout exists, or None if the read failed."""
+        try:
+            return self.db.collection('workouts').document(workout_id).get(field_paths=['user_id']).exists
+        except Exception as e:
+            print(f"Error checking workout: {e}")
+            return None
+
     def create_workout(self, user_id, workout_data):
         """Create a new workout document in Firestore."""
         try:
@@ -83,13 +320,13 @@ class FirebaseHandler:
             workout_data['user_id'] = user_id
             workout_data['created_at'] = datetime.now().isoformat()
             workout_data['updated_at'] = datetime.now().isoformat()
+            self._stamp_workout_summary(workout_data)
             
             # Add unique ID if not provided
             workout_id = workout_data.get('id', str(uuid.uuid4()))
             
-            # Set the document with the specified ID
-            doc_ref = self.db.collection('workouts').document(workout_id)
-            doc_ref.set(workout_data)
+            # Set the document with the specified ID, and update the user's rollup with it
+            self._write_workouts([('set', workout_id, workout_data)])
             
             return workout_id
         except Exception as e:
@@ -101,31 +338,215 @@ class FirebaseHandler:
         try:
             # Add updated timestamp
             workout_data['updated_at'] = datetime.now().isoformat()
+            self._stamp_workout_summary(workout_data)
+            # The exercises sent replace the ones read, logged sets included
+            if 'exercises' in workout_data:
+                workout_data[logged_sets.FIELD] = []
             
-            doc_ref = self.db.collection('workouts').document(workout_id)
-            doc_ref.update(workout_data)
+            self._write_workouts([('update', workout_id, workout_data)])
             
             return True
         except Exception as e:
             print(f"Error updating workout: {e}")
             return False
 
+    def _stamp_workout_summary(self, workout_data):
+        """Store summary fields so list views can project them instead of the full workout."""
+        if isinstance(workout_data.get('exercises'), list):
+            workout_data['exercise_count'] = len(workout_data['exercises'])
+
+    def log_workout_sets(self, workout_id, sets, wait=True):
+        """Append sets to a workout without rewriting it from the client. Each set has the exercise's
+        exercise_id and/or name, a set_id, and its own fields (reps, weight, ...); it is added to the
+        workout's last entry for that exercise, or a new entry. Sets whose set_id the workout already
+        has are skipped, so retried requests are harmless.
+        Returns the set_ids that were appended, or None if the write failed. With wait unset, the sets
+        are only queued (see set_buffer.py) and None is returned.
+        Raises KeyError if the workout doesn't exist.
+        """
+        try:
+            appended = self.set_buffer.append(workout_id, sets, wait=wait)
+            return None if appended is None else [s['set_id'] for s in sets if s['set_id'] in appended]
+        except KeyError:
+            raise
+        except Exception as e:
+            print(f"Error logging workout sets: {e}")
+            return None
+
+    def _append_workout_sets(self, workout_id, sets):
+        """Write sets to a workout in one transaction with its rollup. Only the new sets are written,
+        appended to its logged_sets (see logged_sets.py). Returns the appended set_ids.
+        """
+        appended = set()
+        
+        def append(workout):
+            appended.clear()
+            set_ids = logged_sets.set_ids(workout)
+            new_sets = []
+            for s in sets:
+                if s['set_id'] not in set_ids:
+                    new_sets.append(s)
+                    set_ids.add(s['set_id'])
+                    appended.add(s['set_id'])
+            
+            if not new_sets:
+                return {}
+            exercises = logged_sets.fold(workout.get('exercises'), (workout.get(logged_sets.FIELD) or []) + new_sets)
+            return {
+                logged_sets.FIELD: array_union(new_sets),
+                'updated_at': datetime.now().isoformat(),
+                'exercise_count': len(exercises),
+            }
+        
+        self._write_workouts([('update', workout_id, append)])
+        return appended
+
     def delete_workout(self, workout_id):
         """Delete a specific workout document."""
         try:
-            doc_ref = self.db.collection('workouts').document(workout_id)
-            doc_ref.delete()
+            self._write_workouts([('delete', workout_id, None)])
             
             return True
         except Exception as e:
             print(f"Error deleting workout: {e}")
             return False
+    
+    # User stats rollups (see rollups.py)
+    
+    def _write_workouts(self, writes):
+        """Apply (operation, workout_id, data) workout writes and the matching changes to their users'
+        user_stats rollups in one transaction. operation is 'set', 'update' or 'delete' (data is
+        ignored for deletes). For updates, data may instead be a function of the current workout
+        returning the fields to update; it is called again if the transaction is retried.
+        Raises on failure, like the underlying writes.
+        Rollups left stale by the writes are rebuilt afterwards.
+        """
+        workout_refs = {workout_id: self.db.collection('workouts').document(workout_id) for _, workout_id, _ in writes}
+        
+        def write(transaction):
+            # Every read comes before the first write, as Firestore transactions require
+            current = {doc.id: doc.to_dict() for doc in self.db.get_all(list(workout_refs.values()), transaction=transaction) if doc.exists}
+            changes, fields = [], []
+            for operation, workout_id, data in writes:
+                old = current.get(workout_id)
+                if operation == 'update':
+                    if old is None:
+                        raise KeyError(f"No document to update: workouts/{workout_id}")
+                    if callable(data):
+                        data = data(old)
+                    new = dict(old)
+                    for field, value in data.items():
+                        new[field] = transformed(old.get(field), value)
+                else:
+                    new = data if operation == 'set' else None
+                changes.append((workout_id, old, new))
+                fields.append(data)
+                current[workout_id] = new
+            
+            user_ids = {w['user_id'] for _, old, new in changes for w in (old, new) if w and w.get('user_id')}
+            stats_refs = {user_id: self.db.collection('user_stats').document(user_id) for user_id in user_ids}
+            stats = {user_id: rollups.empty(user_id) for user_id in user_ids}
+            for doc in self.db.get_all(list(stats_refs.values()), transaction=transaction):
+                if doc.exists:
+                    stats[doc.id] = doc.to_dict()
+            
+            for workout_id, old, new in changes:
+                for workout, sign in ((old, -1), (new, 1)):
+                    if workout and workout.get('user_id') in stats:
+                        rollups.apply(stats[workout['user_id']], workout_id, workout, sign)
+            
+            for (operation, workout_id, _), (_, old, _), data in zip(writes, changes, fields):
+                if operation == 'update' and not data:
+                    continue
+                if operation != 'delete':
+                    getattr(transaction, operation)(workout_refs[workout_id], data)
+                elif old is not None:
+                    transaction.delete(workout_refs[workout_id])
+                    tombstone_id, tombstone = sync.tombstone('workouts', workout_id, old.get('user_id'))
+                    transaction.set(self.db.collection(sync.TOMBSTONES).document(tombstone_id), tombstone)
+            now = datetime.now().isoformat()
+            for user_id, user_stats in stats.items():
+                user_stats['updated_at'] = now
+                transaction.set(stats_refs[user_id], user_stats)
+            return [user_id for user_id, user_stats in stats.items() if user_stats.get('stale')]
+        
+        # A failed rebuild leaves the rollup marked stale, so the next write retries it
+        for user_id in run_transaction(self.db, write):
+            self.rebuild_user_stats(user_id)
+    
+    def get_user_stats(self, user_id):
+        """Get a user's rollup: totals, streaks, and per-routine and per-exercise totals, best sets and
+        last-performed dates, in one read. Returns an empty rollup for users without workouts.
+        """
+        try:
+            doc = self.db.collection('user_stats').document(user_id).get()
+            stats = doc.to_dict() if doc.exists else rollups.empty(user_id)
+            stats['current_streak'] = rollups.current_streak(stats)
+            return stats
+        except Exception as e:
+            print(f"Error getting user stats: {e}")
+            return None
+    
+    def _workout_history(self, user_id, transaction=None):
+        query = self.db.collection('workouts').where('user_id', '==', user_id)
+        return [(doc.id, doc.to_dict()) for doc in query.stream(transaction=transaction)]
+    
+    def rebuild_user_stats(self, user_id):
+        """Recompute a user's rollup from their whole workout history. Returns the new rollup, or None
+        if it failed. The history is read in the same transaction that writes the rollup, so a
+        concurrent workout write is applied either before or on top of it, never lost.
+        """
+        try:
+            stats_ref = self.db.collection('user_stats').document(user_id)
+            
+            def rebuild(transaction):
+                stats_ref.get(transaction=transaction)
+                stats = rollups.build(user_id, self._workout_history(user_id, transaction))
+                stats['updated_at'] = datetime.now().isoformat()
+                transaction.set(stats_ref, stats)
+                return stats
+            
+            return run_transaction(self.db, rebuild)
+        except Exception as e:
+            print(f"Error rebuilding user stats for {user_id}: {e}")
+            return None
+    
+    def check_user_stats(self, user_id):
+        """Compare a user's stored rollup with one rebuilt from their history.
+        Returns a list of differences (empty if the rollup is consistent), or None if the check failed.
+        """
+        try:
+            doc = self.db.collection('user_stats').document(user_id).get()
+            stored = doc.to_dict() if doc.exists else rollups.empty(user_id)
+            return rollups.compare(stored, rollups.build(user_id, self._workout_history(user_id)))
+        except Exception as e:
+            print(f"Error checking user stats for {user_id}: {e}")
+            return None
+    
+    def get_user_ids(self):
+        """IDs of every user with workouts or a rollup."""
+        try:
+            user_ids = {doc.to_dict().get('user_id') for doc in self.db.collection('workouts').select(['user_id']).stream()}
+            user_ids.update(doc.id for doc in self.db.collection('user_stats').select(['user_id']).stream())
+            user_ids.discard(None)
+            return sorted(user_ids)
+        except Exception as e:
+            print(f"Error listing users: {e}")
+            return []
             
     # Routines Collection Methods
     
     def get_routines(self):
         """Get all workout routines."""
         try:
+            if self._mirror_live():
+                return self.mirror.get_routines()
+            
+            hit, routines = self.cache.get(('routines',))
+            if hit:
+                return routines
+            
+            since = self.cache.generation()
             routines_ref = self.db.collection('routines')
             routines = []
             
@@ -133,7 +554,8 @@ class FirebaseHandler:
                 routine_data = doc.to_dict()
                 routine_data['id'] = doc.id
                 routines.append(routine_data)
-                
+            
+            self.cache.set(('routines',), routines, since=since)
             return routines
         except Exception as e:
             print(f"Error getting routines: {e}")
@@ -142,19 +564,32 @@ class FirebaseHandler:
     def get_routine(self, routine_id):
         """Get a specific routine by ID."""
         try:
-            doc_ref = self.db.collection('routines').document(routine_id)
-            doc = doc_ref.get()
+            if self._mirror_live():
+                return self.mirror.get_routine(routine_id)
             
-            if doc.exists:
-                routine_data = doc.to_dict()
-                routine_data['id'] = doc.id
+            hit, routine_data = self.cache.get(('routine', routine_id))
+            if hit:
                 return routine_data
-            else:
-                return None
+            
+            return self.flights.do(('routine', routine_id), lambda: self._fetch_routine(routine_id))
         except Exception as e:
             print(f"Error getting routine: {e}")
             return None
 
+    def _fetch_routine(self, routine_id):
+        """Read a routine from Firestore and cache it."""
+        since = self.cache.generation()
+        doc_ref = self.db.collection('routines').document(routine_id)
+        doc = doc_ref.get()
+        
+        if doc.exists:
+            routine_data = doc.to_dict()
+            routine_data['id'] = doc.id
+            self.cache.set(('routine', routine_id), routine_data, since=since)
+            return routine_data
+        else:
+            return None
+
     def create_routine(self, routine_data):
         """Create a new routine document in Firestore."""
         try:
@@ -168,6 +603,9 @@ class FirebaseHandler:
             # Set the document with the specified ID
             doc_ref = self.db.collection('routines').document(routine_id)
             doc_ref.set(routine_data)
+            self.cache.invalidate(('routines',), ('routine', routine_id))
+            self.flights.forget(('routine', routine_id))
+            self._rebuild_routine_plan(routine_id)
             
             return routine_id
         except Exception as e:
@@ -182,6 +620,9 @@ class FirebaseHandler:
             
             doc_ref = self.db.collection('routines').document(routine_id)
             doc_ref.update(routine_data)
+            self.cache.invalidate(('routines',), ('routine', routine_id))
+            self.flights.forget(('routine', routine_id))
+            self._rebuild_routine_plan(routine_id)
             
             return True
         except Exception as e:
@@ -189,18 +630,25 @@ class FirebaseHandler:
             return False
 
     def delete_routine(self, routine_id):
-        """Delete a specific routine document."""
+        """Delete a specific routine document along with its routine_exercises links and plan.
+        The routine, its plan and its links are deleted in one atomic batch when they fit in
+        BATCH_WRITE_LIMIT writes. Larger routines are split across batches with the routine in
+        the first one, so an interrupted delete can only leave orphaned links, which
+        sweep_orphaned_routine_exercises removes.
+        """
         try:
-            # First delete all routine_exercises links associated with this routine
             routine_exercises_ref = self.db.collection('routine_exercises').where('routine_id', '==', routine_id)
-            for doc in routine_exercises_ref.stream():
-                doc.reference.delete()
+            writes = [
+                self._delete_writes('routines', routine_id),
+                ('delete', self.db.collection('routine_plans').document(routine_id), None),
+            ]
+            writes += [self._delete_writes('routine_exercises', doc.id) for doc in routine_exercises_ref.stream()]
             
-            # Then delete the routine itself
-            doc_ref = self.db.collection('routines').document(routine_id)
-            doc_ref.delete()
+            errors = self._commit_in_batches(writes)
+            self.cache.invalidate(('routines',), ('routine', routine_id), ('exercises', routine_id))
+            self.flights.forget(('routine', routine_id), ('exercises', routine_id))
             
-            return True
+            return not any(errors)
         except Exception as e:
             print(f"Error deleting routine: {e}")
             return False
@@ -212,78 +660,159 @@ class FirebaseHandler:
         If routine_id is provided, returns exercises for that routine with their specific settings.
         """
         try:
-            if routine_id:
-                # Get the routine exercises (links between routines and exercises)
-                # Removing order_by to avoid requiring composite index
-                routine_exercises_ref = self.db.collection('routine_exercises').where('routine_id', '==', routine_id)
-                routine_exercises = []
-                
-                # Collect all routine exercise documents
-                for doc in routine_exercises_ref.stream():
-                    re_data = doc.to_dict()
-                    re_data['id'] = doc.id
-                    routine_exercises.append(re_data)
-                    
-                # Sort in memory instead of in the query
-                routine_exercises.sort(key=lambda x: x.get('order', 0))
-                
-                # For each routine exercise, get the base exercise details and merge
-                exercises = []
-                for re in routine_exercises:
-                    # Get the base exercise
-                    exercise_ref = self.db.collection('exercises').document(re['exercise_id'])
-                    exercise_doc = exercise_ref.get()
-                    
-                    if exercise_doc.exists:
-                        # Start with base exercise data
-                        exercise_data = exercise_doc.to_dict()
-                        exercise_data['id'] = exercise_doc.id
-                        
-                        # Override with routine-specific settings
-                        exercise_data['routine_exercise_id'] = re['id']
-                        exercise_data['sets'] = re.get('sets', exercise_data.get('default_sets', 0))
-                        exercise_data['reps'] = re.get('reps', exercise_data.get('default_reps', 0))
-                        exercise_data['rep_time'] = re.get('rep_time', exercise_data.get('default_rep_time', 3))
-                        exercise_data['rest_time'] = re.get('rest_time', exercise_data.get('default_rest_time', 60))
-                        exercise_data['order'] = re.get('order', 0)
-                        
-                        exercises.append(exercise_data)
-                
-                return exercises
-            else:
-                # Just return all exercises from the catalog
-                exercises_ref = self.db.collection('exercises')
-                exercises = []
-                
-                for doc in exercises_ref.stream():
-                    exercise_data = doc.to_dict()
-                    exercise_data['id'] = doc.id
-                    exercises.append(exercise_data)
-                
+            if self._mirror_live():
+                if routine_id:
+                    routine_exercises = self.mirror.get_routine_links(routine_id)
+                    catalog = self.mirror.get_exercises_by_ids([re['exercise_id'] for re in routine_exercises])
+                    return self._merge_routine_exercises(routine_exercises, catalog)
+                return self.mirror.get_exercises()
+            
+            hit, exercises = self.cache.get(('exercises', routine_id))
+            if hit:
                 return exercises
+            
+            return self.flights.do(('exercises', routine_id), lambda: self._load_exercises(routine_id))
         except Exception as e:
             print(f"Error getting exercises: {e}")
             return []
 
+    def _load_exercises(self, routine_id):
+        """Read a routine's merged exercises, or the whole catalog, from Firestore and cache them."""
+        since = self.cache.generation()
+        if routine_id:
+            routine_exercises, exercises = self._fetch_routine_exercises(routine_id)
+            self._cache_routine_exercises(routine_id, routine_exercises, exercises, since)
+            return exercises
+        else:
+            # Just return all exercises from the catalog
+            exercises_ref = self.db.collection('exercises')
+            exercises = []
+            
+            for doc in exercises_ref.stream():
+                exercise_data = doc.to_dict()
+                exercise_data['id'] = doc.id
+                exercises.append(exercise_data)
+            
+            self.cache.set(('exercises', None), exercises, since=since)
+            return exercises
+
+    def _cache_routine_exercises(self, routine_id, routine_exercises, exercises, since):
+        """Cache a routine's merged exercises, read from cache generation since, tagged with
+        every link and exercise so writes to either invalidate them.
+        """
+        tags = [('routine_exercise', re['id']) for re in routine_exercises]
+        tags += [('exercise', re['exercise_id']) for re in routine_exercises]
+        self.cache.set(('exercises', routine_id), exercises, tags=tags, since=since)
+
+    def _fetch_routine_exercises(self, routine_id):
+        """Read a routine's links and merged exercises directly from Firestore.
+        Returns (routine_exercises, exercises), both sorted by order.
+        """
+        # Get the routine exercises (links between routines and exercises)
+        # Removing order_by to avoid requiring composite index
+        routine_exercises_ref = self.db.collection('routine_exercises').where('routine_id', '==', routine_id)
+        routine_exercises = []
+        
+        # Collect all routine exercise documents
+        for doc in routine_exercises_ref.stream():
+            re_data = doc.to_dict()
+            re_data['id'] = doc.id
+            routine_exercises.append(re_data)
+            
+        # Sort in memory instead of in the query
+        routine_exercises.sort(key=lambda x: x.get('order', 0))
+        
+        # Fetch every referenced catalog exercise in batched reads and merge
+        catalog = self._get_exercises_by_ids([re['exercise_id'] for re in routine_exercises])
+        return routine_exercises, self._merge_routine_exercises(routine_exercises, catalog)
+
+    def _get_exercises_by_ids(self, exercise_ids):
+        """Get catalog exercises for a list of IDs using batched reads.
+        Duplicate IDs are fetched once. Returns a dict of exercise_id -> exercise data;
+        IDs with no catalog document are omitted.
+        """
+        return self._get_documents_by_ids('exercises', exercise_ids)
+
+    def _get_documents_by_ids(self, collection, doc_ids):
+        """Get documents from a collection with chunked get_all() reads.
+        Duplicate IDs are fetched once. Returns a dict of doc_id -> data for documents that exist.
+        """
+        unique_ids = list(dict.fromkeys(doc_ids))
+        documents = {}
+        
+        for start in range(0, len(unique_ids), GET_ALL_CHUNK_SIZE):
+            chunk = unique_ids[start:start + GET_ALL_CHUNK_SIZE]
+            refs = [self.db.collection(collection).document(doc_id) for doc_id in chunk]
+            
+            for doc in self.db.get_all(refs):
+                if doc.exists:
+                    document_data = doc.to_dict()
+                    document_data['id'] = doc.id
+                    documents[doc.id] = document_data
+        
+        return documents
+
+    def _merge_routine_exercises(self, routine_exercises, catalog):
+        """Merge ordered routine exercise links with their catalog exercises.
+        Links whose exercise is missing from the catalog are skipped.
+        """
+        exercises = []
+        for re in routine_exercises:
+            base_exercise = catalog.get(re['exercise_id'])
+            if base_exercise:
+                exercises.append(self._merge_routine_exercise(base_exercise, re))
+        return exercises
+
+    def _merge_routine_exercise(self, exercise_data, re_data):
+        """Override base catalog exercise data with routine-specific settings."""
+        merged = dict(exercise_data)
+        merged['routine_exercise_id'] = re_data['id']
+        merged['sets'] = re_data.get('sets', exercise_data.get('default_sets', 0))
+        merged['reps'] = re_data.get('reps', exercise_data.get('default_reps', 0))
+        merged['rep_time'] = re_data.get('rep_time', exercise_data.get('default_rep_time', 3))
+        merged['rest_time'] = re_data.get('rest_time', exercise_data.get('default_rest_time', 60))
+        merged['order'] = re_data.get('order', 0)
+        return merged
+
     def get_exercise(self, exercise_id):
         """Get a specific exercise from the catalog by ID."""
         try:
-            doc_ref = self.db.collection('exercises').document(exercise_id)
-            doc = doc_ref.get()
+            if self._mirror_live():
+                return self.mirror.get_exercise(exercise_id)
             
-            if doc.exists:
-                exercise_data = doc.to_dict()
-                exercise_data['id'] = doc.id
+            hit, exercise_data = self.cache.get(('exercise', exercise_id))
+            if hit:
                 return exercise_data
-            else:
-                return None
+            
+            return self.flights.do(('exercise', exercise_id), lambda: self._fetch_exercise(exercise_id))
         except Exception as e:
             print(f"Error getting exercise: {e}")
             return None
+
+    def _fetch_exercise(self, exercise_id):
+        """Read a catalog exercise from Firestore and cache it."""
+        since = self.cache.generation()
+        doc_ref = self.db.collection('exercises').document(exercise_id)
+        doc = doc_ref.get()
+        
+        if doc.exists:
+            exercise_data = doc.to_dict()
+            exercise_data['id'] = doc.id
+            self.cache.set(('exercise', exercise_id), exercise_data, since=since)
+            return exercise_data
+        else:
+            return None
             
     def get_routine_exercise(self, routine_exercise_id):
         """Get a specific routine-exercise link by ID with complete data."""
         try:
+            if self._mirror_live():
+                re_data = self.mirror.get_routine_link(routine_exercise_id)
+                exercise_data = self.mirror.get_exercise(re_data['exercise_id']) if re_data else None
+                if not exercise_data:
+                    return None
+                return self._merge_routine_exercise(exercise_data, re_data)
+            
             re_ref = self.db.collection('routine_exercises').document(routine_exercise_id)
             re_doc = re_ref.get()
             
@@ -298,17 +827,9 @@ class FirebaseHandler:
             exercise_doc = exercise_ref.get()
             
             if exercise_doc.exists:
-                # Start with base exercise data
                 exercise_data = exercise_doc.to_dict()
                 exercise_data['id'] = exercise_doc.id
-                
-                # Override with routine-specific settings
-                exercise_data['routine_exercise_id'] = re_data['id']
-                exercise_data['sets'] = re_data.get('sets', exercise_data.get('default_sets', 0))
-                exercise_data['reps'] = re_data.get('reps', exercise_data.get('default_reps', 0))
-                exercise_data['rep_time'] = re_data.get('rep_time', exercise_data.get('default_rep_time', 3))
-                exercise_data['rest_time'] = re_data.get('rest_time', exercise_data.get('default_rest_time', 60))
-                exercise_data['order'] = re_data.get('order', 0)
+                exercise_data = self._merge_routine_exercise(exercise_data, re_data)
                 
                 return exercise_data
             else:
@@ -337,6 +858,8 @@ class FirebaseHandler:
             # Set the document with the specified ID
             doc_ref = self.db.collection('exercises').document(exercise_id)
             doc_ref.set(exercise_data)
+            self._invalidate_exercise(exercise_id)
+            self._rebuild_plans_for_exercise(exercise_id)
             
             return exercise_id
         except Exception as e:
@@ -363,6 +886,8 @@ class FirebaseHandler:
             # Set the document with the specified ID
             doc_ref = self.db.collection('routine_exercises').document(routine_exercise_id)
             doc_ref.set(routine_exercise_data)
+            self._invalidate_routine_exercise(routine_exercise_id, routine_exercise_data.get('routine_id'))
+            self._rebuild_plans_for_routine_exercise(routine_exercise_id, routine_exercise_data.get('routine_id'))
             
             return routine_exercise_id
         except Exception as e:
@@ -377,6 +902,8 @@ class FirebaseHandler:
             
             doc_ref = self.db.collection('exercises').document(exercise_id)
             doc_ref.update(exercise_data)
+            self._invalidate_exercise(exercise_id)
+            self._rebuild_plans_for_exercise(exercise_id)
             
             return True
         except Exception as e:
@@ -391,6 +918,8 @@ class FirebaseHandler:
             
             doc_ref = self.db.collection('routine_exercises').document(routine_exercise_id)
             doc_ref.update(routine_exercise_data)
+            self._invalidate_routine_exercise(routine_exercise_id, routine_exercise_data.get('routine_id'))
+            self._rebuild_plans_for_routine_exercise(routine_exercise_id, routine_exercise_data.get('routine_id'))
             
             return True
         except Exception as e:
@@ -398,14 +927,23 @@ class FirebaseHandler:
             return False
 
     def delete_exercise(self, exercise_id):
-        """Delete a specific exercise from the catalog.
-        Note: This won't delete routine_exercise links automatically.
+        """Delete a specific exercise from the catalog along with every routine_exercises link to it.
+        Batching works as in delete_routine: the exercise goes in the first batch, so an
+        interrupted delete can only leave orphaned links.
         """
         try:
-            doc_ref = self.db.collection('exercises').document(exercise_id)
-            doc_ref.delete()
+            routine_exercises_ref = self.db.collection('routine_exercises').where('exercise_id', '==', exercise_id)
+            links = list(routine_exercises_ref.stream())
+            writes = [self._delete_writes('exercises', exercise_id)]
+            writes += [self._delete_writes('routine_exercises', doc.id) for doc in links]
             
-            return True
+            errors = self._commit_in_batches(writes)
+            self._invalidate_exercise(exercise_id)
+            for doc in links:
+                self._invalidate_routine_exercise(doc.id)
+            self._rebuild_plans_for_exercise(exercise_id)
+            
+            return not any(errors)
         except Exception as e:
             print(f"Error deleting exercise: {e}")
             return False
@@ -413,10 +951,361 @@ class FirebaseHandler:
     def delete_routine_exercise(self, routine_exercise_id):
         """Delete a specific link between routine and exercise."""
         try:
-            doc_ref = self.db.collection('routine_exercises').document(routine_exercise_id)
-            doc_ref.delete()
+            errors = self._commit_in_batches([self._delete_writes('routine_exercises', routine_exercise_id)])
+            if errors[0] is not None:
+                return False
+            self._invalidate_routine_exercise(routine_exercise_id)
+            self._rebuild_plans_for_routine_exercise(routine_exercise_id)
             
             return True
         except Exception as e:
             print(f"Error deleting routine exercise link: {e}")
             return False
+
+    # Delta sync (see sync.py)
+
+    def get_changes(self, since=None, user_id=None, page_size=sync.PAGE_SIZE):
+        """Get the routines, catalog exercises, routine exercises and (with user_id) the user's workouts
+        changed or deleted from the sync.Position since. Without since, or when since is older than
+        the tombstones, returns everything instead, with 'full' set.
+        Returns {'changes': {collection: [documents]}, 'deleted': {collection: [IDs]}, 'position',
+        'has_more', 'full'}, or None if a read failed.
+        """
+        try:
+            now = datetime.now()
+            full = since is None or sync.expired(since, now)
+            position = sync.START if full else since
+
+            sources = {collection: self.db.collection(collection) for collection in sync.SYNCED_COLLECTIONS}
+            if user_id:
+                sources['workouts'] = self.db.collection('workouts').where('user_id', '==', user_id)
+            if not full:
+                audiences = [sync.EVERYONE, user_id] if user_id else [sync.EVERYONE]
+                sources[sync.TOMBSTONES] = self.db.collection(sync.TOMBSTONES).where('audience', 'in', audiences)
+
+            pages = {}
+            for name, query in sources.items():
+                # Needs a composite index on workouts (user_id, updated_at) and tombstones (audience, updated_at)
+                page_query = query.where('updated_at', '>' if position.after else '>=', position.timestamp)
+                page_query = page_query.order_by('updated_at').limit(page_size + 1)
+                pages[name] = self._sync_documents(page_query)
+                if sync.is_tie(pages[name], position, page_size):
+                    pages[name] = self._sync_documents(query.where('updated_at', '==', position.timestamp))
+
+            changes, deleted, next_position, has_more = sync.assemble(pages, position, now, page_size)
+            return {'changes': changes, 'deleted': deleted, 'position': next_position, 'has_more': has_more, 'full': full}
+        except Exception as e:
+            print(f"Error getting changes: {e}")
+            return None
+
+    def _sync_documents(self, query):
+        documents = []
+        for doc in query.stream():
+            data = logged_sets.with_logged_sets(doc.to_dict())
+            data['id'] = doc.id
+            documents.append(data)
+        return documents
+
+    # Cache warming
+
+    def preload_catalog(self):
+        """Fill the cache with every routine, catalog exercise and routine exercise list.
+        Reads each of the three collections once. Returns the number of routines loaded.
+        """
+        if self._mirror_live() or not self.cache.enabled:
+            return 0
+        try:
+            since = self.cache.generation()
+            routines = self.get_routines()
+            catalog = {exercise['id']: exercise for exercise in self.get_exercises()}
+            
+            links_by_routine = {}
+            for doc in self.db.collection('routine_exercises').stream():
+                re_data = doc.to_dict()
+                re_data['id'] = doc.id
+                links_by_routine.setdefault(re_data.get('routine_id'), []).append(re_data)
+            
+            for exercise_id, exercise_data in catalog.items():
+                self.cache.set(('exercise', exercise_id), exercise_data, since=since)
+            for routine in routines:
+                self.cache.set(('routine', routine['id']), routine, since=since)
+                routine_exercises = sorted(links_by_routine.get(routine['id'], []), key=lambda x: x.get('order', 0))
+                exercises = self._merge_routine_exercises(routine_exercises, catalog)
+                self._cache_routine_exercises(routine['id'], routine_exercises, exercises, since)
+            return len(routines)
+        except Exception as e:
+            print(f"Error preloading catalog: {e}")
+            return 0
+    
+    def close(self):
+        """Stop the orphan sweeper and catalog mirror and close the Firestore client."""
+        if self._sweeper_stop is not None:
+            self._sweeper_stop.set()
+        if self.mirror is not None:
+            self.mirror.stop()
+        close = getattr(self.db, 'close', None)
+        if close is not None:
+            close()
+    
+    # Cache invalidation helpers
+    
+    def _invalidate_exercise(self, exercise_id):
+        """Drop cached reads that include a catalog exercise."""
+        self.cache.invalidate(('exercise', exercise_id), ('exercises', None))
+        self.cache.invalidate_tag(('exercise', exercise_id))
+        # Any routine's exercise list may include it
+        self.flights.forget()
+    
+    def _invalidate_routine_exercise(self, routine_exercise_id, routine_id=None):
+        """Drop cached routine exercise lists that include a link.
+        routine_id covers new links and links moved to another routine.
+        """
+        self.cache.invalidate_tag(('routine_exercise', routine_exercise_id))
+        if routine_id:
+            self.cache.invalidate(('exercises', routine_id))
+        self.flights.forget()
+
+    # Routine Plans (denormalized routine + ordered exercises, one document per routine)
+    
+    def get_routine_plan(self, routine_id):
+        """Get a routine with its ordered, merged exercises from its routine_plans document.
+        Plans that don't exist yet are built on first read.
+        """
+        try:
+            doc = self.db.collection('routine_plans').document(routine_id).get()
+            plan = doc.to_dict() if doc.exists else self._rebuild_routine_plan(routine_id)
+            if plan is None:
+                return None
+            
+            plan['id'] = routine_id
+            # Lookup arrays are only used to find plans affected by writes
+            plan.pop('exercise_ids', None)
+            plan.pop('routine_exercise_ids', None)
+            return plan
+        except Exception as e:
+            print(f"Error getting routine plan: {e}")
+            return None
+    
+    def _rebuild_routine_plan(self, routine_id):
+        """Rebuild the routine_plans document for one routine from Firestore.
+        Deletes the plan if the routine no longer exists. Returns the plan data or None.
+        """
+        try:
+            plan_ref = self.db.collection('routine_plans').document(routine_id)
+            routine_doc = self.db.collection('routines').document(routine_id).get()
+            if not routine_doc.exists:
+                plan_ref.delete()
+                return None
+            
+            routine_data = routine_doc.to_dict()
+            routine_data['id'] = routine_doc.id
+            routine_exercises, exercises = self._fetch_routine_exercises(routine_id)
+            
+            plan = self._routine_plan(routine_data, routine_exercises, exercises)
+            plan_ref.set(plan)
+            for listener in self.plan_listeners:
+                listener(routine_id, plan)
+            return plan
+        except Exception as e:
+            print(f"Error rebuilding routine plan: {e}")
+            return None
+    
+    def _routine_plan(self, routine_data, routine_exercises, exercises):
+        """Build a routine_plans document from a routine, its ordered links and merged exercises."""
+        return {
+            'routine': routine_data,
+            'exercises': exercises,
+            'exercise_ids': sorted({re['exercise_id'] for re in routine_exercises}),
+            'routine_exercise_ids': [re['id'] for re in routine_exercises],
+            'updated_at': datetime.now().isoformat(),
+        }
+    
+    def _rebuild_plans_for_exercise(self, exercise_id):
+        """Rebuild only the plans of routines that link to a catalog exercise."""
+        self._rebuild_plans_for_exercises([exercise_id])
+    
+    def _rebuild_plans_for_exercises(self, exercise_ids):
+        """Rebuild only the plans of routines that link to any of the given catalog exercises."""
+        exercise_ids = list(dict.fromkeys(exercise_ids))
+        routine_ids = set()
+        for start in range(0, len(exercise_ids), ARRAY_CONTAINS_ANY_LIMIT):
+            chunk = exercise_ids[start:start + ARRAY_CONTAINS_ANY_LIMIT]
+            plans_ref = self.db.collection('routine_plans').where('exercise_ids', 'array_contains_any', chunk)
+            routine_ids.update(doc.id for doc in plans_ref.stream())
+        for routine_id in routine_ids:
+            self._rebuild_routine_plan(routine_id)
+    
+    def _rebuild_plans_for_routine_exercise(self, routine_exercise_id, routine_id=None):
+        """Rebuild the plans that contain a link, plus routine_id's plan for new or moved links."""
+        self._rebuild_plans_for_routine_exercises([routine_exercise_id], [routine_id] if routine_id else [])
+    
+    def _rebuild_plans_for_routine_exercises(self, routine_exercise_ids, routine_ids=()):
+        """Rebuild the plans that contain any of the given links, plus the plans of routine_ids."""
+        routine_exercise_ids = list(dict.fromkeys(routine_exercise_ids))
+        plan_routine_ids = set(routine_ids)
+        for start in range(0, len(routine_exercise_ids), ARRAY_CONTAINS_ANY_LIMIT):
+            chunk = routine_exercise_ids[start:start + ARRAY_CONTAINS_ANY_LIMIT]
+            plans_ref = self.db.collection('routine_plans').where('routine_exercise_ids', 'array_contains_any', chunk)
+            plan_routine_ids.update(doc.id for doc in plans_ref.stream())
+        for routine_id in plan_routine_ids:
+            self._rebuild_routine_plan(routine_id)
+
+    # Batched writes
+    
+    def _commit_in_batches(self, writes):
+        """Commit (operation, doc_ref, data) writes in chunks of at most BATCH_WRITE_LIMIT.
+        operation is 'set', 'update' or 'delete' (data is ignored for deletes). A list of writes in
+        place of a write, like the ones _delete_writes returns, always goes in one chunk.
+        Each chunk commits atomically; a failed chunk doesn't stop later chunks.
+        Returns one entry per write or list: None if it was committed, otherwise the error message.
+        """
+        chunks = [[]]
+        size = 0
+        for write in writes:
+            group = write if isinstance(write, list) else [write]
+            if size + len(group) > BATCH_WRITE_LIMIT and chunks[-1]:
+                chunks.append([])
+                size = 0
+            chunks[-1].append(group)
+            size += len(group)
+        
+        errors = []
+        for chunk in chunks:
+            if not chunk:
+                continue
+            batch = self.db.batch()
+            for operation, doc_ref, data in (write for group in chunk for write in group):
+                if operation == 'delete':
+                    batch.delete(doc_ref)
+                else:
+                    getattr(batch, operation)(doc_ref, data)
+            
+            try:
+                batch.commit()
+                errors.extend([None] * len(chunk))
+            except Exception as e:
+                print(f"Error committing batch: {e}")
+                errors.extend([str(e)] * len(chunk))
+        return errors
+    
+    def _delete_writes(self, collection, document_id, audience=sync.EVERYONE):
+        """Writes deleting a synced document and leaving its tombstone, for _commit_in_batches."""
+        tombstone_id, tombstone = sync.tombstone(collection, document_id, audience)
+        return [
+            ('delete', self.db.collection(collection).document(document_id), None),
+            ('set', self.db.collection(sync.TOMBSTONES).document(tombstone_id), tombstone),
+        ]
+    
+    def _create_in_batches(self, collection, documents):
+        """Create documents with batched writes, stamping timestamps and IDs like the create_* methods.
+        Returns one result per document, see _batch_results.
+        """
+        writes = []
+        ids = []
+        for document_data in documents:
+            document_data['created_at'] = datetime.now().isoformat()
+            document_data['updated_at'] = datetime.now().isoformat()
+            doc_id = document_data.get('id', str(uuid.uuid4()))
+            ids.append(doc_id)
+            writes.append(('set', self.db.collection(collection).document(doc_id), document_data))
+        
+        return _batch_results(ids, self._commit_in_batches(writes))
+    
+    def create_workouts_batch(self, workouts):
+        """Create several workouts, each chunk of WORKOUT_TRANSACTION_SIZE in one transaction with the
+        updates to its users' rollups. workouts is a list of {'user_id': ..., 'workout_data': {...}}.
+        Returns per-workout results, see _batch_results.
+        """
+        writes = []
+        for workout in workouts:
+            workout_data = workout['workout_data']
+            workout_data['user_id'] = workout['user_id']
+            workout_data['created_at'] = datetime.now().isoformat()
+            workout_data['updated_at'] = datetime.now().isoformat()
+            self._stamp_workout_summary(workout_data)
+            writes.append(('set', workout_data.get('id', str(uuid.uuid4())), workout_data))
+        
+        errors = []
+        for start in range(0, len(writes), WORKOUT_TRANSACTION_SIZE):
+            chunk = writes[start:start + WORKOUT_TRANSACTION_SIZE]
+            try:
+                self._write_workouts(chunk)
+                errors.extend([None] * len(chunk))
+            except Exception as e:
+                print(f"Error committing workouts: {e}")
+                errors.extend([str(e)] * len(chunk))
+        return _batch_results([workout_id for _, workout_id, _ in writes], errors)
+    
+    def create_exercises_batch(self, exercises):
+        """Create several catalog exercises with batched writes. Returns per-exercise results."""
+        results = self._create_in_batches('exercises', exercises)
+        created = [result['id'] for result in results if result['status'] == 'created']
+        for exercise_id in created:
+            self._invalidate_exercise(exercise_id)
+        self._rebuild_plans_for_exercises(created)
+        return results
+    
+    def create_routine_exercises_batch(self, routine_exercises):
+        """Create several routine-exercise links with batched writes. Returns per-link results.
+        Each affected routine's plan is rebuilt once, not once per link.
+        """
+        results = self._create_in_batches('routine_exercises', routine_exercises)
+        created = []
+        routine_ids = set()
+        for result, re_data in zip(results, routine_exercises):
+            if result['status'] == 'created':
+                self._invalidate_routine_exercise(result['id'], re_data['routine_id'])
+                created.append(result['id'])
+                routine_ids.add(re_data['routine_id'])
+        self._rebuild_plans_for_routine_exercises(created, routine_ids)
+        return results
+
+    # Orphaned link cleanup
+    
+    def sweep_orphaned_routine_exercises(self, dry_run=False):
+        """Delete routine_exercises links whose routine or catalog exercise no longer exists.
+        Returns the IDs of the orphaned links (deleted unless dry_run).
+        """
+        try:
+            links = []
+            for doc in self.db.collection('routine_exercises').stream():
+                re_data = doc.to_dict()
+                re_data['id'] = doc.id
+                links.append(re_data)
+            
+            routines = self._get_documents_by_ids('routines', [re.get('routine_id') for re in links if re.get('routine_id')])
+            exercises = self._get_exercises_by_ids([re.get('exercise_id') for re in links if re.get('exercise_id')])
+            orphans = [
+                re for re in links
+                if re.get('routine_id') not in routines or re.get('exercise_id') not in exercises
+            ]
+            
+            if orphans and not dry_run:
+                writes = [self._delete_writes('routine_exercises', re['id']) for re in orphans]
+                self._commit_in_batches(writes)
+                for re in orphans:
+                    self._invalidate_routine_exercise(re['id'], re.get('routine_id'))
+                self._rebuild_plans_for_routine_exercises([re['id'] for re in orphans])
+            
+            return [re['id'] for re in orphans]
+        except Exception as e:
+            print(f"Error sweeping orphaned routine exercises: {e}")
+            return []
+    
+    def start_orphan_sweeper(self, interval):
+        """Run sweep_orphaned_routine_exercises every interval seconds on a daemon thread.
+        Returns a threading.Event; set it to stop the sweeper. Does nothing if one is already running.
+        """
+        if self._sweeper_stop is not None and not self._sweeper_stop.is_set():
+            return self._sweeper_stop
+        stop = threading.Event()
+        
+        def sweep_loop():
+            while not stop.wait(interval):
+                orphans = self.sweep_orphaned_routine_exercises()
+                if orphans:
+                    print(f"Deleted {len(orphans)} orphaned routine exercise links")
+        
+        threading.Thread(target=sweep_loop, name='orphan-sweeper', daemon=True).start()
+        self._sweeper_stop = stop
+        return stop
@@ -0,0 +1,245 @@
+"""
+Firestore client wrapper that counts reads, writes and round trips (see metrics.py).
+
+It wraps any client implementing the storage interface in storage.py and passes
+everything else, such as snapshot listeners and close(), through unchanged.
+References and snapshots handed back by the wrapped client (e.g.
+snapshot.reference) are accepted wherever wrapped ones are. AsyncInstrumentedClient
+does the same for the async Firestore client.
+"""
+import metrics
+
+QUERY_METHODS = ('where', 'order_by', 'limit', 'limit_to_last', 'offset', 'start_at', 'start_after',
+                 'end_at', 'end_before', 'select')
+
+
+def _unwrap(reference):
+    return getattr(reference, '_wrapped', reference)
+
+
+def _unwrap_transaction(kwargs):
+    if kwargs.get('transaction') is not None:
+        kwargs['transaction'] = _unwrap(kwargs['transaction'])
+    return kwargs
+
+
+def _collection_of(path):
+    """Collection ID of a document or collection path."""
+    parts = path.split('/')
+    return parts[-2] if len(parts) % 2 == 0 else parts[-1]
+
+
+class _Wrapper:
+    def __init__(self, wrapped):
+        self._wrapped = wrapped
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+
+class InstrumentedQuery(_Wrapper):
+    def __init__(self, wrapped, collection):
+        super().__init__(wrapped)
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attribute = getattr(self._wrapped, name)
+        if name in QUERY_METHODS:
+            # Refined queries stay instrumented
+            return lambda *args, **kwargs: self._refine(attribute(*args, **kwargs))
+        return attribute
+
+    def _refine(self, query):
+        return InstrumentedQuery(query, self._collection)
+
+    def stream(self, *args, **kwargs):
+        metrics.record_round_trip('query')
+        count = 0
+        try:
+            for doc in self._wrapped.stream(*args, **_unwrap_transaction(kwargs)):
+                count += 1
+                yield doc
+        finally:
+            # Firestore bills a query that matches nothing as one read
+            metrics.record_reads(self._collection, max(count, 1))
+
+    def get(self, *args, **kwargs):
+        return list(self.stream(*args, **kwargs))
+
+
+class InstrumentedCollectionReference(InstrumentedQuery):
+    def document(self, *args, **kwargs):
+        return InstrumentedDocumentReference(self._wrapped.document(*args, **kwargs), self._collection)
+
+
+class InstrumentedDocumentReference(_Wrapper):
+    def __init__(self, wrapped, collection):
+        super().__init__(wrapped)
+        self._collection = collection
+
+    def get(self, *args, **kwargs):
+        metrics.record_round_trip('get')
+        metrics.record_reads(self._collection)
+        return self._wrapped.get(*args, **_unwrap_transaction(kwargs))
+
+    def _write(self, method, *args, **kwargs):
+        metrics.record_round_trip('write')
+        result = getattr(self._wrapped, method)(*args, **kwargs)
+        metrics.record_writes(self._collection)
+        return result
+
+    def set(self, *args, **kwargs):
+        return self._write('set', *args, **kwargs)
+
+    def update(self, *args, **kwargs):
+        return self._write('update', *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._write('delete', *args, **kwargs)
+
+    def collection(self, collection_id):
+        return InstrumentedCollectionReference(self._wrapped.collection(collection_id), collection_id)
+
+
+class InstrumentedWriteBatch(_Wrapper):
+    def __init__(self, wrapped):
+        super().__init__(wrapped)
+        self._collections = []
+
+    def _add(self, method, reference, *args, **kwargs):
+        reference = _unwrap(reference)
+        self._collections.append(_collection_of(reference.path))
+        return getattr(self._wrapped, method)(reference, *args, **kwargs)
+
+    def set(self, reference, *args, **kwargs):
+        return self._add('set', reference, *args, **kwargs)
+
+    def update(self, reference, *args, **kwargs):
+        return self._add('update', reference, *args, **kwargs)
+
+    def delete(self, reference, *args, **kwargs):
+        return self._add('delete', reference, *args, **kwargs)
+
+    def commit(self, *args, **kwargs):
+        metrics.record_round_trip('commit')
+        result = self._wrapped.commit(*args, **kwargs)
+        collections, self._collections = self._collections, []
+        for collection in set(collections):
+            metrics.record_writes(collection, collections.count(collection))
+        return result
+
+
+class InstrumentedTransaction(InstrumentedWriteBatch):
+    """Transaction whose writes are counted as they are queued, since it commits out of sight
+    (in run() or firestore.transactional).
+    """
+
+    def __getattr__(self, name):
+        if name == 'run':
+            # Only backends other than Firestore have run(); fn gets this wrapper, not the inner transaction
+            run = self._wrapped.run
+            return lambda fn: run(lambda transaction: fn(self))
+        return getattr(self._wrapped, name)
+
+    def _add(self, method, reference, *args, **kwargs):
+        result = super()._add(method, reference, *args, **kwargs)
+        metrics.record_writes(self._collections.pop())
+        return result
+
+
+class InstrumentedClient(_Wrapper):
+    """Firestore client (or storage backend) that reports its usage to metrics."""
+
+    def collection(self, path):
+        return InstrumentedCollectionReference(self._wrapped.collection(path), _collection_of(path))
+
+    def document(self, path):
+        return InstrumentedDocumentReference(self._wrapped.document(path), _collection_of(path))
+
+    def batch(self):
+        return InstrumentedWriteBatch(self._wrapped.batch())
+
+    def transaction(self, *args, **kwargs):
+        metrics.record_round_trip('transaction')
+        return InstrumentedTransaction(self._wrapped.transaction(*args, **kwargs))
+
+    def get_all(self, references, *args, **kwargs):
+        metrics.record_round_trip('get_all')
+        references = [_unwrap(reference) for reference in references]
+        for doc in self._wrapped.get_all(references, *args, **_unwrap_transaction(kwargs)):
+            metrics.record_reads(_collection_of(doc.reference.path))
+            yield doc
+
+
+# Async client: the same accounting, with round trips that are awaited
+
+class AsyncInstrumentedQuery(InstrumentedQuery):
+    def _refine(self, query):
+        return AsyncInstrumentedQuery(query, self._collection)
+
+    async def stream(self, *args, **kwargs):
+        metrics.record_round_trip('query')
+        count = 0
+        try:
+            async for doc in self._wrapped.stream(*args, **_unwrap_transaction(kwargs)):
+                count += 1
+                yield doc
+        finally:
+            metrics.record_reads(self._collection, max(count, 1))
+
+    async def get(self, *args, **kwargs):
+        return [doc async for doc in self.stream(*args, **kwargs)]
+
+
+class AsyncInstrumentedCollectionReference(AsyncInstrumentedQuery):
+    def document(self, *args, **kwargs):
+        return AsyncInstrumentedDocumentReference(self._wrapped.document(*args, **kwargs), self._collection)
+
+
+class AsyncInstrumentedDocumentReference(InstrumentedDocumentReference):
+    async def get(self, *args, **kwargs):
+        metrics.record_round_trip('get')
+        metrics.record_reads(self._collection)
+        return await self._wrapped.get(*args, **_unwrap_transaction(kwargs))
+
+    async def _write(self, method, *args, **kwargs):
+        metrics.record_round_trip('write')
+        result = await getattr(self._wrapped, method)(*args, **kwargs)
+        metrics.record_writes(self._collection)
+        return result
+
+    def collection(self, collection_id):
+        return AsyncInstrumentedCollectionReference(self._wrapped.collection(collection_id), collection_id)
+
+
+class AsyncInstrumentedWriteBatch(InstrumentedWriteBatch):
+    async def commit(self, *args, **kwargs):
+        metrics.record_round_trip('commit')
+        result = await self._wrapped.commit(*args, **kwargs)
+        collections, self._collections = self._collections, []
+        for collection in set(collections):
+            metrics.record_writes(collection, collections.count(collection))
+        return result
+
+
+class AsyncInstrumentedClient(InstrumentedClient):
+    """firestore.AsyncClient that reports its usage to metrics. Transactions pass through uncounted."""
+
+    def collection(self, path):
+        return AsyncInstrumentedCollectionReference(self._wrapped.collection(path), _collection_of(path))
+
+    def document(self, path):
+        return AsyncInstrumentedDocumentReference(self._wrapped.document(path), _collection_of(path))
+
+    def batch(self):
+        return AsyncInstrumentedWriteBatch(self._wrapped.batch())
+
+    def transaction(self, *args, **kwargs):
+        return self._wrapped.transaction(*args, **kwargs)
+
+    async def get_all(self, references, *args, **kwargs):
+        metrics.record_round_trip('get_all')
+        references = [_unwrap(reference) for reference in references]
+        async for doc in self._wrapped.get_all(references, *args, **_unwrap_transaction(kwargs)):
+            metrics.record_reads(_collection_of(doc.reference.path))
+            yield doc
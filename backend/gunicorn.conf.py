@@ -0,0 +1,46 @@
+"""
+Gunicorn configuration for production:
+
+    gunicorn -c gunicorn.conf.py
+
+The master process imports app.py once (preload_app) but creates no Firestore
+client. Each worker creates its services after the fork in post_fork and starts
+accepting requests right away; its client, and with it its own gRPC channel, is
+opened and its catalog cache warmed on a background thread (see /api/ready).
+If its services can't be created, the worker still boots; /api/health keeps
+answering and /api/ready reports the error. On SIGTERM, workers finish in-flight requests for up to
+graceful_timeout seconds, then stop their background jobs and close their client.
+"""
+import multiprocessing
+import os
+
+wsgi_app = 'app:app'
+bind = f"0.0.0.0:{os.environ.get('PORT', '') or 5002}"
+
+# Requests mostly wait on Firestore, so each worker runs several threads
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', '') or multiprocessing.cpu_count() * 2 + 1)
+threads = int(os.environ.get('GUNICORN_THREADS', '') or 8)
+
+preload_app = True
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '') or 30)
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', '') or 30)
+keepalive = 5
+
+# Recycle workers periodically so slow leaks can't accumulate
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '') or 2000)
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+
+
+def post_fork(server, worker):
+    import app
+    # A worker whose services can't be created keeps running and reports it through /api/ready,
+    # rather than failing to boot and being restarted in a loop
+    app.try_init_services()
+
+
+def worker_exit(server, worker):
+    import app
+    app.shutdown_services()
@@ -0,0 +1,55 @@
+"""
+Sets logged during a workout (POST /api/workouts/<id>/sets).
+
+Logged sets are appended to a flat list in the workout document's logged_sets
+field with an ArrayUnion transform, so each append writes only the new sets
+instead of the whole exercises list. Each stored set keeps the exercise's
+exercise_id and/or name. Readers see them folded into exercises (with_logged_sets):
+each set goes to the workout's last entry for its exercise, or a new entry, as if
+it had been appended there. Saving a workout with exercises replaces them, so
+update_workout clears logged_sets.
+"""
+import copy
+
+FIELD = 'logged_sets'
+
+
+def _key(item):
+    return item.get('exercise_id') or item.get('name')
+
+
+def fold(exercises, sets):
+    """exercises with sets appended to the entries for their exercises. Neither is modified."""
+    exercises = copy.deepcopy(exercises) if isinstance(exercises, list) else []
+    entries = [entry for entry in exercises if isinstance(entry, dict)]
+    for entry in entries:
+        if not isinstance(entry.get('sets'), list):
+            entry['sets'] = []
+    for s in sets if isinstance(sets, list) else []:
+        if not isinstance(s, dict):
+            continue
+        entry = next((e for e in reversed(entries) if _key(e) == _key(s)), None)
+        if entry is None:
+            entry = {field: s[field] for field in ('exercise_id', 'name') if s.get(field)}
+            entry['sets'] = []
+            exercises.append(entry)
+            entries.append(entry)
+        entry['sets'].append({field: value for field, value in s.items() if field not in ('exercise_id', 'name')})
+    return exercises
+
+
+def with_logged_sets(workout):
+    """The workout as clients see it: its logged sets folded into exercises. Modifies and returns
+    workout; workouts without logged sets are returned unchanged.
+    """
+    if FIELD in workout:
+        workout['exercises'] = fold(workout.get('exercises'), workout.pop(FIELD))
+    return workout
+
+
+def set_ids(workout):
+    """The set_ids the workout already has, in exercises or logged sets."""
+    sets = [s for entry in workout.get('exercises') or [] if isinstance(entry, dict)
+            for s in (entry.get('sets') if isinstance(entry.get('sets'), list) else [])]
+    sets += workout.get(FIELD) if isinstance(workout.get(FIELD), list) else []
+    return {s.get('set_id') for s in sets if isinstance(s, dict)}
@@ -0,0 +1,271 @@
+"""
+In-process metrics in the Prometheus text format, and per-request accounting.
+
+Request hooks in app.py and asgi.py record latency and response size per route.
+Firestore reads, writes and round trips are counted by the instrumented client
+FirebaseHandler wraps its database in (see firestore_metrics.py). Each request
+carries a RequestStats in a context variable, so those counts are also
+attributed to the request that caused them and written to its access log line.
+
+Metrics are per process: with several gunicorn workers, each scrape sees the
+worker that answered it.
+"""
+import contextvars
+import json
+import logging
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+from datetime import datetime, timezone
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, tuple(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, list(state)) for key, state in self._values.items())
+        for key, state in values:
+            labels = tuple(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, state):
+                yield f"{self.name}_bucket", labels + (('le', _format_value(float(bound))),), count
+            yield f"{self.name}_bucket", labels + (('le', '+Inf'),), state[-1]
+            yield f"{self.name}_sum", labels, state[-2]
+            yield f"{self.name}_count", labels, state[-1]
+
+
+class Registry:
+    """Metrics plus collector callbacks that report values read at scrape time."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """Register collector(), which yields (name, kind, documentation, labels, value) tuples."""
+        self._collectors.append(collector)
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        described = set()
+        for collector in self._collectors:
+            for name, kind, documentation, labels, value in collector():
+                if name not in described:
+                    described.add(name)
+                    lines.append(f"# HELP {name} {documentation}")
+                    lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.counter('http_requests_total', 'HTTP requests by route and status.',
+                            ('method', 'route', 'status'))
+REQUEST_DURATION = REGISTRY.histogram('http_request_duration_seconds', 'Time to handle and send a response.',
+                                      ('method', 'route'))
+RESPONSE_SIZE = REGISTRY.histogram('http_response_size_bytes', 'Response body size as sent, after compression.',
+                                   ('route',), buckets=SIZE_BUCKETS)
+FIRESTORE_READS = REGISTRY.counter('firestore_reads_total', 'Documents read from Firestore.', ('collection',))
+FIRESTORE_WRITES = REGISTRY.counter('firestore_writes_total', 'Documents written to Firestore.', ('collection',))
+FIRESTORE_ROUND_TRIPS = REGISTRY.counter('firestore_round_trips_total', 'Firestore calls by operation.',
+                                         ('operation',))
+READS_PER_REQUEST = REGISTRY.histogram('firestore_reads_per_request', 'Firestore documents read per request.',
+                                       ('route',), buckets=COUNT_BUCKETS)
+WRITES_PER_REQUEST = REGISTRY.histogram('firestore_writes_per_request', 'Firestore documents written per request.',
+                                        ('route',), buckets=COUNT_BUCKETS)
+
+
+class RequestStats:
+    """Firestore usage attributed to one request."""
+
+    def __init__(self, request_id):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.reads = _Tally()  # collection -> documents
+        self.writes = _Tally()
+        self.round_trips = 0
+
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+def start_request(request_id):
+    """Begin accounting for a request in the current context. Returns (stats, token for end_request)."""
+    stats = RequestStats(request_id)
+    return stats, _current.set(stats)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def activate(stats):
+    """Attribute work in the current context to stats (e.g. while a streamed body is generated).
+    Returns a token for end_request.
+    """
+    return _current.set(stats)
+
+
+def current_request():
+    return _current.get()
+
+
+def record_round_trip(operation):
+    FIRESTORE_ROUND_TRIPS.inc(operation=operation)
+    stats = _current.get()
+    if stats is not None:
+        stats.round_trips += 1
+
+
+def record_reads(collection, count=1):
+    FIRESTORE_READS.inc(count, collection=collection)
+    stats = _current.get()
+    if stats is not None:
+        stats.reads[collection] += count
+
+
+def record_writes(collection, count=1):
+    FIRESTORE_WRITES.inc(count, collection=collection)
+    stats = _current.get()
+    if stats is not None:
+        stats.writes[collection] += count
+
+
+# Access log
+
+access_log = logging.getLogger('api.access')
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, with the record's `fields` merged in."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        return json.dumps(entry, default=str)
+
+
+def configure_access_log():
+    """Send access log lines to stdout as JSON, unless logging was configured elsewhere."""
+    if access_log.handlers:
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JSONFormatter())
+    access_log.addHandler(handler)
+    access_log.setLevel(logging.INFO)
+    access_log.propagate = False
+
+
+def finish_request(stats, method, route, path, status, size):
+    """Record a finished request's metrics and write its access log line."""
+    duration = time.perf_counter() - stats.started
+    reads = sum(stats.reads.values())
+    writes = sum(stats.writes.values())
+    REQUESTS.inc(method=method, route=route, status=str(status))
+    REQUEST_DURATION.observe(duration, method=method, route=route)
+    RESPONSE_SIZE.observe(size, route=route)
+    READS_PER_REQUEST.observe(reads, route=route)
+    WRITES_PER_REQUEST.observe(writes, route=route)
+    access_log.info(f"{method} {path} {status}", extra={'fields': {
+        'request_id': stats.request_id,
+        'method': method,
+        'path': path,
+        'route': route,
+        'status': status,
+        'duration_ms': round(duration * 1000, 3),
+        'response_bytes': size,
+        'firestore_reads': reads,
+        'firestore_writes': writes,
+        'firestore_round_trips': stats.round_trips,
+        'reads_by_collection': dict(stats.reads),
+        'writes_by_collection': dict(stats.writes),
+    }})
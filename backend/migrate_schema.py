@@ -3,120 +3,179 @@
 Migration script to convert from the old schema to the new normalized schema:
 - Old: routines and exercises (with routine_id)
 - New: routines, exercise catalog, and routine_exercises (join table)
+
+Catalog exercises and routine_exercises links get deterministic IDs, so the
+migration can be re-run or resumed without creating duplicates. Writes are
+committed in batches by a worker pool (see migration.py).
+
+It also backfills exercise_count on workouts saved before it was stored, which
+the paged workout list projects instead of reading every workout's exercises.
 """
 
-import os
-import sys
+import argparse
 from dotenv import load_dotenv
 from firebase_handler import FirebaseHandler
+from logged_sets import with_logged_sets
 from datetime import datetime
-import time
+from migration import Checkpoint, MigrationRunner, Write, deterministic_id
 
 # Load environment variables
 load_dotenv()
 
-def migrate_to_new_schema():
-    """Migrate data from old schema to new normalized schema."""
-    firebase = FirebaseHandler()
-    
-    # Step 1: Get all existing routines
-    print("Fetching all routines...")
-    routines = firebase.get_routines()
-    
-    if not routines:
-        print("No routines found. Exiting.")
-        return
-    
-    print(f"Found {len(routines)} routines.")
-    
-    # Step 2: Create exercise catalog
-    print("Creating exercise catalog...")
-    exercise_catalog = {}  # name -> id mapping
-    
-    # Loop through all routines
-    for routine in routines:
-        routine_id = routine['id']
-        print(f"\nProcessing routine: {routine['name']} (ID: {routine_id})")
-        
-        # Get all exercises for this routine
-        exercises = firebase.get_exercises(routine_id)
-        print(f"Found {len(exercises)} exercises in routine.")
-        
-        if not exercises:
-            print("No exercises found for this routine. Skipping.")
-            continue
-        
-        # Process each exercise
-        for i, exercise in enumerate(exercises):
-            # Add to exercise catalog if not already present
-            if exercise['name'] not in exercise_catalog:
-                # Create new catalog entry
-                catalog_data = {
-                    'name': exercise['name'],
-                    'default_sets': exercise.get('sets', 0),
-                    'default_reps': exercise.get('reps', 0),
-                    'default_rep_time': exercise.get('rep_time', 3),
-                    'default_rest_time': exercise.get('rest_time', 60),
-                }
-                
-                # Create the exercise in the catalog
-                exercise_id = firebase.create_exercise(catalog_data)
-                exercise_catalog[exercise['name']] = exercise_id
-                print(f"Created catalog exercise: {exercise['name']} (ID: {exercise_id})")
-            else:
-                exercise_id = exercise_catalog[exercise['name']]
-                print(f"Using existing catalog exercise: {exercise['name']} (ID: {exercise_id})")
-            
-            # Create routine_exercise link
-            routine_exercise_data = {
-                'routine_id': routine_id,
-                'exercise_id': exercise_id,
-                'order': exercise.get('order', i + 1),  # Use existing order or position in list
-                'sets': exercise.get('sets', 0),
-                'reps': exercise.get('reps', 0),
-                'rep_time': exercise.get('rep_time', 3),
-                'rest_time': exercise.get('rest_time', 60),
-            }
-            
-            routine_exercise_id = firebase.create_routine_exercise(routine_exercise_data)
-            print(f"Created routine-exercise link (ID: {routine_exercise_id})")
-            
-            # Wait briefly to avoid overwhelming Firestore
-            time.sleep(0.1)
-    
-    print("\nMigration completed successfully!")
-
-def cleanup_old_data():
-    """Remove old exercises (DANGEROUS - only run after verifying migration)."""
-    confirm = input("\nAre you sure you want to delete all old exercise data? (yes/no): ")
-    if confirm.lower() != 'yes':
-        print("Cleanup cancelled.")
-        return
-    
-    firebase = FirebaseHandler()
-    
-    # Get all exercises
-    exercise_docs = firebase.db.collection('exercises').stream()
-    count = 0
-    
-    for doc in exercise_docs:
+def get_old_exercises(db):
+    """Get old-schema exercise documents (those with a routine_id), in a stable order."""
+    old_exercises = []
+    for doc in db.collection('exercises').stream():
         exercise_data = doc.to_dict()
-        # Only delete exercises that have routine_id (old schema)
         if 'routine_id' in exercise_data:
-            doc.reference.delete()
-            count += 1
-            # Wait briefly to avoid overwhelming Firestore
-            time.sleep(0.1)
-    
-    print(f"Deleted {count} old exercise documents.")
+            exercise_data['id'] = doc.id
+            old_exercises.append(exercise_data)
+
+    old_exercises.sort(key=lambda x: (x['routine_id'], x.get('order', 0), x['id']))
+    return old_exercises
+
+def plan_schema_migration(db):
+    """Build the list of writes that migrates old-schema exercises to the catalog and links."""
+    routine_ids = {doc.id for doc in db.collection('routines').stream()}
+    print(f"Found {len(routine_ids)} routines.")
+
+    old_exercises = get_old_exercises(db)
+    print(f"Found {len(old_exercises)} old-schema exercises.")
+
+    now = datetime.now().isoformat()
+    catalog = {}  # exercise_id -> catalog write
+    links = []
+    migrated_routines = set()
+    position = {}  # routine_id -> position of the exercise within its routine
+
+    for exercise in old_exercises:
+        routine_id = exercise['routine_id']
+        if routine_id not in routine_ids:
+            print(f"Skipping exercise {exercise['id']}: routine {routine_id} not found")
+            continue
+
+        # Exercises with the same name (ignoring case) share one catalog entry; the first one seen sets the defaults
+        exercise_id = deterministic_id('exercise', exercise['name'].strip().lower())
+        if exercise_id not in catalog:
+            catalog[exercise_id] = Write('set', 'exercises', exercise_id, {
+                'name': exercise['name'],
+                'default_sets': exercise.get('sets', 0),
+                'default_reps': exercise.get('reps', 0),
+                'default_rep_time': exercise.get('rep_time', 3),
+                'default_rest_time': exercise.get('rest_time', 60),
+                'created_at': now,
+                'updated_at': now,
+            })
+
+        position[routine_id] = position.get(routine_id, 0) + 1
+        links.append(Write('set', 'routine_exercises', deterministic_id('link', routine_id, exercise['id']), {
+            'routine_id': routine_id,
+            'exercise_id': exercise_id,
+            'order': exercise.get('order', position[routine_id]),  # Use existing order or position in routine
+            'sets': exercise.get('sets', 0),
+            'reps': exercise.get('reps', 0),
+            'rep_time': exercise.get('rep_time', 3),
+            'rest_time': exercise.get('rest_time', 60),
+            'created_at': now,
+            'updated_at': now,
+        }))
+        migrated_routines.add(routine_id)
+
+    # Routine plans are rebuilt from the new links on their next read
+    plan_deletes = [Write('delete', 'routine_plans', routine_id) for routine_id in sorted(migrated_routines)]
+
+    return list(catalog.values()) + links + plan_deletes
+
+def migrate_to_new_schema(db=None, workers=4, checkpoint_path='migration_checkpoint.json', dry_run=False):
+    """Migrate data from old schema to new normalized schema."""
+    db = db or FirebaseHandler().db
+
+    print("Planning migration...")
+    writes = plan_schema_migration(db)
+    if not writes:
+        print("Nothing to migrate. Exiting.")
+        return None
+
+    runner = MigrationRunner(db, workers=workers, checkpoint_path=checkpoint_path, dry_run=dry_run)
+    summary = runner.run(writes, label='migrate')
+
+    if not dry_run and summary['failed_batches'] == 0:
+        print("\nMigration completed successfully!")
+    elif not dry_run:
+        print(f"\n{summary['failed_batches']} batches failed; run again to retry them.")
+    return summary
+
+def cleanup_old_data(db=None, workers=4, checkpoint_path='cleanup_checkpoint.json', dry_run=False, confirm=True):
+    """Remove old exercises (DANGEROUS - only run after verifying migration)."""
+    if confirm and not dry_run:
+        answer = input("\nAre you sure you want to delete all old exercise data? (yes/no): ")
+        if answer.lower() != 'yes':
+            print("Cleanup cancelled.")
+            return None
+
+    db = db or FirebaseHandler().db
+
+    # Only delete exercises that have routine_id (old schema)
+    writes = [Write('delete', 'exercises', exercise['id']) for exercise in get_old_exercises(db)]
+
+    runner = MigrationRunner(db, workers=workers, checkpoint_path=checkpoint_path, dry_run=dry_run)
+    summary = runner.run(writes, label='cleanup')
+
+    if not dry_run:
+        print(f"Deleted {summary['committed_writes']} old exercise documents.")
+    return summary
+
+def plan_exercise_count_backfill(db):
+    """Build the writes that add exercise_count to workouts that don't have it."""
+    writes = []
+    for doc in db.collection('workouts').stream():
+        workout = doc.to_dict()
+        if 'exercise_count' not in workout:
+            exercises = with_logged_sets(workout).get('exercises')
+            count = len(exercises) if isinstance(exercises, list) else 0
+            writes.append(Write('set', 'workouts', doc.id, {'exercise_count': count}, merge=True))
+    print(f"Found {len(writes)} workouts without exercise_count.")
+    return writes
+
+def backfill_exercise_counts(db=None, workers=4, checkpoint_path='backfill_checkpoint.json', dry_run=False):
+    """Store exercise_count on every workout saved before it was stored."""
+    db = db or FirebaseHandler().db
+    writes = plan_exercise_count_backfill(db)
+    if not writes:
+        return None
+    runner = MigrationRunner(db, workers=workers, checkpoint_path=checkpoint_path, dry_run=dry_run)
+    return runner.run(writes, label='backfill')
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate old-schema exercises to the catalog + routine_exercises schema.")
+    parser.add_argument('--dry-run', action='store_true', help='print the planned writes without committing them')
+    parser.add_argument('--workers', type=int, default=4, help='number of batches committed concurrently')
+    parser.add_argument('--checkpoint', default='migration_checkpoint.json', help='file recording finished batches')
+    parser.add_argument('--cleanup-checkpoint', default='cleanup_checkpoint.json', help='file recording finished cleanup batches')
+    parser.add_argument('--backfill-checkpoint', default='backfill_checkpoint.json', help='file recording finished backfill batches')
+    parser.add_argument('--restart', action='store_true', help='ignore the checkpoint and start over')
+    parser.add_argument('--cleanup', action='store_true', help='delete old-schema exercises after migrating')
+    parser.add_argument('--yes', action='store_true', help="don't ask for confirmation before cleanup")
+    args = parser.parse_args()
+
+    if args.restart:
+        for checkpoint_path in (args.checkpoint, args.cleanup_checkpoint, args.backfill_checkpoint):
+            Checkpoint(checkpoint_path).clear()
 
-if __name__ == "__main__":
     print("Starting schema migration...")
-    migrate_to_new_schema()
-    
-    # Ask if user wants to clean up old data
-    cleanup = input("\nDo you want to clean up old exercise data? (yes/no): ")
-    if cleanup.lower() == 'yes':
-        cleanup_old_data()
-    
+    summary = migrate_to_new_schema(workers=args.workers, checkpoint_path=args.checkpoint, dry_run=args.dry_run)
+
+    print("Backfilling workout exercise counts...")
+    backfill_exercise_counts(workers=args.workers, checkpoint_path=args.backfill_checkpoint, dry_run=args.dry_run)
+
+    if args.cleanup:
+        if summary and summary['failed_batches']:
+            print("Skipping cleanup because some migration batches failed.")
+        else:
+            cleanup_old_data(workers=args.workers, checkpoint_path=args.cleanup_checkpoint,
+                             dry_run=args.dry_run, confirm=not args.yes)
+
     print("Migration process completed.")
+
+if __name__ == "__main__":
+    main()
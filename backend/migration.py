@@ -0,0 +1,242 @@
+"""
+Batched, resumable write engine for bulk data migrations.
+
+A migration is planned up front as an ordered list of writes with deterministic
+document IDs, so running it again rewrites the same documents instead of creating
+duplicates. The writes are split into batches that a bounded worker pool commits
+under an adaptive rate limit, recording each finished batch in a checkpoint file
+so an interrupted run can resume where it stopped.
+
+Deletes of documents in the collections clients sync (see sync.py) also write
+their tombstone in the same batch, as FirebaseHandler's deletes do, so delta
+sync clients learn about them.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import sync
+
+# Firestore allows at most 500 writes in a single batch
+BATCH_WRITE_LIMIT = 500
+
+
+def deterministic_id(prefix, *parts):
+    """Build a stable document ID from the values that identify a document."""
+    digest = hashlib.sha1('\x1f'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return f"{prefix}-{digest[:20]}"
+
+
+class Write:
+    """A single planned write: operation is 'set' or 'delete'.
+    A 'set' with merge=True only overwrites the fields in data.
+    """
+
+    def __init__(self, operation, collection, doc_id, data=None, merge=False):
+        self.operation = operation
+        self.collection = collection
+        self.doc_id = doc_id
+        self.data = data
+        self.merge = merge
+
+    @property
+    def path(self):
+        return f"{self.collection}/{self.doc_id}"
+
+    @property
+    def leaves_tombstone(self):
+        return self.operation == 'delete' and self.collection in sync.SYNCED_COLLECTIONS
+
+    @property
+    def cost(self):
+        """Firestore writes this takes in a batch, counting its tombstone."""
+        return 2 if self.leaves_tombstone else 1
+
+
+class AdaptiveRateLimiter:
+    """Token bucket whose rate grows while commits succeed and halves when Firestore pushes back.
+
+    The rate is in batches per second. It starts at start_rate, grows by
+    increase_step after every success up to max_rate, and halves (down to
+    min_rate) on every throttled commit.
+    """
+
+    def __init__(self, start_rate=5.0, min_rate=0.5, max_rate=100.0, increase_step=0.5):
+        self.rate = start_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / self.rate
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def on_throttle(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+
+def is_throttling_error(error):
+    """True for errors that mean Firestore wants us to slow down and retry."""
+    name = type(error).__name__
+    return name in ('ResourceExhausted', 'DeadlineExceeded', 'Aborted', 'ServiceUnavailable', 'TooManyRequests')
+
+
+class Checkpoint:
+    """Set of finished batch keys persisted as JSON so a run can resume."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._done = set()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self._done = set(json.load(f).get('done', []))
+
+    def __contains__(self, key):
+        return key in self._done
+
+    def mark_done(self, key):
+        with self._lock:
+            self._done.add(key)
+            if self.path:
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump({'done': sorted(self._done)}, f)
+                os.replace(tmp_path, self.path)
+
+    def clear(self):
+        with self._lock:
+            self._done = set()
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
+
+
+class MigrationRunner:
+    """Commit a planned list of writes in batches with a bounded worker pool."""
+
+    def __init__(self, db, workers=4, batch_size=BATCH_WRITE_LIMIT, checkpoint_path=None,
+                 rate_limiter=None, max_retries=5, dry_run=False, progress_interval=2.0):
+        self.db = db
+        self.workers = workers
+        self.batch_size = min(batch_size, BATCH_WRITE_LIMIT)
+        self.checkpoint = Checkpoint(checkpoint_path)
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter()
+        self.max_retries = max_retries
+        self.dry_run = dry_run
+        self.progress_interval = progress_interval
+
+    def batches(self, writes):
+        """Split writes into batches of at most batch_size Firestore writes (tombstones included),
+        keyed by a hash of their document paths.
+        """
+        chunk, cost = [], 0
+        for write in writes:
+            if chunk and cost + write.cost > self.batch_size:
+                yield self._key(chunk), chunk
+                chunk, cost = [], 0
+            chunk.append(write)
+            cost += write.cost
+        if chunk:
+            yield self._key(chunk), chunk
+
+    @staticmethod
+    def _key(chunk):
+        return hashlib.sha1('\n'.join(f"{w.operation}:{w.path}" for w in chunk).encode('utf-8')).hexdigest()
+
+    def run(self, writes, label='migration'):
+        """Commit every write not covered by the checkpoint. Returns a summary dict."""
+        batches = list(self.batches(writes))
+        pending = [(key, chunk) for key, chunk in batches if key not in self.checkpoint]
+        skipped = len(batches) - len(pending)
+        summary = {
+            'writes': len(writes),
+            'batches': len(batches),
+            'skipped_batches': skipped,
+            'committed_batches': 0,
+            'failed_batches': 0,
+            'committed_writes': 0,
+            'seconds': 0.0,
+        }
+
+        if self.dry_run:
+            counts = {}
+            for write in writes:
+                counts[(write.operation, write.collection)] = counts.get((write.operation, write.collection), 0) + 1
+                if write.leaves_tombstone:
+                    counts[('set', sync.TOMBSTONES)] = counts.get(('set', sync.TOMBSTONES), 0) + 1
+            print(f"[dry run] {label}: {len(writes)} writes in {len(batches)} batches "
+                  f"({skipped} already done according to the checkpoint)")
+            for (operation, collection), count in sorted(counts.items()):
+                print(f"  {operation:<6} {collection}: {count}")
+            return summary
+
+        print(f"{label}: {len(writes)} writes in {len(batches)} batches, "
+              f"{skipped} already done, {self.workers} workers")
+        start = time.monotonic()
+        last_report = start
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self._commit, key, chunk): chunk for key, chunk in pending}
+            for future in as_completed(futures):
+                chunk = futures[future]
+                error = future.exception()
+                if error is None:
+                    summary['committed_batches'] += 1
+                    summary['committed_writes'] += len(chunk)
+                else:
+                    summary['failed_batches'] += 1
+                    print(f"Error committing batch: {error}")
+
+                now = time.monotonic()
+                if now - last_report >= self.progress_interval:
+                    last_report = now
+                    self._report(label, summary, len(pending), now - start)
+
+        summary['seconds'] = time.monotonic() - start
+        self._report(label, summary, len(pending), summary['seconds'])
+        return summary
+
+    def _commit(self, key, chunk):
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            batch = self.db.batch()
+            for write in chunk:
+                doc_ref = self.db.collection(write.collection).document(write.doc_id)
+                if write.operation == 'delete':
+                    batch.delete(doc_ref)
+                    if write.leaves_tombstone:
+                        tombstone_id, tombstone = sync.tombstone(write.collection, write.doc_id)
+                        batch.set(self.db.collection(sync.TOMBSTONES).document(tombstone_id), tombstone)
+                else:
+                    batch.set(doc_ref, write.data, merge=write.merge)
+            try:
+                batch.commit()
+            except Exception as e:
+                if not is_throttling_error(e) or attempt == self.max_retries:
+                    raise
+                self.rate_limiter.on_throttle()
+                continue
+            self.rate_limiter.on_success()
+            self.checkpoint.mark_done(key)
+            return
+
+    def _report(self, label, summary, pending, elapsed):
+        done = summary['committed_batches'] + summary['failed_batches']
+        throughput = summary['committed_writes'] / elapsed if elapsed > 0 else 0.0
+        print(f"{label}: {done}/{pending} batches, {summary['committed_writes']} writes, "
+              f"{throughput:.0f} writes/s, rate limit {self.rate_limiter.rate:.1f} batches/s, "
+              f"{summary['failed_batches']} failed")
@@ -0,0 +1,171 @@
+"""
+Ahead-of-time rendering of the audio cues played during a workout.
+
+Each routine's cue script (intro, set starts, rest announcements and countdowns,
+next-exercise announcements) is derived from its ordered exercises. Clips live in
+the content-addressed audio cache, so a phrase shared by several routines is
+rendered once, and re-rendering after an edit only synthesizes phrases whose text
+changed.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from speech import routine_intro_script
+
+# Spoken during every rest period, keyed by seconds remaining
+REST_COUNTDOWN = [(10, "Ten seconds left."), (3, "Three."), (2, "Two."), (1, "One.")]
+
+
+def routine_cues(routine, exercises):
+    """Return {cue_key: text} for a routine, in the order the cues play.
+    Keys match the ones the workout page looks up.
+    """
+    cues = {'intro': routine_intro_script(routine, exercises)}
+    has_rest = False
+    for index, exercise in enumerate(exercises):
+        sets = int(exercise.get('sets') or 0)
+        if index > 0:
+            cues[f"next_{exercise['id']}"] = f"Next up: {exercise['name']}."
+        for set_number in range(1, sets + 1):
+            cues[f"exercise_{exercise['id']}_set_{set_number}"] = f"Now starting {exercise['name']}, Set {set_number}"
+            # No rest after the last set of the last exercise
+            if index < len(exercises) - 1 or set_number < sets:
+                rest_time = exercise.get('rest_time') or 60
+                cues[f"rest_{exercise['id']}_set_{set_number}"] = f"Now starting Rest. {rest_time} seconds."
+                has_rest = True
+    if has_rest:
+        for seconds, text in REST_COUNTDOWN:
+            cues[f"countdown_{seconds}"] = text
+    return cues
+
+
+class AudioPrerenderer:
+    """Render routine cue scripts through the speech service with a bounded worker pool."""
+
+    def __init__(self, firebase, speech, workers=4):
+        self.firebase = firebase
+        self.speech = speech
+        self.workers = workers
+        self.running = False
+        self._stopping = False
+        self._pending = {}  # routine_id -> plan, or None to read it from Firestore
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def cues_for(self, routine_id, plan=None):
+        """Cue script for a routine, from its plan if given. Returns None if the routine doesn't exist."""
+        if plan is None:
+            plan = self.firebase.get_routine_plan(routine_id)
+        if not plan:
+            return None
+        return routine_cues(plan['routine'], plan['exercises'])
+
+    def manifest(self, routine_id, plan=None):
+        """Map each cue of a routine to its text and audio URL (None until rendered).
+        Returns None if the routine doesn't exist.
+        """
+        cues = self.cues_for(routine_id, plan)
+        if cues is None:
+            return None
+
+        entries = {}
+        for key, text in cues.items():
+            filename = self.speech.cached(text)
+            entries[key] = {'text': text, 'audio_url': self.speech.audio_url(filename) if filename else None}
+        return {
+            'routine_id': routine_id,
+            'cues': entries,
+            'ready': sum(1 for entry in entries.values() if entry['audio_url']),
+            'total': len(entries),
+        }
+
+    def render(self, routine_ids=None, plans=None):
+        """Render every missing phrase of the given routines (all routines by default).
+        plans optionally maps routine IDs to already loaded plans. Returns a summary dict.
+        """
+        plans = plans or {}
+        if routine_ids is None:
+            routine_ids = [routine['id'] for routine in self.firebase.get_routines()]
+
+        start = time.monotonic()
+        phrases = {}  # cache key -> text, so phrases shared across routines render once
+        for routine_id in routine_ids:
+            cues = self.cues_for(routine_id, plans.get(routine_id))
+            for text in (cues or {}).values():
+                phrases.setdefault(self.speech.key_for(text), text)
+
+        missing = [text for text in phrases.values() if not self.speech.cached(text)]
+        summary = {
+            'routines': len(routine_ids),
+            'phrases': len(phrases),
+            'cached': len(phrases) - len(missing),
+            'rendered': 0,
+            'failed': 0,
+            'seconds': 0.0,
+        }
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = {pool.submit(self.speech.synthesize, text): text for text in missing}
+                for future in as_completed(futures):
+                    error = future.exception()
+                    if error is None:
+                        summary['rendered'] += 1
+                    else:
+                        summary['failed'] += 1
+                        print(f"Error rendering '{futures[future]}': {error}")
+
+        summary['seconds'] = time.monotonic() - start
+        return summary
+
+    def schedule(self, routine_id, plan=None):
+        """Queue a routine for rendering on the background worker."""
+        with self._lock:
+            if plan is not None or routine_id not in self._pending:
+                self._pending[routine_id] = plan
+        self._wake.set()
+
+    def start(self, render_all=True):
+        """Render on a daemon thread: every routine first if render_all, then each routine
+        whose plan is rebuilt after a catalog or routine-exercise edit.
+        """
+        if self.running:
+            return
+        self.running = True
+        self.firebase.plan_listeners.append(self.schedule)
+
+        def render_loop():
+            if render_all:
+                self._render_and_report(None, {})
+            while True:
+                self._wake.wait()
+                self._wake.clear()
+                if self._stopping:
+                    return
+                with self._lock:
+                    pending, self._pending = self._pending, {}
+                if pending:
+                    plans = {routine_id: plan for routine_id, plan in pending.items() if plan is not None}
+                    self._render_and_report(list(pending), plans)
+
+        threading.Thread(target=render_loop, name='audio-prerender', daemon=True).start()
+
+    def stop(self):
+        """Stop the background worker after the render in progress, if any."""
+        if not self.running:
+            return
+        self.running = False
+        self._stopping = True
+        self.firebase.plan_listeners.remove(self.schedule)
+        self._wake.set()
+
+    def _render_and_report(self, routine_ids, plans):
+        try:
+            summary = self.render(routine_ids, plans)
+        except Exception as e:
+            print(f"Error pre-rendering audio: {e}")
+            return
+        if summary['rendered'] or summary['failed']:
+            print(f"Pre-rendered {summary['rendered']} audio cues for {summary['routines']} routines "
+                  f"({summary['failed']} failed)")
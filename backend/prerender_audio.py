@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Script to render the audio cues of every routine ahead of time, so the first
+workout of a routine doesn't wait on speech synthesis.
+"""
+import argparse
+from dotenv import load_dotenv
+from firebase_handler import FirebaseHandler
+from prerender import AudioPrerenderer
+from speech import SpeechService
+
+# Load environment variables
+load_dotenv()
+
+def prerender_audio(routine_ids=None, workers=4, firebase=None, speech=None):
+    """Render every missing cue of the given routines (all routines by default)."""
+    prerenderer = AudioPrerenderer(firebase or FirebaseHandler(), speech or SpeechService(), workers=workers)
+    
+    summary = prerenderer.render(routine_ids)
+    print(f"{summary['routines']} routines, {summary['phrases']} distinct phrases: "
+          f"{summary['cached']} already cached, {summary['rendered']} rendered, "
+          f"{summary['failed']} failed in {summary['seconds']:.1f}s")
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render routine announcement audio into the audio cache.")
+    parser.add_argument('--routine', action='append', dest='routine_ids', help='routine ID to render (repeatable; default: all routines)')
+    parser.add_argument('--workers', type=int, default=4, help='number of phrases synthesized concurrently')
+    args = parser.parse_args()
+    
+    prerender_audio(routine_ids=args.routine_ids, workers=args.workers)
@@ -0,0 +1,150 @@
+"""
+Opt-in cProfile profiles of single requests, kept in a bounded directory on disk.
+
+A request is profiled when it carries an X-Profile header equal to PROFILE_TOKEN,
+or at random with probability PROFILE_SAMPLE_RATE. The profile covers the route
+handler and, for streamed responses, generating the body. It is saved in pstats
+format next to a small JSON file describing the request; once the directory
+holds PROFILE_MAX_FILES profiles, the oldest are deleted.
+
+With no token and a zero sample rate (the default), requests skip profiling after
+one attribute check.
+"""
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+
+# Profile names are <milliseconds since the epoch>-<pid>-<request ID>
+PROFILE_NAME_PATTERN = re.compile(r'^\d+-\d+-[A-Za-z0-9._:-]{1,128}$')
+
+SORT_KEYS = ('cumulative', 'tottime', 'calls', 'ncalls', 'time')
+
+
+class ProfileStore:
+    """Directory of saved profiles, limited to the max_profiles newest."""
+
+    def __init__(self, directory, max_profiles=50):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+
+    def path_for(self, name):
+        """Path of a saved profile, or None if the name is malformed or unknown."""
+        if not PROFILE_NAME_PATTERN.match(name):
+            return None
+        path = os.path.join(self.directory, f"{name}.prof")
+        return path if os.path.exists(path) else None
+
+    def new_name(self, request_id):
+        return f"{int(time.time() * 1000)}-{os.getpid()}-{request_id}"
+
+    def save(self, profile, name, info):
+        """Write a finished profile and its request info."""
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, name)
+        profile.dump_stats(base + '.prof')
+        with open(base + '.json', 'w') as f:
+            json.dump(dict(info, name=name), f)
+        self._trim()
+
+    def _names(self):
+        """Saved profile names, oldest first."""
+        try:
+            files = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted((f[:-5] for f in files if f.endswith('.prof')), key=lambda name: int(name.split('-', 1)[0]))
+
+    def _trim(self):
+        # Workers share the directory, so each trims against what is on disk
+        with self._lock:
+            names = self._names()
+            for name in names[:max(len(names) - self.max_profiles, 0)]:
+                for extension in ('.prof', '.json'):
+                    try:
+                        os.remove(os.path.join(self.directory, name + extension))
+                    except FileNotFoundError:
+                        pass
+
+    def list(self):
+        """Request info of every saved profile, newest first."""
+        entries = []
+        for name in reversed(self._names()):
+            try:
+                with open(os.path.join(self.directory, f"{name}.json")) as f:
+                    entries.append(json.load(f))
+            except (FileNotFoundError, ValueError):
+                entries.append({'name': name})
+        return entries
+
+    def report(self, name, sort='cumulative', limit=40):
+        """pstats text report of a saved profile, or None if it doesn't exist."""
+        path = self.path_for(name)
+        if path is None:
+            return None
+        out = io.StringIO()
+        stats = pstats.Stats(path, stream=out)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+class RequestProfiler:
+    """Decide which requests to profile and run their profiles."""
+
+    def __init__(self, store=None, sample_rate=None, token=None):
+        if sample_rate is None:
+            sample_rate = float(os.environ.get('PROFILE_SAMPLE_RATE', '') or 0)
+        if token is None:
+            token = os.environ.get('PROFILE_TOKEN', '')
+        if store is None:
+            store = ProfileStore(
+                os.environ.get('PROFILE_DIR', 'profiles'),
+                max_profiles=int(os.environ.get('PROFILE_MAX_FILES', '') or 50),
+            )
+        self.store = store
+        self.sample_rate = sample_rate
+        self.token = token
+        self.enabled = bool(token) or sample_rate > 0
+
+    def authorized(self, header_value):
+        return bool(self.token) and hmac.compare_digest((header_value or '').encode(), self.token.encode())
+
+    def should_profile(self, header_value):
+        """Whether to profile a request with this X-Profile header value."""
+        if not self.enabled:
+            return False
+        if header_value is not None:
+            return self.authorized(header_value)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self):
+        """Return a running cProfile.Profile, or None if another profiler is active in this thread."""
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return None
+        return profile
+
+    def profiled(self, profile, chunks):
+        """Yield chunks, profiling the code that produces each one."""
+        iterator, done = iter(chunks), object()
+        while True:
+            try:
+                profile.enable()
+            except ValueError:
+                pass
+            try:
+                chunk = next(iterator, done)
+            finally:
+                profile.disable()
+            if chunk is done:
+                return
+            yield chunk
@@ -0,0 +1,299 @@
+"""
+Per-user workout rollups, kept in one user_stats document per user.
+
+Each workout contributes counts and totals to its user's rollup: workouts, sets,
+reps and volume overall, per routine and per exercise, plus a workout count per
+day for streaks. Writing a workout applies the difference between its old and new
+contributions (see apply), so the rollup never needs a rescan of the history.
+
+Bests and last-performed dates can't be un-maxed by subtraction, so each routine
+and exercise keeps a short list of candidates: its TOP_CANDIDATES best sets and
+most recent workouts, one entry per workout. Removing a workout drops its entries.
+Once a list has dropped a candidate to stay within TOP_CANDIDATES, it is recorded
+in the entry's 'truncated' and the list is only known to be the top of the
+history: a later candidate that ranks below its last entry may be behind a dropped
+one, so it isn't added. When a truncated list runs out, the rollup is marked stale
+and must be rebuilt from the history (build), which is rare.
+
+Documents look like:
+
+    {'user_id', 'workouts', 'sets', 'reps', 'volume',
+     'days': {'2024-01-31': 1, ...},
+     'last_workout_date', 'streak', 'longest_streak',
+     'routines': {routine key: {'name', 'workouts', 'sets', 'volume', 'last_performed', 'recent',
+                                'truncated'}},
+     'exercises': {exercise key: {'name', 'workouts', 'sets', 'reps', 'volume', 'best_set',
+                                  'best_sets', 'last_performed', 'recent', 'truncated'}},
+     'stale', 'updated_at'}
+
+Exercises are keyed like in analytics.py (exercise_id, else name), routines by
+routine_id, else the workout's name. streak is the run of consecutive workout days
+ending on last_workout_date; see current_streak for whether it is still going.
+"""
+from datetime import date, timedelta
+
+from logged_sets import fold, FIELD as LOGGED_SETS
+
+# Epley's formula overestimates beyond this many reps, so those sets don't count towards 1RM
+MAX_E1RM_REPS = 12
+
+# Best-set and recent-workout candidates kept per exercise and routine
+TOP_CANDIDATES = 5
+
+# Rounding applied after every update, so repeated deltas don't accumulate float error
+DIGITS = 2
+
+
+def empty(user_id):
+    return {
+        'user_id': user_id,
+        'workouts': 0,
+        'sets': 0,
+        'reps': 0,
+        'volume': 0.0,
+        'days': {},
+        'last_workout_date': None,
+        'streak': 0,
+        'longest_streak': 0,
+        'routines': {},
+        'exercises': {},
+        'stale': False,
+    }
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return 0
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return 0
+    return number if number == number else 0  # NaN
+
+
+def estimated_1rm(weight, reps):
+    """Epley estimate, as in analytics.py; None when the set can't be used."""
+    if weight <= 0 or not 1 <= reps <= MAX_E1RM_REPS:
+        return None
+    return weight if reps == 1 else weight * (1 + reps / 30)
+
+
+def workout_day(workout):
+    value = workout.get('date') or workout.get('created_at')
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(str(value)[:10]).isoformat()
+    except ValueError:
+        return None
+
+
+def contribution(workout):
+    """What one workout adds to its user's rollup."""
+    exercises = {}
+    # Logged sets count like the exercises they are folded into (see logged_sets.py)
+    for entry in fold(workout.get('exercises'), workout.get(LOGGED_SETS)):
+        if not isinstance(entry, dict):
+            continue
+        key = entry.get('exercise_id') or entry.get('name')
+        if not key:
+            continue
+        totals = exercises.setdefault(key, {'name': entry.get('name') or key, 'sets': 0, 'reps': 0, 'volume': 0.0, 'best': None})
+        for s in entry.get('sets') if isinstance(entry.get('sets'), list) else []:
+            if not isinstance(s, dict) or s.get('completed') is False:
+                continue
+            reps, weight = _number(s.get('reps')), _number(s.get('weight'))
+            totals['sets'] += 1
+            totals['reps'] += reps
+            totals['volume'] += reps * weight
+            e1rm = estimated_1rm(weight, reps)
+            best = totals['best']
+            if e1rm is not None and (best is None or e1rm > best['e1rm']):
+                totals['best'] = {'weight': weight, 'reps': reps, 'e1rm': round(e1rm, DIGITS)}
+
+    routine_key = workout.get('routine_id') or workout.get('name')
+    return {
+        'day': workout_day(workout),
+        'sets': sum(e['sets'] for e in exercises.values()),
+        'reps': sum(e['reps'] for e in exercises.values()),
+        'volume': sum(e['volume'] for e in exercises.values()),
+        'routine': (routine_key, workout.get('routine_name') or workout.get('name') or routine_key) if routine_key else None,
+        'exercises': exercises,
+    }
+
+
+def _truncated(entry, field):
+    return field in entry['truncated']
+
+
+def _check_recorded(stats, entry):
+    # Rollups written before truncation was recorded can't tell which lists dropped candidates
+    if 'truncated' not in entry:
+        entry['truncated'] = []
+        stats['stale'] = True
+
+
+def _add_candidate(entry, field, candidate, sort_key):
+    candidates = entry[field]
+    if _truncated(entry, field) and (not candidates or sort_key(candidate) <= sort_key(candidates[-1])):
+        return
+    candidates.append(candidate)
+    candidates.sort(key=sort_key, reverse=True)
+    if len(candidates) > TOP_CANDIDATES:
+        del candidates[TOP_CANDIDATES:]
+        entry['truncated'] = sorted(set(entry['truncated']) | {field})
+
+
+def _remove_candidates(entry, field, workout_id):
+    """Drop a workout's candidates. Returns True if a truncated list ran out, so the rollup is stale."""
+    entry[field] = [c for c in entry[field] if c['workout_id'] != workout_id]
+    return not entry[field] and _truncated(entry, field)
+
+
+def _recent_key(candidate):
+    return (candidate['date'] or '', candidate['workout_id'])
+
+
+def _best_key(candidate):
+    return (candidate['e1rm'], candidate['weight'], candidate['date'] or '')
+
+
+def _apply_totals(target, source, sign, fields):
+    for field in fields:
+        target[field] = round(target[field] + sign * source[field], DIGITS)
+
+
+def apply(stats, workout_id, workout, sign):
+    """Add (sign=1) or remove (sign=-1) a workout's contribution to stats, in place."""
+    c = contribution(workout)
+    stats['workouts'] += sign
+    _apply_totals(stats, c, sign, ('sets', 'reps', 'volume'))
+
+    if c['day'] is not None:
+        days = stats['days']
+        days[c['day']] = days.get(c['day'], 0) + sign
+        if days[c['day']] <= 0:
+            del days[c['day']]
+
+    recent = {'workout_id': workout_id, 'date': c['day']}
+    if c['routine'] is not None:
+        key, name = c['routine']
+        routine = stats['routines'].setdefault(key, {
+            'name': name, 'workouts': 0, 'sets': 0, 'volume': 0.0, 'recent': [], 'truncated': [],
+        })
+        _check_recorded(stats, routine)
+        routine['workouts'] += sign
+        _apply_totals(routine, c, sign, ('sets', 'volume'))
+        if sign > 0:
+            routine['name'] = name
+            _add_candidate(routine, 'recent', recent, _recent_key)
+        elif _remove_candidates(routine, 'recent', workout_id):
+            stats['stale'] = True
+        if routine['workouts'] <= 0:
+            del stats['routines'][key]
+        else:
+            routine['last_performed'] = routine['recent'][0]['date'] if routine['recent'] else None
+
+    for key, e in c['exercises'].items():
+        exercise = stats['exercises'].setdefault(key, {
+            'name': e['name'], 'workouts': 0, 'sets': 0, 'reps': 0, 'volume': 0.0, 'best_sets': [], 'recent': [],
+            'truncated': [],
+        })
+        _check_recorded(stats, exercise)
+        exercise['workouts'] += sign
+        _apply_totals(exercise, e, sign, ('sets', 'reps', 'volume'))
+        if sign > 0:
+            exercise['name'] = e['name']
+            _add_candidate(exercise, 'recent', recent, _recent_key)
+            if e['best'] is not None:
+                _add_candidate(exercise, 'best_sets', dict(e['best'], **recent), _best_key)
+        else:
+            for field in ('recent', 'best_sets'):
+                if _remove_candidates(exercise, field, workout_id):
+                    stats['stale'] = True
+        if exercise['workouts'] <= 0:
+            del stats['exercises'][key]
+        else:
+            exercise['best_set'] = exercise['best_sets'][0] if exercise['best_sets'] else None
+            exercise['last_performed'] = exercise['recent'][0]['date'] if exercise['recent'] else None
+
+    _update_streaks(stats)
+    return stats
+
+
+def _update_streaks(stats):
+    days = sorted(stats['days'])
+    stats['last_workout_date'] = days[-1] if days else None
+    streak = longest = 0
+    previous = None
+    for day in days:
+        current = date.fromisoformat(day)
+        streak = streak + 1 if previous is not None and current - previous == timedelta(days=1) else 1
+        longest = max(longest, streak)
+        previous = current
+    stats['streak'] = streak
+    stats['longest_streak'] = longest
+
+
+def current_streak(stats, today=None):
+    """The streak if it is still going (last workout today or yesterday), else 0."""
+    if not stats.get('last_workout_date'):
+        return 0
+    today = today or date.today()
+    last = date.fromisoformat(stats['last_workout_date'])
+    return stats['streak'] if (today - last).days <= 1 else 0
+
+
+def build(user_id, workouts):
+    """Rollup of a full history of (workout_id, workout) pairs."""
+    stats = empty(user_id)
+    for workout_id, workout in workouts:
+        apply(stats, workout_id, workout, 1)
+    return stats
+
+
+def compare(stored, expected):
+    """Differences between a stored rollup and one rebuilt from the history, as messages."""
+    differences = []
+    for field in ('workouts', 'sets', 'reps', 'volume', 'days', 'last_workout_date', 'streak', 'longest_streak'):
+        if not _same(stored.get(field), expected[field]):
+            differences.append(f"{field}: stored {stored.get(field)!r}, expected {expected[field]!r}")
+    if stored.get('stale'):
+        differences.append("marked stale")
+
+    checks = [
+        ('routines', ('workouts', 'sets', 'volume', 'last_performed')),
+        ('exercises', ('workouts', 'sets', 'reps', 'volume', 'last_performed', 'best_set')),
+    ]
+    for group, fields in checks:
+        stored_group, expected_group = stored.get(group) or {}, expected[group]
+        for key in sorted(set(stored_group) | set(expected_group)):
+            if key not in expected_group:
+                differences.append(f"{group}[{key!r}]: not in the history")
+                continue
+            if key not in stored_group:
+                differences.append(f"{group}[{key!r}]: missing")
+                continue
+            for field in fields:
+                if not _same(_comparable(stored_group[key].get(field), field), _comparable(expected_group[key].get(field), field)):
+                    differences.append(
+                        f"{group}[{key!r}].{field}: stored {stored_group[key].get(field)!r}, "
+                        f"expected {expected_group[key].get(field)!r}"
+                    )
+    return differences
+
+
+def _same(a, b):
+    # Incremental updates and a rebuild round in a different order
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return abs(a - b) <= 10 ** -DIGITS * 1.5
+    if isinstance(a, tuple) and isinstance(b, tuple):
+        return len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def _comparable(value, field):
+    # Two workouts can tie for the best set, and either is correct
+    if field == 'best_set' and value is not None:
+        return (value['e1rm'], value['weight'], value['reps'])
+    return value
@@ -0,0 +1,97 @@
+"""
+Coalescing of set appends to in-progress workouts.
+"""
+import threading
+
+
+class _Window:
+    def __init__(self):
+        self.sets = []
+        self.done = threading.Event()
+        self.flushing = False
+        self.value = None
+        self.error = None
+
+
+class SetBuffer:
+    """Collect the sets appended to each workout for delay seconds after the first one, then write
+    them all with one write(workout_id, sets) call. With a delay of 0, every append is written
+    immediately: in the caller's thread if it waits, otherwise on a thread of its own.
+
+    A window is also written as soon as it holds max_sets sets. Windows are written by timer and
+    writer threads; they aren't daemons, so windows still pending when the process exits are
+    written first.
+    """
+
+    def __init__(self, write, delay=0.0, max_sets=100):
+        self._write = write
+        self.delay = delay
+        self.max_sets = max_sets
+        self._windows = {}  # workout_id -> _Window
+        self._lock = threading.Lock()
+        self.appends = 0
+        self.writes = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def append(self, workout_id, sets, wait=True):
+        """Append sets to workout_id's window. With wait set, block until the window is written and
+        return write's result, or raise its exception; otherwise return None right away.
+        """
+        with self._lock:
+            self.appends += 1
+            window = self._windows.get(workout_id)
+            if window is None:
+                window = self._windows[workout_id] = _Window()
+                first = True
+            else:
+                self.coalesced += 1
+                first = False
+            window.sets.extend(sets)
+            full = len(window.sets) >= self.max_sets
+
+        if full or self.delay <= 0:
+            if wait:
+                self._flush(workout_id, window)
+            else:
+                threading.Thread(target=self._flush, args=(workout_id, window), name='set-writer').start()
+        elif first:
+            timer = threading.Timer(self.delay, self._flush, (workout_id, window))
+            timer.start()
+
+        if not wait:
+            return None
+        window.done.wait()
+        if window.error is not None:
+            raise window.error
+        return window.value
+
+    def _flush(self, workout_id, window):
+        with self._lock:
+            if window.flushing:
+                return
+            window.flushing = True
+            # Appends arriving from now on start a new window
+            if self._windows.get(workout_id) is window:
+                del self._windows[workout_id]
+            self.writes += 1
+
+        try:
+            window.value = self._write(workout_id, window.sets)
+        except Exception as e:
+            print(f"Error writing sets of workout {workout_id}: {e}")
+            window.error = e
+            with self._lock:
+                self.errors += 1
+        window.done.set()
+
+    def stats(self):
+        """Return append counters and the number of windows waiting to be written."""
+        with self._lock:
+            return {
+                'appends': self.appends,
+                'writes': self.writes,
+                'coalesced': self.coalesced,
+                'errors': self.errors,
+                'pending': len(self._windows),
+            }
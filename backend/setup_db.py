@@ -1,304 +1,162 @@
 """
 Script to set up initial data in Firebase for routines and exercises.
+
+Routines, the exercise catalog and the routine-exercise links are defined in a
+fixture file (fixtures/catalog.json by default). Links refer to routines and
+exercises by name. Every document gets a deterministic ID derived from its names,
+so loading the same fixture twice updates documents in place instead of
+duplicating them. Only documents that are new or changed are written, in
+batched commits. Links of the fixture's routines that are no longer in the
+fixture are deleted.
 """
-from firebase_handler import FirebaseHandler
+import argparse
+import json
+import os
+from datetime import datetime
 from dotenv import load_dotenv
+from firebase_handler import FirebaseHandler
+from migration import MigrationRunner, Write, deterministic_id
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Firebase
-firebase = FirebaseHandler()
+DEFAULT_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'catalog.json')
+
+def routine_id_for(name):
+    return deterministic_id('routine', name.strip().lower())
+
+def exercise_id_for(name):
+    # Same scheme as migrate_schema.py, so seeded and migrated catalog entries converge
+    return deterministic_id('exercise', name.strip().lower())
+
+def link_id_for(routine_id, exercise_id, occurrence):
+    # occurrence counts earlier links to the same exercise in the routine, so reordering a
+    # routine updates its links in place
+    return deterministic_id('link', routine_id, exercise_id, occurrence)
+
+def load_fixture(path=DEFAULT_FIXTURE):
+    """Read a fixture file and return the desired documents as {collection: {doc_id: data}}."""
+    with open(path) as f:
+        fixture = json.load(f)
+
+    routines = {routine_id_for(r['name']): dict(r) for r in fixture.get('routines', [])}
+    exercises = {exercise_id_for(e['name']): dict(e) for e in fixture.get('exercises', [])}
+
+    routine_exercises = {}
+    occurrences = {}
+    for link in sorted(fixture.get('routine_exercises', []), key=lambda link: link['order']):
+        routine_id = routine_id_for(link['routine'])
+        exercise_id = exercise_id_for(link['exercise'])
+        if routine_id not in routines:
+            raise ValueError(f"Link refers to unknown routine '{link['routine']}'")
+        if exercise_id not in exercises:
+            raise ValueError(f"Link refers to unknown exercise '{link['exercise']}'")
+
+        link_data = {k: v for k, v in link.items() if k not in ('routine', 'exercise')}
+        link_data['routine_id'] = routine_id
+        link_data['exercise_id'] = exercise_id
+        occurrence = occurrences[(routine_id, exercise_id)] = occurrences.get((routine_id, exercise_id), -1) + 1
+        routine_exercises[link_id_for(routine_id, exercise_id, occurrence)] = link_data
+
+    return {
+        'routines': routines,
+        'exercises': exercises,
+        'routine_exercises': routine_exercises,
+    }
 
-def setup_routines_and_exercises():
-    """Set up initial routines and exercises in Firebase using the new normalized schema."""
-    print("Setting up initial routines and exercises with normalized schema...")
-    
-    # Define sample routines
-    routines = [
-        {
-            "name": "Push",
-            "description": "Chest, shoulders, and triceps focused workout"
-        },
-        {
-            "name": "Pull",
-            "description": "Back and biceps focused workout"
-        },
-        {
-            "name": "Legs",
-            "description": "Lower body focused workout"
-        }
-    ]
-    
-    routine_ids = {}
-    
-    # Create routines
-    for routine in routines:
-        routine_id = firebase.create_routine(routine)
-        if routine_id:
-            routine_ids[routine["name"]] = routine_id
-            print(f"Created routine: {routine['name']} with ID: {routine_id}")
-    
-    # =========================================================================
-    # Step 1: Create Exercise Catalog (reusable exercise definitions)
-    # =========================================================================
-    print("\nCreating exercise catalog...")
-    exercise_catalog = [
-        {
-            "name": "Flat Bench Press",
-            "default_sets": 4,
-            "default_reps": 8,
-            "default_rep_time": 3,
-            "default_rest_time": 90
-        },
-        {
-            "name": "Overhead Press",
-            "default_sets": 3,
-            "default_reps": 10,
-            "default_rep_time": 2,
-            "default_rest_time": 60
-        },
-        {
-            "name": "Incline Dumbbell Press",
-            "default_sets": 3,
-            "default_reps": 12,
-            "default_rep_time": 2,
-            "default_rest_time": 60
-        },
-        {
-            "name": "Tricep Pushdowns",
-            "default_sets": 3,
-            "default_reps": 15,
-            "default_rep_time": 1,
-            "default_rest_time": 45
-        },
-        {
-            "name": "Barbell Rows",
-            "default_sets": 4,
-            "default_reps": 8,
-            "default_rep_time": 2,
-            "default_rest_time": 90
-        },
-        {
-            "name": "Pull-ups",
-            "default_sets": 3,
-            "default_reps": 10,
-            "default_rep_time": 2,
-            "default_rest_time": 60
-        },
-        {
-            "name": "Face Pulls",
-            "default_sets": 3,
-            "default_reps": 15,
-            "default_rep_time": 1,
-            "default_rest_time": 45
-        },
-        {
-            "name": "Barbell Curls",
-            "default_sets": 3,
-            "default_reps": 12,
-            "default_rep_time": 2,
-            "default_rest_time": 45
-        }
-    ]
-    
-    exercise_ids = {}
-    for exercise in exercise_catalog:
-        exercise_id = firebase.create_exercise(exercise)
-        if exercise_id:
-            exercise_ids[exercise["name"]] = exercise_id
-            print(f"Created catalog exercise: {exercise['name']} with ID: {exercise_id}")
-    
-    # =========================================================================
-    # Step 2: Create Routine-Exercise Links with specific settings
-    # =========================================================================
-    print("\nCreating routine-exercise links...")
-    
-    # Push routine exercises with explicit ordering
-    if "Push" in routine_ids and len(exercise_ids) > 0:
-        push_routine_exercises = [
-            {
-                "routine_id": routine_ids["Push"],
-                "exercise_id": exercise_ids["Flat Bench Press"],
-                "order": 1,  # First exercise in Push routine
-                "sets": 4,
-                "reps": 8,
-                "rest_time": 90,
-                "rep_time": 3
-            },
-            {
-                "routine_id": routine_ids["Push"],
-                "exercise_id": exercise_ids["Incline Dumbbell Press"],
-                "order": 2,  # Second exercise
-                "sets": 3,
-                "reps": 12,
-                "rest_time": 60,
-                "rep_time": 2
-            },
-            {
-                "routine_id": routine_ids["Push"],
-                "exercise_id": exercise_ids["Tricep Pushdowns"],
-                "order": 3,  # Third exercise
-                "sets": 3,
-                "reps": 15,
-                "rest_time": 45,
-                "rep_time": 1
-            },
-            {
-                "routine_id": routine_ids["Push"],
-                "exercise_id": exercise_ids["Overhead Press"],
-                "order": 4,  # Fourth exercise
-                "sets": 3,
-                "reps": 10,
-                "rest_time": 60,
-                "rep_time": 2
-            }
-        ]
-        
-        for re in push_routine_exercises:
-            re_id = firebase.create_routine_exercise(re)
-            if re_id:
-                # Find the exercise name by matching the ID
-                exercise_name = [name for name, id in exercise_ids.items() if id == re['exercise_id']][0]
-                print(f"Created routine-exercise link: {re['order']} - {exercise_name} with ID: {re_id}")
-    
-    # Pull routine exercises with explicit ordering
-    if "Pull" in routine_ids and len(exercise_ids) > 0:
-        pull_routine_exercises = [
-            {
-                "routine_id": routine_ids["Pull"],
-                "exercise_id": exercise_ids["Barbell Rows"],
-                "order": 1,
-                "sets": 4,
-                "reps": 8,
-                "rest_time": 90,
-                "rep_time": 2
-            },
-            {
-                "routine_id": routine_ids["Pull"],
-                "exercise_id": exercise_ids["Pull-ups"],
-                "order": 2,
-                "sets": 3,
-                "reps": 10,
-                "rest_time": 60,
-                "rep_time": 2
-            },
-            {
-                "routine_id": routine_ids["Pull"],
-                "exercise_id": exercise_ids["Face Pulls"],
-                "order": 3,
-                "sets": 3,
-                "reps": 15,
-                "rest_time": 45,
-                "rep_time": 1
-            },
-            {
-                "routine_id": routine_ids["Pull"],
-                "exercise_id": exercise_ids["Barbell Curls"],
-                "order": 4,
-                "sets": 3,
-                "reps": 12,
-                "rest_time": 45,
-                "rep_time": 2
-            }
-        ]
-        
-        for re in pull_routine_exercises:
-            re_id = firebase.create_routine_exercise(re)
-            if re_id:
-                # Find the exercise name by matching the ID
-                exercise_name = [name for name, id in exercise_ids.items() if id == re['exercise_id']][0]
-                print(f"Created routine-exercise link: {re['order']} - {exercise_name} with ID: {re_id}")
-    
-    # Add Legs exercises to catalog if not already added
-    legs_exercises_catalog = [
-        {
-            "name": "Squats",
-            "default_sets": 5,
-            "default_reps": 5,
-            "default_rep_time": 3,
-            "default_rest_time": 120
-        },
-        {
-            "name": "Romanian Deadlifts",
-            "default_sets": 3,
-            "default_reps": 8,
-            "default_rep_time": 3,
-            "default_rest_time": 90
-        },
-        {
-            "name": "Leg Press",
-            "default_sets": 3,
-            "default_reps": 12,
-            "default_rep_time": 2,
-            "default_rest_time": 60
-        },
-        {
-            "name": "Calf Raises",
-            "default_sets": 4,
-            "default_reps": 15,
-            "default_rep_time": 1,
-            "default_rest_time": 30
-        }
-    ]
-    
-    # Add any legs exercises not already in the catalog
-    for exercise in legs_exercises_catalog:
-        if exercise["name"] not in exercise_ids:
-            exercise_id = firebase.create_exercise(exercise)
-            if exercise_id:
-                exercise_ids[exercise["name"]] = exercise_id
-                print(f"Created catalog exercise: {exercise['name']} with ID: {exercise_id}")
-    
-    # Legs routine exercises with explicit ordering
-    if "Legs" in routine_ids and len(exercise_ids) > 0:
-        legs_routine_exercises = [
-            {
-                "routine_id": routine_ids["Legs"],
-                "exercise_id": exercise_ids["Squats"],
-                "order": 1,
-                "sets": 5,
-                "reps": 5,
-                "rest_time": 120,
-                "rep_time": 3
-            },
-            {
-                "routine_id": routine_ids["Legs"],
-                "exercise_id": exercise_ids["Romanian Deadlifts"],
-                "order": 2,
-                "sets": 3,
-                "reps": 8,
-                "rest_time": 90,
-                "rep_time": 3
-            },
-            {
-                "routine_id": routine_ids["Legs"],
-                "exercise_id": exercise_ids["Leg Press"],
-                "order": 3,
-                "sets": 3,
-                "reps": 12,
-                "rest_time": 60,
-                "rep_time": 2
-            },
-            {
-                "routine_id": routine_ids["Legs"],
-                "exercise_id": exercise_ids["Calf Raises"],
-                "order": 4,
-                "sets": 4,
-                "reps": 15,
-                "rest_time": 30,
-                "rep_time": 1
-            }
-        ]
-        
-        for re in legs_routine_exercises:
-            re_id = firebase.create_routine_exercise(re)
-            if re_id:
-                # Find the exercise name by matching the ID
-                exercise_name = [name for name, id in exercise_ids.items() if id == re['exercise_id']][0]
-                print(f"Created routine-exercise link: {re['order']} - {exercise_name} with ID: {re_id}")
-    
-    print("Setup complete!")
+def plan_fixture(firebase, desired):
+    """Compare the desired documents with Firestore.
+    Returns (writes, changes) where changes is a list of (action, collection, doc_id, data)
+    with action one of 'create', 'update', 'delete' or 'unchanged'.
+    """
+    now = datetime.now().isoformat()
+    writes = []
+    changes = []
+    changed_routines = set()
+
+    for collection, documents in desired.items():
+        existing = firebase._get_documents_by_ids(collection, list(documents))
+        for doc_id, data in documents.items():
+            current = existing.get(doc_id)
+            if current is None:
+                changes.append(('create', collection, doc_id, data))
+                writes.append(Write('set', collection, doc_id, dict(data, created_at=now, updated_at=now)))
+            elif any(current.get(field) != value for field, value in data.items()):
+                # Upsert: only the fixture's fields are overwritten, other fields are kept
+                changes.append(('update', collection, doc_id, data))
+                writes.append(Write('set', collection, doc_id, dict(data, updated_at=now), merge=True))
+            else:
+                changes.append(('unchanged', collection, doc_id, data))
+                continue
+
+            if collection == 'routines':
+                changed_routines.add(doc_id)
+            elif collection == 'routine_exercises':
+                changed_routines.add(data['routine_id'])
+            else:
+                changed_routines.update(
+                    link['routine_id'] for link in desired['routine_exercises'].values()
+                    if link['exercise_id'] == doc_id
+                )
+
+    # Links of the fixture's routines that the fixture no longer has
+    for routine_id in desired['routines']:
+        for doc in firebase.db.collection('routine_exercises').where('routine_id', '==', routine_id).stream():
+            if doc.id not in desired['routine_exercises']:
+                changes.append(('delete', 'routine_exercises', doc.id, doc.to_dict()))
+                writes.append(Write('delete', 'routine_exercises', doc.id))
+                changed_routines.add(routine_id)
+
+    # Routine plans of changed routines are rebuilt from the new data on their next read
+    writes += [Write('delete', 'routine_plans', routine_id) for routine_id in sorted(changed_routines)]
+    return writes, changes
+
+def print_changes(changes, desired):
+    """Print one line per new or changed document, naming links by their routine and exercise."""
+    routines = desired['routines']
+    exercises = desired['exercises']
+    for action, collection, doc_id, data in changes:
+        if action == 'unchanged':
+            continue
+        if collection == 'routine_exercises':
+            exercise = exercises.get(data['exercise_id'], {'name': data['exercise_id']})
+            label = f"{routines[data['routine_id']]['name']} #{data.get('order')} - {exercise['name']}"
+        else:
+            label = data['name']
+        print(f"  {action:<9} {collection:<17} {label} ({doc_id})")
+
+    counts = {}
+    for action, _, _, _ in changes:
+        counts[action] = counts.get(action, 0) + 1
+    print(", ".join(f"{count} {action}" for action, count in sorted(counts.items())) or "Nothing to load")
+
+def setup_routines_and_exercises(firebase=None, fixture_path=DEFAULT_FIXTURE, plan_only=False):
+    """Load routines, the exercise catalog and routine-exercise links from a fixture file.
+    With plan_only, print what would change without writing anything.
+    """
+    firebase = firebase or FirebaseHandler()
+    print(f"Loading routines and exercises from {fixture_path}...")
+
+    desired = load_fixture(fixture_path)
+    writes, changes = plan_fixture(firebase, desired)
+    print_changes(changes, desired)
+
+    if plan_only or not writes:
+        return changes
+
+    summary = MigrationRunner(firebase.db, workers=1, progress_interval=60).run(writes, label='setup')
+    firebase.cache.clear()
+    firebase.flights.forget()
+    if summary['failed_batches']:
+        print(f"{summary['failed_batches']} batches failed; run again to retry them.")
+    else:
+        print("Setup complete!")
+    return changes
 
 if __name__ == "__main__":
-    setup_routines_and_exercises()
+    parser = argparse.ArgumentParser(description="Load routines, exercises and routine-exercise links from a fixture file.")
+    parser.add_argument('--fixture', default=DEFAULT_FIXTURE, help='path to the fixture JSON file')
+    parser.add_argument('--plan', action='store_true', help='print what would change without writing anything')
+    args = parser.parse_args()
+
+    setup_routines_and_exercises(fixture_path=args.fixture, plan_only=args.plan)
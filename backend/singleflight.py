@@ -0,0 +1,164 @@
+"""
+Coalescing of concurrent identical reads.
+"""
+import asyncio
+import copy
+import threading
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; concurrent callers with the same key wait
+    for it and share its result, or its exception.
+
+    Waiters get deep copies of the result so callers can mutate what they get back.
+    forget() detaches in-flight calls so callers arriving after a write start a new one.
+    """
+
+    def __init__(self):
+        self._flights = {}  # key -> _Flight
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def do(self, key, fn):
+        """Return fn(), sharing a call already in flight for key if there is one."""
+        with self._lock:
+            self.calls += 1
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                flight = self._flights[key] = _Flight()
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.value)
+
+        try:
+            value = fn()
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self.errors += 1
+                self._detach(key, flight)
+            flight.done.set()
+            raise
+
+        with self._lock:
+            self._detach(key, flight)
+            waiters = flight.waiters
+        # No waiter can join once the flight is detached, so the count is final. Waiters copy
+        # from a private snapshot, since the leader's caller may mutate the value it gets back.
+        if waiters:
+            flight.value = copy.deepcopy(value)
+        flight.done.set()
+        return value
+
+    def _detach(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def forget(self, *keys):
+        """Detach in-flight calls for keys (all keys if none are given) from new callers."""
+        with self._lock:
+            if not keys:
+                self._flights.clear()
+            for key in keys:
+                self._flights.pop(key, None)
+
+    def stats(self):
+        """Return call counters and the number of calls in flight."""
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'executions': self.executions,
+                'coalesced': self.coalesced,
+                'errors': self.errors,
+                'in_flight': len(self._flights),
+            }
+
+
+class _AsyncFlight:
+    def __init__(self):
+        self.task = None
+        self.snapshot = None
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines on one event loop.
+
+    The call runs as its own task, so a caller that is cancelled (e.g. its client
+    disconnected) doesn't cancel it for the others.
+    """
+
+    def __init__(self):
+        self._flights = {}  # key -> _AsyncFlight
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    async def do(self, key, fn):
+        """Return await fn(), sharing a call already in flight for key if there is one."""
+        self.calls += 1
+        flight = self._flights.get(key)
+        if flight is not None:
+            flight.waiters += 1
+            self.coalesced += 1
+            await asyncio.shield(flight.task)
+            return copy.deepcopy(flight.snapshot)
+
+        flight = self._flights[key] = _AsyncFlight()
+        self.executions += 1
+        flight.task = asyncio.ensure_future(self._run(key, flight, fn))
+        # Marks the exception retrieved when every caller was cancelled
+        flight.task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return await asyncio.shield(flight.task)
+
+    async def _run(self, key, flight, fn):
+        try:
+            value = await fn()
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        # Detached, so the waiter count is final; waiters copy from a private snapshot
+        if flight.waiters:
+            flight.snapshot = copy.deepcopy(value)
+        return value
+
+    def forget(self, *keys):
+        """Detach in-flight calls for keys (all keys if none are given) from new callers."""
+        if not keys:
+            self._flights.clear()
+        for key in keys:
+            self._flights.pop(key, None)
+
+    def stats(self):
+        """Return call counters and the number of calls in flight."""
+        return {
+            'calls': self.calls,
+            'executions': self.executions,
+            'coalesced': self.coalesced,
+            'errors': self.errors,
+            'in_flight': len(self._flights),
+        }
@@ -0,0 +1,155 @@
+"""
+Text-to-speech service for workout announcements and routine intros.
+
+Synthesis is delegated to a pluggable engine (ElevenLabs, or a local stub that
+renders placeholder audio for development and tests). Every clip goes through
+the content-addressed AudioCache, so a phrase is only synthesized once per
+voice and settings.
+"""
+import io
+import math
+import os
+import struct
+import wave
+
+from audio_cache import AudioCache, audio_key
+
+
+class StubSynthesizer:
+    """Local engine that renders a short deterministic tone sized to the text, for development and tests."""
+
+    name = 'stub'
+    extension = 'wav'
+    mimetype = 'audio/wav'
+    default_voice_id = 'stub'
+    sample_rate = 8000
+
+    def voices(self):
+        return [{'voice_id': 'stub', 'name': 'Stub', 'category': 'local'}]
+
+    def settings(self):
+        return {}
+
+    def synthesize(self, text, voice_id):
+        # 60ms per character, at least half a second, at a pitch derived from the text
+        frames = max(self.sample_rate // 2, len(text) * self.sample_rate * 60 // 1000)
+        frequency = 300 + sum(text.encode('utf-8')) % 400
+        samples = b''.join(
+            struct.pack('<h', int(3000 * math.sin(2 * math.pi * frequency * i / self.sample_rate)))
+            for i in range(frames)
+        )
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(samples)
+        return buffer.getvalue()
+
+
+class ElevenLabsSynthesizer:
+    """ElevenLabs text-to-speech API."""
+
+    name = 'elevenlabs'
+    extension = 'mp3'
+    mimetype = 'audio/mpeg'
+    api_url = 'https://api.elevenlabs.io/v1'
+
+    def __init__(self, api_key, voice_id=None, model_id=None, timeout=30):
+        self.api_key = api_key
+        self.default_voice_id = voice_id or '21m00Tcm4TlvDq8ikWAM'
+        self.model_id = model_id or 'eleven_monolingual_v1'
+        self.timeout = timeout
+        self.voice_settings = {'stability': 0.5, 'similarity_boost': 0.75}
+
+    def voices(self):
+        # Imported on first use, to keep it off the startup path
+        import requests
+        response = requests.get(f"{self.api_url}/voices", headers={'xi-api-key': self.api_key}, timeout=self.timeout)
+        response.raise_for_status()
+        return [
+            {'voice_id': v['voice_id'], 'name': v['name'], 'category': v.get('category', '')}
+            for v in response.json().get('voices', [])
+        ]
+
+    def settings(self):
+        return {'model_id': self.model_id, 'voice_settings': self.voice_settings}
+
+    def synthesize(self, text, voice_id):
+        import requests
+        response = requests.post(
+            f"{self.api_url}/text-to-speech/{voice_id}",
+            headers={'xi-api-key': self.api_key, 'Accept': 'audio/mpeg'},
+            json={'text': text, 'model_id': self.model_id, 'voice_settings': self.voice_settings},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.content
+
+
+def synthesizer_from_env():
+    """Pick the engine from TTS_ENGINE, defaulting to ElevenLabs when an API key is configured.
+    Empty settings, as in .env.example, count as unset.
+    """
+    engine = (os.environ.get('TTS_ENGINE') or '').strip().lower() or None
+    api_key = (os.environ.get('ELEVENLABS_API_KEY') or '').strip() or None
+    if engine == 'stub' or (engine is None and not api_key):
+        return StubSynthesizer()
+    if engine not in (None, 'elevenlabs'):
+        raise ValueError(f"Unknown TTS_ENGINE '{engine}': use elevenlabs or stub")
+    if not api_key:
+        raise ValueError("TTS_ENGINE=elevenlabs requires ELEVENLABS_API_KEY")
+    return ElevenLabsSynthesizer(api_key, voice_id=os.environ.get('ELEVENLABS_VOICE_ID') or None)
+
+
+class SpeechService:
+    """Synthesize text through the audio cache."""
+
+    def __init__(self, synthesizer=None, cache=None):
+        self.synthesizer = synthesizer or synthesizer_from_env()
+        self.cache = cache or AudioCache(
+            os.environ.get('AUDIO_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'audio_cache')),
+            max_bytes=int(os.environ.get('AUDIO_CACHE_MAX_MB', 500)) * 1024 * 1024,
+        )
+
+    @property
+    def mimetype(self):
+        return self.synthesizer.mimetype
+
+    def voices(self):
+        return self.synthesizer.voices()
+
+    def key_for(self, text, voice_id=None):
+        voice_id = voice_id or self.synthesizer.default_voice_id
+        return audio_key(self.synthesizer.name, text, voice_id, self.synthesizer.settings())
+
+    def synthesize(self, text, voice_id=None):
+        """Return the cache filename for text, synthesizing it on a cache miss."""
+        voice_id = voice_id or self.synthesizer.default_voice_id
+        key = self.key_for(text, voice_id)
+        return self.cache.get_or_create(
+            key, self.synthesizer.extension, lambda: self.synthesizer.synthesize(text, voice_id)
+        )
+
+    def cached(self, text, voice_id=None):
+        """Return the cache filename for text if it has already been synthesized, else None."""
+        return self.cache.lookup(self.key_for(text, voice_id))
+
+    def path_for(self, filename):
+        return self.cache.path_for(filename)
+
+    def audio_url(self, filename):
+        return f"/api/audio/{filename}"
+
+
+def routine_intro_script(routine, exercises):
+    """Spoken introduction for a routine and its ordered exercises."""
+    names = [exercise['name'] for exercise in exercises]
+    script = f"Welcome to your {routine['name']} workout."
+    if routine.get('description'):
+        script += f" {routine['description']}."
+    if names:
+        listed = names[0] if len(names) == 1 else f"{', '.join(names[:-1])} and {names[-1]}"
+        script += f" Today you'll do {len(names)} exercises: {listed}."
+    script += " Take a moment to warm up, and let's get started."
+    return script
@@ -0,0 +1,454 @@
+"""
+SQLite storage backend implementing the part of the Firestore client API that
+FirebaseHandler uses (see storage.py).
+
+Documents are stored as JSON, one row per document, keyed by collection path and
+document ID. Expression indexes cover the fields the app filters and sorts on:
+user_id (with created_at for workout history paging), routine_id with order,
+exercise_id, and updated_at (alone, with user_id and with a tombstone's audience) for
+delta sync. File databases run in WAL mode, so readers never wait on writers,
+with one connection per thread. Batches commit in a single transaction.
+"""
+import json
+import pathlib
+import re
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from storage import transformed
+
+# Firestore allows at most 500 writes in a single batch
+BATCH_WRITE_LIMIT = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (collection, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS documents_user_id_created_at
+    ON documents (collection, json_extract(data, '$.user_id'), json_extract(data, '$.created_at'));
+CREATE INDEX IF NOT EXISTS documents_routine_id_order
+    ON documents (collection, json_extract(data, '$.routine_id'), json_extract(data, '$.order'));
+CREATE INDEX IF NOT EXISTS documents_exercise_id
+    ON documents (collection, json_extract(data, '$.exercise_id'));
+CREATE INDEX IF NOT EXISTS documents_updated_at
+    ON documents (collection, json_extract(data, '$.updated_at'));
+CREATE INDEX IF NOT EXISTS documents_user_id_updated_at
+    ON documents (collection, json_extract(data, '$.user_id'), json_extract(data, '$.updated_at'));
+CREATE INDEX IF NOT EXISTS documents_audience_updated_at
+    ON documents (collection, json_extract(data, '$.audience'), json_extract(data, '$.updated_at'));
+"""
+
+# Planner statistics assumed until ANALYZE (or PRAGMA optimize) measures real ones: few documents
+# per user, routine or exercise within a collection. Without them SQLite prefers scanning a whole
+# collection through the primary key over the field indexes.
+DEFAULT_STATISTICS = [
+    ('documents', '1000000 100000 1'),
+    ('documents_user_id_created_at', '1000000 100000 50 1'),
+    ('documents_routine_id_order', '1000000 100000 10 1'),
+    ('documents_exercise_id', '1000000 100000 10'),
+    ('documents_updated_at', '1000000 100000 1'),
+    ('documents_user_id_updated_at', '1000000 100000 50 1'),
+    ('documents_audience_updated_at', '1000000 100000 50 1'),
+]
+
+COMPARISON_OPERATORS = {'==': '=', '!=': '!=', '<': '<', '<=': '<=', '>': '>', '>=': '>='}
+
+FIELD_NAME_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$')
+
+
+def _field_expression(field_path):
+    # Field paths are inlined so the planner can match them against the expression indexes
+    if not FIELD_NAME_PATTERN.match(field_path):
+        raise ValueError(f"Unsupported field path: {field_path}")
+    return f"json_extract(data, '$.{field_path}')"
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _dumps(data):
+    return json.dumps(data, default=_json_default, separators=(',', ':'))
+
+
+def _deep_merge(target, updates):
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _deep_merge(target[key], value)
+        else:
+            target[key] = value
+
+
+def _get_field(data, field_path):
+    for part in field_path.split('.'):
+        if not isinstance(data, dict) or part not in data:
+            return None
+        data = data[part]
+    return data
+
+
+class SQLiteDocumentSnapshot:
+    """Snapshot of a single document."""
+
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return self._data
+
+    def get(self, field_path):
+        return _get_field(self._data, field_path)
+
+
+class SQLiteDocumentReference:
+    """Reference to a single document in a SQLiteStore."""
+
+    def __init__(self, store, collection_path, doc_id):
+        self._store = store
+        self._collection_path = collection_path
+        self.id = doc_id
+
+    @property
+    def path(self):
+        return f"{self._collection_path}/{self.id}"
+
+    def get(self, field_paths=None, transaction=None):
+        with self._store._connection() as conn:
+            row = conn.execute(
+                "SELECT data FROM documents WHERE collection = ? AND id = ?", (self._collection_path, self.id)
+            ).fetchone()
+        return SQLiteDocumentSnapshot(self, json.loads(row[0]) if row else None)
+
+    def set(self, document_data, merge=False):
+        with self._store._write() as conn:
+            self._set(conn, document_data, merge)
+
+    def _set(self, conn, document_data, merge=False):
+        if merge:
+            current = self._read(conn) or {}
+            _deep_merge(current, document_data)
+            document_data = current
+        conn.execute(
+            "INSERT OR REPLACE INTO documents (collection, id, data) VALUES (?, ?, ?)",
+            (self._collection_path, self.id, _dumps(document_data)),
+        )
+
+    def update(self, field_updates):
+        with self._store._write() as conn:
+            self._update(conn, field_updates)
+
+    def _update(self, conn, field_updates):
+        current = self._read(conn)
+        if current is None:
+            raise KeyError(f"No document to update: {self.path}")
+        for field_path, value in field_updates.items():
+            # Dotted paths update a nested field, like Firestore's update()
+            *parents, field = field_path.split('.')
+            target = current
+            for part in parents:
+                target = target.setdefault(part, {})
+            target[field] = transformed(target.get(field), value)
+        conn.execute(
+            "UPDATE documents SET data = ? WHERE collection = ? AND id = ?",
+            (_dumps(current), self._collection_path, self.id),
+        )
+
+    def delete(self):
+        with self._store._write() as conn:
+            self._delete(conn)
+
+    def _delete(self, conn):
+        conn.execute("DELETE FROM documents WHERE collection = ? AND id = ?", (self._collection_path, self.id))
+
+    def _read(self, conn):
+        row = conn.execute(
+            "SELECT data FROM documents WHERE collection = ? AND id = ?", (self._collection_path, self.id)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def collection(self, collection_id):
+        return SQLiteCollectionReference(self._store, f"{self.path}/{collection_id}")
+
+
+class SQLiteQuery:
+    """Query over a single collection, compiled to one SELECT."""
+
+    def __init__(self, store, collection_path, filters=None, orders=None, limit_count=None,
+                 start_after=None, projection=None):
+        self._store = store
+        self._collection_path = collection_path
+        self._filters = filters or []
+        self._orders = orders or []
+        self._limit = limit_count
+        self._start_after = start_after
+        self._projection = projection
+
+    def _copy(self, **overrides):
+        params = {
+            'filters': list(self._filters),
+            'orders': list(self._orders),
+            'limit_count': self._limit,
+            'start_after': self._start_after,
+            'projection': self._projection,
+        }
+        params.update(overrides)
+        return SQLiteQuery(self._store, self._collection_path, **params)
+
+    def where(self, field_path, op_string, value):
+        _field_expression(field_path)
+        return self._copy(filters=self._filters + [(field_path, op_string, value)])
+
+    def order_by(self, field_path, direction='ASCENDING'):
+        _field_expression(field_path)
+        return self._copy(orders=self._orders + [(field_path, direction)])
+
+    def limit(self, count):
+        return self._copy(limit_count=count)
+
+    def start_after(self, document_snapshot):
+        return self._copy(start_after=document_snapshot)
+
+    def select(self, field_paths):
+        return self._copy(projection=list(field_paths))
+
+    def _compile(self):
+        clauses = ["collection = ?"]
+        params = [self._collection_path]
+
+        for field_path, op_string, value in self._filters:
+            expression = _field_expression(field_path)
+            if op_string in COMPARISON_OPERATORS:
+                clauses.append(f"{expression} {COMPARISON_OPERATORS[op_string]} ?")
+                params.append(value)
+            elif op_string in ('in', 'not-in'):
+                placeholders = ', '.join('?' * len(value))
+                negation = 'NOT ' if op_string == 'not-in' else ''
+                clauses.append(f"{expression} {negation}IN ({placeholders})")
+                params.extend(value)
+            elif op_string in ('array_contains', 'array_contains_any'):
+                values = [value] if op_string == 'array_contains' else list(value)
+                placeholders = ', '.join('?' * len(values))
+                clauses.append(
+                    f"EXISTS (SELECT 1 FROM json_each(data, '$.{field_path}') WHERE value IN ({placeholders}))"
+                )
+                params.extend(values)
+            else:
+                raise ValueError(f"Unsupported operator: {op_string}")
+
+        # Like Firestore, documents without an ordered field are left out, and ties break on the
+        # document ID in the direction of the last ordering
+        keys = []
+        for field_path, direction in self._orders:
+            expression = _field_expression(field_path)
+            clauses.append(f"{expression} IS NOT NULL")
+            keys.append((expression, direction == 'DESCENDING', field_path))
+        keys.append(('id', keys[-1][1] if keys else False, None))
+
+        if self._start_after is not None:
+            cursor = [
+                self._start_after.id if field_path is None else self._start_after.get(field_path)
+                for _, _, field_path in keys
+            ]
+            alternatives = []
+            for i, (expression, descending, _) in enumerate(keys):
+                terms = [f"{keys[j][0]} = ?" for j in range(i)]
+                terms.append(f"{expression} {'<' if descending else '>'} ?")
+                alternatives.append(f"({' AND '.join(terms)})")
+                params.extend(cursor[:i + 1])
+            clauses.append(f"({' OR '.join(alternatives)})")
+
+        sql = f"SELECT id, data FROM documents WHERE {' AND '.join(clauses)} ORDER BY "
+        sql += ', '.join(f"{expression} {'DESC' if descending else 'ASC'}" for expression, descending, _ in keys)
+        if self._limit is not None:
+            sql += " LIMIT ?"
+            params.append(self._limit)
+        return sql, params
+
+    def stream(self, transaction=None):
+        sql, params = self._compile()
+        with self._store._connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        for doc_id, data in rows:
+            data = json.loads(data)
+            if self._projection is not None:
+                data = {field: data[field] for field in self._projection if field in data}
+            reference = SQLiteDocumentReference(self._store, self._collection_path, doc_id)
+            yield SQLiteDocumentSnapshot(reference, data)
+
+    def get(self, transaction=None):
+        return list(self.stream(transaction=transaction))
+
+    def on_snapshot(self, callback):
+        raise NotImplementedError("Snapshot listeners (CATALOG_MIRROR) are not supported by the SQLite backend")
+
+
+class SQLiteCollectionReference(SQLiteQuery):
+    """Reference to a collection in a SQLiteStore."""
+
+    def __init__(self, store, collection_path):
+        super().__init__(store, collection_path)
+        self.id = collection_path.rsplit('/', 1)[-1]
+
+    def document(self, document_id=None):
+        return SQLiteDocumentReference(self._store, self._collection_path, document_id or uuid.uuid4().hex)
+
+
+class SQLiteWriteBatch:
+    """Batch of writes committed in one transaction."""
+
+    def __init__(self, store):
+        self._store = store
+        self._writes = []
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append(lambda conn: reference._set(conn, document_data, merge))
+
+    def update(self, reference, field_updates):
+        self._writes.append(lambda conn: reference._update(conn, field_updates))
+
+    def delete(self, reference):
+        self._writes.append(reference._delete)
+
+    def commit(self):
+        if len(self._writes) > BATCH_WRITE_LIMIT:
+            raise ValueError(f"A batch can contain at most {BATCH_WRITE_LIMIT} writes")
+        with self._store._write() as conn:
+            for write in self._writes:
+                write(conn)
+        self._writes = []
+
+
+class SQLiteTransaction(SQLiteWriteBatch):
+    """Transaction run by run(fn) (see storage.py). The database write lock is held from fn's
+    first read until the writes commit, so nothing can change what it read.
+    """
+
+    def run(self, fn):
+        with self._store._write() as conn:
+            result = fn(self)
+            if len(self._writes) > BATCH_WRITE_LIMIT:
+                raise ValueError(f"A transaction can contain at most {BATCH_WRITE_LIMIT} writes")
+            for write in self._writes:
+                write(conn)
+        self._writes = []
+        return result
+
+
+class SQLiteStore:
+    """Firestore-compatible document store in a SQLite database file, or in memory for ':memory:'."""
+
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        if path == ':memory:':
+            # One connection shared by all threads, since every connection to ':memory:' is a new database
+            self._shared = self._connect(':memory:', uri=False)
+            self._shared_lock = threading.RLock()
+        else:
+            self._uri = pathlib.Path(path).absolute().as_uri()
+            self._shared = None
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+            self._seed_statistics(conn)
+
+    def _seed_statistics(self, conn):
+        conn.execute("ANALYZE sqlite_master")  # Creates sqlite_stat1 if it doesn't exist
+        if conn.execute("SELECT 1 FROM sqlite_stat1 WHERE tbl = 'documents'").fetchone():
+            return
+        conn.executemany(
+            "INSERT INTO sqlite_stat1 (tbl, idx, stat) VALUES ('documents', ?, ?)", DEFAULT_STATISTICS
+        )
+        conn.execute("ANALYZE sqlite_master")  # Reloads the statistics
+
+    def _connect(self, database, uri):
+        # Autocommit; writes open their own transactions
+        conn = sqlite3.connect(database, uri=uri, timeout=30, isolation_level=None, check_same_thread=False)
+        if database != ':memory:':
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA mmap_size = 268435456")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        if self._shared is not None:
+            with self._shared_lock:
+                yield self._shared
+            return
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect(self._uri, uri=True)
+        yield conn
+
+    @contextmanager
+    def _write(self):
+        """Run writes in one immediate transaction, rolled back if any of them fails."""
+        with self._write_lock, self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def collection(self, collection_path):
+        return SQLiteCollectionReference(self, collection_path)
+
+    def document(self, document_path):
+        collection_path, doc_id = document_path.rsplit('/', 1)
+        return SQLiteDocumentReference(self, collection_path, doc_id)
+
+    def batch(self):
+        return SQLiteWriteBatch(self)
+
+    def transaction(self):
+        return SQLiteTransaction(self)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        references = list(references)
+        found = {}
+        by_collection = {}
+        for reference in references:
+            by_collection.setdefault(reference._collection_path, []).append(reference.id)
+        with self._connection() as conn:
+            for collection_path, doc_ids in by_collection.items():
+                placeholders = ', '.join('?' * len(doc_ids))
+                rows = conn.execute(
+                    f"SELECT id, data FROM documents WHERE collection = ? AND id IN ({placeholders})",
+                    [collection_path] + doc_ids,
+                ).fetchall()
+                for doc_id, data in rows:
+                    found[(collection_path, doc_id)] = data
+        for reference in references:
+            data = found.get((reference._collection_path, reference.id))
+            yield SQLiteDocumentSnapshot(reference, json.loads(data) if data is not None else None)
+
+    def close(self):
+        """Close this thread's connection (or the shared in-memory one), updating planner statistics
+        that have drifted first.
+        """
+        if self._shared is not None:
+            self._shared.close()
+            return
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.execute("PRAGMA optimize")
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,121 @@
+"""
+Storage backend selection.
+
+FirebaseHandler talks to its database through the subset of the Firestore client
+API below, so any object implementing it can stand in for Firestore:
+
+- client: collection(path), document(path), batch(), get_all(references)
+- collections and queries: document(id=None), where(field, op, value) with ==, !=,
+  <, <=, >, >=, in, not-in, array_contains and array_contains_any, order_by(field,
+  direction), limit(n), start_after(snapshot), select(fields), stream(), get()
+- documents: get(), set(data, merge=False), update(fields), delete(), collection(id); update()
+  accepts ArrayUnion transforms as values (see array_union)
+- snapshots: id, exists, reference, to_dict(), get(field)
+- batches: set(), update(), delete(), commit()
+- transactions: client.transaction() returns one with set(), update() and delete() like a
+  batch; reads join it by passing transaction= to get(), stream() or get_all(). Firestore
+  transactions run through firestore.transactional; other backends' transactions provide
+  run(fn), which calls fn(transaction) and commits its writes atomically with its reads
+  (see run_transaction in firebase_handler.py)
+
+Snapshot listeners (on_snapshot) are only needed by the catalog mirror.
+
+STORAGE_BACKEND picks the backend: "firestore" (the default) or "sqlite", which
+stores documents in the SQLite database at SQLITE_PATH (see sqlite_store.py).
+FirebaseHandler opens it through a LazyClient on first use, not at startup.
+"""
+import os
+import threading
+
+STORAGE_BACKENDS = ('firestore', 'sqlite')
+
+DEFAULT_SQLITE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ai_trainer.db')
+
+
+class ArrayUnion:
+    """Stand-in for Firestore's ArrayUnion transform where its client library isn't installed."""
+
+    def __init__(self, values):
+        self.values = list(values)
+
+
+_array_union_class = None
+
+
+def array_union(values):
+    """An update() value appending to a list field the values it doesn't already contain, so the write
+    carries only those values. It is Firestore's ArrayUnion when the client library is installed; the
+    other backends accept either.
+    """
+    global _array_union_class
+    if _array_union_class is None:
+        try:
+            from google.cloud.firestore import ArrayUnion as FirestoreArrayUnion
+            _array_union_class = FirestoreArrayUnion
+        except ImportError:
+            _array_union_class = ArrayUnion
+    return _array_union_class(values)
+
+
+def transformed(current, value):
+    """The value a field with value current takes when update() sets it to value."""
+    if type(value).__name__ != 'ArrayUnion':
+        return value
+    result = list(current) if isinstance(current, list) else []
+    for item in value.values:
+        if item not in result:
+            result.append(item)
+    return result
+
+
+def storage_backend():
+    """Return the configured backend name."""
+    backend = os.environ.get('STORAGE_BACKEND', 'firestore').strip().lower() or 'firestore'
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown STORAGE_BACKEND '{backend}' (expected one of: {', '.join(STORAGE_BACKENDS)})")
+    return backend
+
+
+def storage_from_env():
+    """Open the configured storage, or return None for Firestore, which FirebaseHandler initializes itself."""
+    if storage_backend() == 'sqlite':
+        # Imported here so Firestore deployments never load it
+        from sqlite_store import SQLiteStore
+        return SQLiteStore(os.environ.get('SQLITE_PATH') or DEFAULT_SQLITE_PATH)
+    return None
+
+
+class LazyClient:
+    """Client that is opened by calling open() on its first use, so that a process can start serving
+    before it has credentials parsed and a connection set up. Safe to share between threads: open()
+    runs once, and if it raises, the next use tries again.
+    """
+
+    def __init__(self, open):
+        self._open = open
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def connected(self):
+        return self._client is not None
+
+    def connect(self):
+        """Open the client if it isn't open yet, and return it."""
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._open()
+                client = self._client
+        return client
+
+    def close(self):
+        """Close the client if it was ever opened."""
+        client = self._client
+        close = getattr(client, 'close', None)
+        if close is not None:
+            close()
+
+    def __getattr__(self, name):
+        return getattr(self.connect(), name)
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""
+Script to delete routine_exercises links whose routine or catalog exercise no longer exists.
+"""
+import sys
+from dotenv import load_dotenv
+from firebase_handler import FirebaseHandler
+
+# Load environment variables
+load_dotenv()
+
+def sweep_orphans(dry_run=False):
+    """Find orphaned routine-exercise links and delete them unless dry_run is set."""
+    firebase = FirebaseHandler()
+    
+    orphans = firebase.sweep_orphaned_routine_exercises(dry_run=dry_run)
+    action = "Found" if dry_run else "Deleted"
+    print(f"{action} {len(orphans)} orphaned routine-exercise links.")
+    for routine_exercise_id in orphans:
+        print(f"  {routine_exercise_id}")
+
+if __name__ == "__main__":
+    sweep_orphans(dry_run='--dry-run' in sys.argv)
@@ -0,0 +1,124 @@
+"""
+Delta sync: which documents changed or were deleted since a client's last sync.
+
+Every write through FirebaseHandler stamps updated_at, and every delete of a
+synced document leaves a tombstone (in the tombstones collection) stamped the
+same way. A sync reads each source (routines, exercises, routine_exercises, the
+user's workouts and the tombstones) in updated_at order from a Position, and
+answers with what it found plus the Position to continue from, encoded as an
+opaque cursor.
+
+Stamps come from the writers' clocks and a write may commit a moment after it is
+stamped, so a cursor never moves past SETTLE_SECONDS before the sync: documents
+changed within that window are sent again on the next sync rather than missed.
+Clients apply changes by ID, so repeats are harmless.
+
+Tombstones are kept for TOMBSTONE_RETENTION_DAYS. A cursor older than that can't
+be answered with a delta and gets a full sync instead, as does a first sync.
+"""
+import base64
+import binascii
+import json
+import os
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+# Collections every client mirrors; workouts are synced per user
+SYNCED_COLLECTIONS = ('routines', 'exercises', 'routine_exercises')
+
+TOMBSTONES = 'tombstones'
+
+# Tombstone audience of catalog deletes; workout tombstones carry their user's ID
+EVERYONE = '*'
+
+SETTLE_SECONDS = float(os.environ.get('SYNC_SETTLE_SECONDS', '') or 5)
+
+TOMBSTONE_RETENTION_DAYS = float(os.environ.get('TOMBSTONE_RETENTION_DAYS', '') or 30)
+
+# Documents read per source per sync
+PAGE_SIZE = 500
+
+# Sync from everything with updated_at >= timestamp, or > timestamp when after is set
+Position = namedtuple('Position', ['timestamp', 'after'])
+
+START = Position('', False)
+
+
+def encode(position):
+    payload = json.dumps([position.timestamp, position.after], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode(cursor):
+    """Position of a cursor from encode; raises ValueError if it is malformed."""
+    try:
+        timestamp, after = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid sync cursor: {cursor}") from e
+    if not isinstance(timestamp, str) or not isinstance(after, bool):
+        raise ValueError(f"Invalid sync cursor: {cursor}")
+    return Position(timestamp, after)
+
+
+def expired(position, now):
+    """Whether tombstones of deletes after position may already have been removed."""
+    return position.timestamp < (now - timedelta(days=TOMBSTONE_RETENTION_DAYS)).isoformat()
+
+
+def tombstone(collection, document_id, audience=EVERYONE, now=None):
+    """ID and data of the tombstone recording a deleted document."""
+    now = now or datetime.now()
+    return f"{collection}:{document_id}", {
+        'collection': collection,
+        'document_id': document_id,
+        'audience': audience,
+        'updated_at': now.isoformat(),
+        # For a Firestore TTL policy on the tombstones collection
+        'expire_at': now + timedelta(days=TOMBSTONE_RETENTION_DAYS),
+    }
+
+
+def is_tie(documents, position, page_size=PAGE_SIZE):
+    """Whether a source's page holds nothing but documents stamped exactly at position, so paging by
+    updated_at can't advance through it; the caller must read all of them.
+    """
+    return (not position.after and len(documents) > page_size
+            and documents[page_size - 1]['updated_at'] == position.timestamp)
+
+
+def assemble(pages, position, now, page_size=PAGE_SIZE):
+    """Merge the pages read from each source from position into a response.
+    pages maps a source name (a collection, or TOMBSTONES) to its documents in updated_at order,
+    each with its 'id', read with a limit of page_size + 1. Returns (changes, deleted, next position,
+    whether more pages follow); changes maps collections to documents, deleted to document IDs.
+    """
+    settled = (now - timedelta(seconds=SETTLE_SECONDS)).isoformat()
+    # Sources that filled their page end at their page_size-th document; everything up to the
+    # earliest of those ends can be sent
+    ends = [docs[page_size - 1]['updated_at'] for docs in pages.values() if len(docs) > page_size]
+    if not ends:
+        keep = lambda stamp: True
+        has_more = False
+        next_position = Position(settled, False) if settled > position.timestamp else position
+    elif min(ends) == position.timestamp and not position.after:
+        # More than a page stamped at the same instant: the caller read all of them
+        keep = lambda stamp: stamp == position.timestamp
+        has_more = True
+        next_position = Position(position.timestamp, True)
+    else:
+        boundary = min(ends)
+        if position.timestamp < settled < boundary:
+            boundary = settled
+        keep = lambda stamp: stamp < boundary
+        has_more = True
+        next_position = Position(boundary, False)
+
+    changes = {name: [doc for doc in docs if keep(doc['updated_at'])] for name, docs in pages.items() if name != TOMBSTONES}
+    present = {(name, doc['id']) for name, docs in changes.items() for doc in docs}
+    deleted = {}
+    for doc in pages.get(TOMBSTONES, []):
+        key = (doc['collection'], doc['document_id'])
+        # A document recreated after its delete is sent as changed
+        if keep(doc['updated_at']) and key not in present:
+            deleted.setdefault(doc['collection'], []).append(doc['document_id'])
+    return changes, deleted, next_position, has_more
@@ -0,0 +1,63 @@
+"""
+Shared fixtures: a FirebaseHandler on the in-memory FakeFirestore, and a test
+client for the Flask app serving from one.
+
+Run from the backend directory with `python -m pytest`.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Set before app is imported, which reads some of them at import time
+os.environ.update(
+    TTS_ENGINE='stub',
+    AUDIO_CACHE_DIR=tempfile.mkdtemp(prefix='audio-cache-'),
+    ACCESS_LOG='false',
+    CATALOG_MIRROR='false',
+    PRELOAD_CATALOG='false',
+    AUDIO_PRERENDER='false',
+    PROFILE_TOKEN='',
+)
+
+from fake_firestore import FakeFirestore
+from firebase_handler import FirebaseHandler
+
+
+@pytest.fixture
+def db():
+    return FakeFirestore()
+
+
+@pytest.fixture
+def handler(db):
+    firebase = FirebaseHandler(db=db)
+    yield firebase
+    firebase.close()
+
+
+@pytest.fixture
+def app_module(db):
+    """The app module with its services created on db."""
+    import app
+    app.init_services(db=db, warm_up_in_background=False)
+    yield app
+    app.shutdown_services()
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+def workout(day, exercise='bench', weight=100, reps=5, routine_id='routine-1', **fields):
+    """A workout on 2024-01-<day> with one set of exercise."""
+    return dict({
+        'date': f"2024-01-{day:02d}",
+        'routine_id': routine_id,
+        'name': 'Push',
+        'exercises': [{'exercise_id': exercise, 'name': exercise.title(), 'sets': [{'reps': reps, 'weight': weight}]}],
+    }, **fields)
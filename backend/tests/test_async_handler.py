@@ -0,0 +1,80 @@
+import asyncio
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+import metrics
+from async_firebase_handler import AsyncFirebaseHandler
+from cache import TTLCache
+from fake_firestore import FakeAsyncFirestore, seed_routine
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def async_handler(latency=0.01):
+    db = FakeAsyncFirestore(latency=latency)
+    seed_routine(db, 'r1', 3)
+    return db, AsyncFirebaseHandler(db=db, cache=TTLCache())
+
+
+def test_concurrent_misses_share_one_fetch():
+    db, firebase = async_handler()
+
+    async def main():
+        return await asyncio.gather(*(firebase.get_exercises('r1') for _ in range(5)))
+
+    results = asyncio.run(main())
+    # One links query and one get_all, however many callers missed
+    assert db.round_trips == 2
+    assert all(result == results[0] for result in results) and len(results[0]) == 3
+    results[1][0]['name'] = 'Changed'
+    assert results[2][0]['name'] == 'Exercise 0'
+    assert firebase.flights.stats()['coalesced'] == 4
+
+
+def test_callers_after_a_write_start_a_new_fetch():
+    db, firebase = async_handler()
+
+    async def main():
+        first = asyncio.ensure_future(firebase.get_exercise('r1-exercise-0'))
+        await asyncio.sleep(0)
+        db.load('exercises', {'r1-exercise-0': {'name': 'Renamed'}})
+        firebase.cache.invalidate(('exercise', 'r1-exercise-0'))
+        second = await firebase.get_exercise('r1-exercise-0')
+        return await first, second
+
+    _, second = asyncio.run(main())
+    assert second['name'] == 'Renamed'
+    assert firebase.flights.stats()['executions'] == 2
+
+
+def test_reads_are_counted_per_request():
+    _, firebase = async_handler(latency=0)
+
+    async def main():
+        stats, token = metrics.start_request('test')
+        try:
+            await firebase.get_exercises('r1')
+        finally:
+            metrics.end_request(token)
+        return stats
+
+    stats = asyncio.run(main())
+    assert stats.round_trips == 2
+    assert dict(stats.reads) == {'routine_exercises': 3, 'exercises': 3}
+
+
+@pytest.mark.parametrize('env, init_failed', [
+    ({'TTS_ENGINE': 'elevenlabs', 'ELEVENLABS_API_KEY': ''}, True),
+    ({'STORAGE_BACKEND': 'bogus'}, False),
+])
+def test_asgi_starts_when_services_fail(env, init_failed):
+    code = "import asgi; print(f'RESULT {asgi.async_firebase()} {asgi.flask_module._init_error is not None}')"
+    result = subprocess.run([sys.executable, '-c', code], cwd=BACKEND, capture_output=True, text=True,
+                            env=dict(os.environ, **env))
+    assert result.returncode == 0, result.stderr
+    # The warm-up thread may print its error on the same line
+    assert re.search(r'RESULT (\w+) (True|False)', result.stdout).groups() == ('None', str(init_failed))
@@ -0,0 +1,71 @@
+import threading
+
+from audio_cache import AudioCache, audio_key
+
+
+def test_workers_share_the_cache_directory(tmp_path):
+    # Two gunicorn workers: each builds its index once, at startup
+    first, second = AudioCache(str(tmp_path)), AudioCache(str(tmp_path))
+    key = audio_key('stub', 'Push-ups', 'voice')
+    renders = []
+
+    filename = first.get_or_create(key, 'mp3', lambda: renders.append(1) or b'audio')
+    assert second.lookup(key) == filename
+    assert second.get_or_create(key, 'mp3', lambda: renders.append(1) or b'audio') == filename
+    assert renders == [1]
+    assert second.stats()['files'] == 1 and second.stats()['bytes'] == 5
+
+
+def test_evicted_file_is_rendered_again(tmp_path):
+    first, second = AudioCache(str(tmp_path)), AudioCache(str(tmp_path))
+    key = audio_key('stub', 'Squats', 'voice')
+    filename = first.get_or_create(key, 'mp3', lambda: b'audio')
+    assert second.lookup(key) == filename
+
+    (tmp_path / filename[:2] / filename).unlink()
+    assert second.lookup(key) is None
+    assert second.get_or_create(key, 'mp3', lambda: b'again') == filename
+    assert (tmp_path / filename[:2] / filename).read_bytes() == b'again'
+
+
+def test_failed_render_releases_the_key(tmp_path):
+    cache = AudioCache(str(tmp_path))
+
+    def render():
+        raise RuntimeError('engine down')
+
+    for _ in range(2):
+        try:
+            cache.get_or_create('ab' * 32, 'mp3', render)
+        except RuntimeError:
+            pass
+    assert cache._key_locks == {}
+
+
+def test_concurrent_misses_render_once(tmp_path):
+    cache = AudioCache(str(tmp_path))
+    renders = []
+    started = threading.Event()
+
+    def render():
+        renders.append(1)
+        started.wait(1)
+        return b'audio'
+
+    threads = [threading.Thread(target=cache.get_or_create, args=('cd' * 32, 'mp3', render)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    started.set()
+    for thread in threads:
+        thread.join()
+    assert renders == [1]
+
+
+def test_audio_endpoint_serves_files_from_other_workers(client, app_module):
+    other_worker = AudioCache(app_module.speech.cache.directory)
+    filename = other_worker.get_or_create(audio_key('stub', 'Lunges', 'voice'), 'mp3', lambda: b'audio')
+    response = client.get(f'/api/audio/{filename}')
+    assert response.status_code == 200
+    assert response.data == b'audio'
+    response.close()
+    assert client.get(f"/api/audio/{filename.replace('.mp3', '.wav')}").status_code == 404
@@ -0,0 +1,75 @@
+import time
+
+from cache import TTLCache
+
+
+def test_lru_eviction():
+    cache = TTLCache(max_entries=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') == (False, None)
+    assert cache.get('a') == (True, 1)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire(monkeypatch):
+    cache = TTLCache(ttl=10)
+    now = time.monotonic()
+    cache.set('a', 1)
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 11)
+    assert cache.get('a') == (False, None)
+
+
+def test_values_are_copied():
+    cache = TTLCache()
+    value = {'sets': [1]}
+    cache.set('a', value)
+    value['sets'].append(2)
+    cache.get('a')[1]['sets'].append(3)
+    assert cache.get('a') == (True, {'sets': [1]})
+
+
+def test_tag_invalidation():
+    cache = TTLCache()
+    cache.set('list', [1], tags=[('exercise', 'x')])
+    cache.set('other', [2], tags=[('exercise', 'y')])
+    cache.invalidate_tag(('exercise', 'x'))
+    assert cache.get('list') == (False, None)
+    assert cache.get('other') == (True, [2])
+
+
+def test_reads_that_raced_with_an_invalidation_are_not_stored():
+    cache = TTLCache()
+    since = cache.generation()
+    cache.invalidate('a')
+    cache.set('a', 'stale', since=since)
+    since = cache.generation()
+    cache.invalidate_tag(('exercise', 'x'))
+    cache.set('b', 'stale', tags=[('exercise', 'x')], since=since)
+    assert cache.get('a') == (False, None)
+    assert cache.get('b') == (False, None)
+    assert cache.stats()['stale_sets'] == 2
+
+    since = cache.generation()
+    cache.set('a', 'fresh', since=since)
+    assert cache.get('a') == (True, 'fresh')
+
+
+def test_reads_are_cached_until_a_write(handler, db):
+    routine_id = handler.create_routine({'name': 'Push'})
+    exercise_id = handler.create_exercise({'name': 'Bench'})
+    handler.create_routine_exercise({'routine_id': routine_id, 'exercise_id': exercise_id, 'order': 1})
+
+    handler.get_routine(routine_id)
+    handler.get_exercises(routine_id)
+    db.reset_counters()
+    assert handler.get_routine(routine_id)['name'] == 'Push'
+    assert [e['name'] for e in handler.get_exercises(routine_id)] == ['Bench']
+    assert db.round_trips == 0
+
+    handler.update_routine(routine_id, {'name': 'Push A'})
+    handler.update_exercise(exercise_id, {'name': 'Bench Press'})
+    assert handler.get_routine(routine_id)['name'] == 'Push A'
+    assert [e['name'] for e in handler.get_exercises(routine_id)] == ['Bench Press']
@@ -0,0 +1,125 @@
+from collections import Counter
+
+import pytest
+
+import sync
+from fake_firestore import FakeFirestore, FakeWriteBatch
+from migration import AdaptiveRateLimiter, MigrationRunner, Write
+
+
+class ResourceExhausted(Exception):
+    """Named like the google.api_core error Firestore raises when it throttles."""
+
+
+class RecordingBatch(FakeWriteBatch):
+    def __init__(self, client):
+        super().__init__(client)
+        self.paths = []
+
+    def set(self, reference, document_data, merge=False):
+        self.paths.append(f"{reference._collection_path}/{reference.id}")
+        super().set(reference, document_data, merge)
+
+    def delete(self, reference):
+        self.paths.append(f"{reference._collection_path}/{reference.id}")
+        super().delete(reference)
+
+    def commit(self):
+        self._client.attempts += 1
+        error = self._client.errors.pop(0) if self._client.errors else None
+        if error:
+            raise error
+        super().commit()
+        self._client.committed.append(self.paths)
+
+
+class RecordingFirestore(FakeFirestore):
+    """Records the documents of every committed batch; commit attempts raise the queued errors first
+    (None lets an attempt through).
+    """
+
+    def __init__(self, errors=()):
+        super().__init__()
+        self.errors = list(errors)
+        self.attempts = 0
+        self.committed = []
+
+    def batch(self):
+        return RecordingBatch(self)
+
+
+def fast_limiter():
+    return AdaptiveRateLimiter(start_rate=1000.0, max_rate=1000.0)
+
+
+def runner(db, **options):
+    options.setdefault('rate_limiter', fast_limiter())
+    return MigrationRunner(db, workers=1, **options)
+
+
+def sets(count):
+    return [Write('set', 'exercises', f"e{i}", {'name': f"Exercise {i}"}) for i in range(count)]
+
+
+def test_interrupted_run_resumes_without_committing_twice(tmp_path):
+    checkpoint = str(tmp_path / 'checkpoint.json')
+    writes = sets(1200)
+    # The second batch fails with an error that isn't retried, as if the run was interrupted there
+    db = RecordingFirestore(errors=[None, RuntimeError('connection reset')])
+
+    first = runner(db, checkpoint_path=checkpoint).run(writes)
+    assert (first['committed_batches'], first['failed_batches']) == (2, 1)
+
+    second = runner(db, checkpoint_path=checkpoint).run(writes)
+    assert (second['skipped_batches'], second['committed_batches'], second['failed_batches']) == (2, 1, 0)
+    assert runner(db, checkpoint_path=checkpoint).run(writes)['committed_batches'] == 0
+
+    committed = Counter(path for batch in db.committed for path in batch)
+    assert set(committed.values()) == {1}
+    assert len(committed) == 1200
+
+
+def test_batches_count_tombstones_toward_the_write_limit():
+    deletes = [Write('delete', 'exercises', f"e{i}") for i in range(300)]
+    batches = list(runner(FakeFirestore()).batches(deletes + sets(100)))
+    assert [len(chunk) for _, chunk in batches] == [250, 150]
+    assert [sum(write.cost for write in chunk) for _, chunk in batches] == [500, 200]
+
+    # A delete that would take a full batch to 501 writes starts the next one
+    batches = list(runner(FakeFirestore()).batches(sets(499) + deletes[:1]))
+    assert [len(chunk) for _, chunk in batches] == [499, 1]
+
+
+def test_deletes_commit_with_their_tombstones_within_the_limit():
+    db = RecordingFirestore()
+    runner(db).run(sets(300))
+    summary = runner(db).run([Write('delete', 'exercises', f"e{i}") for i in range(300)])
+    assert (summary['committed_batches'], summary['failed_batches']) == (2, 0)
+    assert max(len(batch) for batch in db.committed) == 500
+    assert len(list(db.collection(sync.TOMBSTONES).stream())) == 300
+    assert list(db.collection('exercises').stream()) == []
+
+
+def test_throttled_commits_are_retried_with_backoff():
+    db = RecordingFirestore(errors=[ResourceExhausted('quota'), ResourceExhausted('quota')])
+    limiter = fast_limiter()
+    summary = runner(db, rate_limiter=limiter).run(sets(10))
+    assert (summary['committed_batches'], summary['failed_batches']) == (1, 0)
+    assert db.attempts == 3
+    # Halved twice, then one step back up after the successful commit
+    assert limiter.rate == pytest.approx(1000.0 / 4 + limiter.increase_step)
+    assert len(list(db.collection('exercises').stream())) == 10
+
+
+@pytest.mark.parametrize('errors, attempts', [
+    ([RuntimeError('permission denied')], 1),
+    ([ResourceExhausted('quota')] * 3, 3),
+])
+def test_commit_gives_up(errors, attempts, tmp_path):
+    checkpoint = str(tmp_path / 'checkpoint.json')
+    db = RecordingFirestore(errors=errors)
+    summary = runner(db, checkpoint_path=checkpoint, max_retries=2).run(sets(10))
+    assert (summary['committed_batches'], summary['failed_batches']) == (0, 1)
+    assert db.attempts == attempts
+    # Nothing was recorded as done, so the next run commits the batch
+    assert runner(db, checkpoint_path=checkpoint).run(sets(10))['committed_batches'] == 1
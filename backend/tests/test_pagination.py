@@ -0,0 +1,73 @@
+from conftest import workout
+
+
+def create_workouts(handler, count):
+    # created_at comes from the clock, so workouts are created oldest first
+    return [handler.create_workout('u1', workout(day)) for day in range(1, count + 1)]
+
+
+def test_pages_are_newest_first_and_complete(handler):
+    ids = create_workouts(handler, 7)
+    handler.create_workout('u2', workout(1))
+
+    pages, cursor = [], None
+    while True:
+        page, cursor = handler.get_workouts_page('u1', 3, start_after=cursor)
+        pages.append([w['id'] for w in page])
+        if cursor is None:
+            break
+    assert pages == [ids[6:3:-1], ids[3:0:-1], ids[:1]]
+
+
+def test_projection(handler):
+    create_workouts(handler, 2)
+    page, _ = handler.get_workouts_page('u1', 10, fields=['name', 'exercise_count'])
+    assert all(set(w) == {'id', 'name', 'exercise_count'} for w in page)
+    assert [w['exercise_count'] for w in page] == [1, 1]
+
+
+def test_workouts_endpoint_pages(client, app_module):
+    ids = create_workouts(app_module.firebase, 3)
+    first = client.get('/api/workouts?user_id=u1&limit=2').json
+    assert [w['id'] for w in first['workouts']] == ids[:0:-1]
+    second = client.get(f"/api/workouts?user_id=u1&limit=2&start_after={first['next_cursor']}").json
+    assert [w['id'] for w in second['workouts']] == ids[:1]
+    assert second['next_cursor'] is None
+
+
+def strip_exercise_count(db, workout_id):
+    # Workouts saved before exercise_count was stored
+    ref = db.collection('workouts').document(workout_id)
+    data = ref.get().to_dict()
+    del data['exercise_count']
+    ref.set(data)
+
+
+def test_projection_counts_exercises_of_old_workouts(handler, db):
+    ids = create_workouts(handler, 2)
+    strip_exercise_count(db, ids[0])
+    page, _ = handler.get_workouts_page('u1', 10, fields=['name', 'exercise_count'])
+    assert [w['exercise_count'] for w in page] == [1, 1]
+
+
+def test_backfill_stores_exercise_count(handler, db):
+    import migrate_schema
+
+    ids = create_workouts(handler, 2)
+    strip_exercise_count(db, ids[0])
+    summary = migrate_schema.backfill_exercise_counts(db, workers=1, checkpoint_path=None)
+    assert summary['committed_writes'] == 1
+    assert db.collection('workouts').document(ids[0]).get().to_dict()['exercise_count'] == 1
+    assert migrate_schema.backfill_exercise_counts(db, workers=1, checkpoint_path=None) is None
+
+
+def test_workouts_endpoint_errors(client, app_module, monkeypatch):
+    create_workouts(app_module.firebase, 1)
+    assert client.get('/api/workouts?user_id=u1&limit=2&start_after=missing').status_code == 400
+
+    class BrokenClient:
+        def collection(self, name):
+            raise RuntimeError('The query requires an index')
+
+    monkeypatch.setattr(app_module.firebase, 'db', BrokenClient())
+    assert client.get('/api/workouts?user_id=u1&limit=2').status_code == 500
@@ -0,0 +1,99 @@
+from datetime import date
+
+import rollups
+from conftest import workout
+
+
+def test_incremental_rollup_matches_rebuild(handler):
+    ids = [handler.create_workout('u1', workout(day, weight=60 + day)) for day in range(1, 12)]
+    handler.update_workout(ids[0], {'exercises': [{'exercise_id': 'squat', 'name': 'Squat', 'sets': [{'reps': 3, 'weight': 140}]}]})
+    for workout_id in ids[-3:]:
+        assert handler.delete_workout(workout_id)
+
+    assert handler.check_user_stats('u1') == []
+    stats = handler.get_user_stats('u1')
+    assert stats['workouts'] == 8
+    assert stats['exercises']['bench']['best_set']['weight'] == 68
+    assert stats['exercises']['squat']['best_set']['weight'] == 140
+
+
+def test_deleting_every_best_set_candidate_rebuilds(handler):
+    ids = [handler.create_workout('u1', workout(day, weight=60 + day)) for day in range(1, 12)]
+    for workout_id in ids[-rollups.TOP_CANDIDATES - 1:]:
+        handler.delete_workout(workout_id)
+
+    stats = handler.get_user_stats('u1')
+    assert not stats['stale']
+    assert stats['exercises']['bench']['best_set']['weight'] == 65
+    assert handler.check_user_stats('u1') == []
+
+
+def test_incomplete_sets_are_ignored():
+    data = workout(1)
+    data['exercises'][0]['sets'].append({'reps': 5, 'weight': 200, 'completed': False})
+    stats = rollups.build('u1', [('w1', data)])
+    assert stats['sets'] == 1
+    assert stats['volume'] == 500
+    assert stats['exercises']['bench']['best_set']['weight'] == 100
+
+
+def test_removing_every_workout_empties_the_rollup():
+    history = [(f"w{day}", workout(day, weight=50 + day)) for day in range(1, 6)]
+    stats = rollups.build('u1', history)
+    for workout_id, data in history:
+        rollups.apply(stats, workout_id, data, -1)
+    assert (stats['workouts'], stats['sets'], stats['volume']) == (0, 0, 0)
+    assert stats['days'] == {} and stats['exercises'] == {} and stats['routines'] == {}
+    assert not stats['stale']
+
+
+def test_streaks():
+    stats = rollups.build('u1', [(f"w{day}", workout(day)) for day in (1, 2, 3, 5, 6)])
+    assert stats['streak'] == 2
+    assert stats['longest_streak'] == 3
+    assert rollups.current_streak(stats, today=date(2024, 1, 7)) == 2
+    assert rollups.current_streak(stats, today=date(2024, 1, 8)) == 0
+
+
+def test_candidates_below_a_truncated_list_are_not_guessed(handler):
+    ids = {weight: handler.create_workout('u1', workout(day, weight=weight))
+           for day, weight in enumerate((100, 90, 80, 70, 60, 50, 40), start=1)}
+    for weight in (100, 90, 80, 70):
+        handler.delete_workout(ids[weight])
+    # 50 was dropped from the list when it was full, so 45 can't be placed after 60
+    handler.create_workout('u1', workout(8, weight=45))
+    handler.delete_workout(ids[60])
+
+    assert handler.get_user_stats('u1')['exercises']['bench']['best_set']['weight'] == 50
+    assert handler.check_user_stats('u1') == []
+
+
+def test_backdated_workouts_keep_last_performed_right(handler):
+    ids = [handler.create_workout('u1', workout(day)) for day in range(10, 17)]
+    for workout_id in ids[-4:]:
+        handler.delete_workout(workout_id)
+    handler.create_workout('u1', workout(1))
+    handler.delete_workout(ids[2])
+
+    stats = handler.get_user_stats('u1')
+    assert stats['exercises']['bench']['last_performed'] == '2024-01-11'
+    assert stats['routines']['routine-1']['last_performed'] == '2024-01-11'
+    assert handler.check_user_stats('u1') == []
+
+
+def test_updating_a_candidate_of_a_truncated_list_stays_incremental():
+    history = [(f"w{day}", workout(day, weight=50 + day)) for day in range(1, 9)]
+    stats = rollups.build('u1', history)
+    workout_id, data = history[-1]
+    rollups.apply(stats, workout_id, data, -1)
+    rollups.apply(stats, workout_id, dict(data, name='Renamed'), 1)
+    assert not stats['stale']
+    assert stats['exercises']['bench']['best_set']['weight'] == 58
+
+
+def test_rollups_without_truncation_recorded_are_rebuilt():
+    stats = rollups.build('u1', [(f"w{day}", workout(day)) for day in range(1, 4)])
+    for entry in list(stats['routines'].values()) + list(stats['exercises'].values()):
+        del entry['truncated']
+    rollups.apply(stats, 'w4', workout(4), 1)
+    assert stats['stale']
@@ -0,0 +1,83 @@
+import pytest
+
+import logged_sets
+from conftest import workout
+from fake_firestore import FakeTransaction
+from firebase_handler import FirebaseHandler
+from sqlite_store import SQLiteStore
+
+
+def logged(set_id, exercise='bench', reps=5, weight=100):
+    return {'exercise_id': exercise, 'name': exercise.title(), 'set_id': set_id, 'reps': reps, 'weight': weight}
+
+
+def test_appended_sets_are_folded_into_exercises(handler):
+    workout_id = handler.create_workout('u1', workout(1))
+    assert handler.log_workout_sets(workout_id, [logged('a'), logged('b', 'squat')]) == ['a', 'b']
+    assert handler.log_workout_sets(workout_id, [logged('b', 'squat'), logged('c')]) == ['c']
+
+    exercises = handler.get_workout(workout_id)['exercises']
+    assert [(e['exercise_id'], [s.get('set_id') for s in e['sets']]) for e in exercises] == [
+        ('bench', [None, 'a', 'c']), ('squat', ['b'])]
+    assert handler.get_workouts('u1')[0]['exercises'] == exercises
+    page, _ = handler.get_workouts_page('u1', 10, fields=['exercises', 'exercise_count'])
+    assert page[0]['exercises'] == exercises and page[0]['exercise_count'] == 2
+    assert handler.check_user_stats('u1') == []
+
+
+def test_an_append_writes_only_the_new_sets(handler, db, monkeypatch):
+    workout_id = handler.create_workout('u1', workout(1))
+    handler.log_workout_sets(workout_id, [logged('a')])
+    updates = []
+    original = FakeTransaction.update
+    monkeypatch.setattr(FakeTransaction, 'update', lambda self, reference, fields: (
+        updates.append(fields), original(self, reference, fields)))
+
+    handler.log_workout_sets(workout_id, [logged('b')])
+    assert len(updates) == 1 and 'exercises' not in updates[0]
+    assert [s['set_id'] for s in updates[0][logged_sets.FIELD].values] == ['b']
+    stored = db.collection('workouts').document(workout_id).get().to_dict()
+    assert stored['exercises'] == workout(1)['exercises']
+    assert [s['set_id'] for s in stored[logged_sets.FIELD]] == ['a', 'b']
+
+
+def test_sqlite_store_applies_the_append(tmp_path):
+    store = SQLiteStore(str(tmp_path / 'sets.db'))
+    handler = FirebaseHandler(db=store)
+    try:
+        workout_id = handler.create_workout('u1', workout(1))
+        handler.log_workout_sets(workout_id, [logged('a')])
+        handler.log_workout_sets(workout_id, [logged('a'), logged('b')])
+        sets = handler.get_workout(workout_id)['exercises'][0]['sets']
+        assert [s.get('set_id') for s in sets] == [None, 'a', 'b']
+    finally:
+        handler.close()
+        store.close()
+
+
+def test_saving_exercises_replaces_logged_sets(handler):
+    workout_id = handler.create_workout('u1', workout(1))
+    handler.log_workout_sets(workout_id, [logged('a')])
+    edited = handler.get_workout(workout_id)['exercises']
+    edited[0]['sets'].pop(0)
+    handler.update_workout(workout_id, {'exercises': edited})
+
+    assert handler.get_workout(workout_id)['exercises'] == edited
+    assert handler.get_user_stats('u1')['sets'] == 1
+    assert handler.check_user_stats('u1') == []
+
+
+def test_unknown_workout_raises(handler):
+    with pytest.raises(KeyError):
+        handler.log_workout_sets('missing', [logged('a')])
+
+
+@pytest.mark.parametrize('headers', [{}, {'Prefer': 'respond-async'}])
+def test_endpoint(client, app_module, headers):
+    workout_id = app_module.firebase.create_workout('u1', workout(1))
+    response = client.post(f"/api/workouts/{workout_id}/sets", json={'sets': [logged('a')]}, headers=headers)
+    assert response.status_code == (202 if headers else 201)
+
+    response = client.post('/api/workouts/missing/sets', json={'sets': [logged('a')]}, headers=headers)
+    assert response.status_code == 404
+    assert response.json == {'error': 'Workout not found'}
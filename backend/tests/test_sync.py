@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import sync
+from conftest import workout
+
+
+@pytest.fixture(autouse=True)
+def no_settle_window(monkeypatch):
+    monkeypatch.setattr(sync, 'SETTLE_SECONDS', 0)
+
+
+def changed_ids(result, collection):
+    return sorted(doc['id'] for doc in result['changes'].get(collection, []))
+
+
+def test_cursor_round_trip():
+    position = sync.Position('2024-01-01T00:00:00', True)
+    assert sync.decode(sync.encode(position)) == position
+    with pytest.raises(ValueError):
+        sync.decode('not-a-cursor')
+
+
+def test_delta_after_full_sync(handler):
+    routine_id = handler.create_routine({'name': 'Push'})
+    first = handler.get_changes(None, user_id='u1')
+    assert first['full']
+    assert changed_ids(first, 'routines') == [routine_id]
+
+    mine = handler.create_workout('u1', workout(1))
+    handler.create_workout('u2', workout(1))
+    handler.update_routine(routine_id, {'name': 'Push A'})
+    delta = handler.get_changes(first['position'], user_id='u1')
+    assert not delta['full']
+    assert changed_ids(delta, 'workouts') == [mine]
+    assert [r['name'] for r in delta['changes']['routines']] == ['Push A']
+
+
+def test_deletes_are_sent_as_tombstones_to_their_audience(handler):
+    routine_id = handler.create_routine({'name': 'Push'})
+    mine = handler.create_workout('u1', workout(1))
+    position = handler.get_changes(None, user_id='u1')['position']
+
+    handler.delete_workout(mine)
+    handler.delete_routine(routine_id)
+    delta = handler.get_changes(position, user_id='u1')
+    assert delta['deleted'] == {'workouts': [mine], 'routines': [routine_id]}
+    assert handler.get_changes(position, user_id='u2')['deleted'] == {'routines': [routine_id]}
+
+
+def test_paging_returns_every_document_once(handler):
+    for i in range(23):
+        handler.create_exercise({'name': f"Exercise {i}"})
+    seen, result = [], handler.get_changes(None, page_size=5)
+    while True:
+        seen += changed_ids(result, 'exercises')
+        if not result['has_more']:
+            break
+        result = handler.get_changes(result['position'], page_size=5)
+    assert len(seen) == len(set(seen)) == 23
+
+
+def test_documents_stamped_at_a_page_boundary_are_all_sent(handler, db):
+    now = datetime.now().isoformat()
+    for i in range(12):
+        db.collection('exercises').document(f"tie-{i}").set({'name': 'Tie', 'updated_at': now})
+    result = handler.get_changes(sync.Position(now, False), page_size=5)
+    assert len(result['changes']['exercises']) == 12
+    assert result['has_more'] and result['position'] == sync.Position(now, True)
+
+
+def test_expired_cursor_gets_a_full_sync(handler):
+    old = sync.Position((datetime.now() - timedelta(days=sync.TOMBSTONE_RETENTION_DAYS + 1)).isoformat(), False)
+    assert handler.get_changes(old)['full']
+
+
+def test_sync_endpoint_rejects_malformed_cursors(client):
+    assert client.get('/api/sync?since=garbage').status_code == 400
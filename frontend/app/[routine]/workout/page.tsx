@@ -4,7 +4,7 @@ import { useState, useEffect } from 'react'
 import { useParams, useRouter } from 'next/navigation'
 import Link from 'next/link'
 import Image from 'next/image'
-import { getRoutine, getExercisesByRoutine, formatRestTime, generateRoutineIntro, generateAnnouncement } from '@/lib/api'
+import { getRoutinePlan, getRoutineAudioManifest, formatRestTime, generateRoutineIntro, generateAnnouncement } from '@/lib/api'
 import type { Exercise, Routine } from '@/lib/api'
 import AudioPlayer from '@/components/AudioPlayer'
 
@@ -489,15 +489,23 @@ export default function WorkoutPage() {
         }
       });
       
-      // Set up browser TTS for exercise and rest announcements
+      // Use pre-rendered audio where the backend has it, and browser TTS for the rest
       try {
+        const manifest = await getRoutineAudioManifest(routineId);
+        const audios: Record<string, string> = {};
         const allFallbacks: Record<string, string> = {};
         announcementsToGenerate.forEach(item => {
-          allFallbacks[item.key] = item.text;
+          const audioUrl = manifest?.cues[item.key]?.audio_url;
+          if (audioUrl) {
+            audios[item.key] = audioUrl;
+          } else {
+            allFallbacks[item.key] = item.text;
+          }
         });
         
+        setAnnouncementAudios(audios);
         setFallbackAnnouncements(allFallbacks);
-        console.log('Browser TTS ready for exercise and rest announcements');
+        console.log('Announcements ready:', Object.keys(audios).length, 'pre-rendered,', Object.keys(allFallbacks).length, 'browser TTS');
         
       } catch (error) {
         console.warn('Error setting up TTS announcements');
@@ -557,12 +565,15 @@ export default function WorkoutPage() {
       try {
         setLoading(true)
         
-        const routineData = await getRoutine(routineId)
-        if (!routineData) {
+        // The plan carries the routine and its ordered exercises in one response
+        const plan = await getRoutinePlan(routineId)
+        if (!plan) {
           router.push('/')
           return
         }
         
+        const routineData = plan.routine
+        
         setRoutine(routineData)
         
         // Check for existing warmup audio and set it, or try to generate new audio
@@ -584,7 +595,7 @@ export default function WorkoutPage() {
           }
         }
         
-        const exercisesData = await getExercisesByRoutine(routineId)
+        const exercisesData = plan.exercises
         
         // Set first exercise info for warmup screen
         if (exercisesData.length > 0) {
@@ -4,23 +4,53 @@ import React, { useEffect, useState } from "react";
 import Link from "next/link";
 import { Button } from "@/components/ui/button";
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
-import { getUserWorkouts, Workout } from "@/lib/workout-api";
+import { getUserWorkoutsPage, Workout } from "@/lib/workout-api";
 import { CalendarIcon, PlusIcon, Dumbbell } from "lucide-react";
 import { format } from "date-fns";
 
 // Mock user ID - in a real app, you would get this from authentication
 const MOCK_USER_ID = "user123";
 
+// The list only needs summary fields, not each workout's full exercise data
+const PAGE_SIZE = 20;
+const SUMMARY_FIELDS = ["name", "date", "exercise_count", "created_at"];
+
 export default function WorkoutsPage() {
   const [workouts, setWorkouts] = useState<Workout[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [loadMoreError, setLoadMoreError] = useState<string | null>(null);
+
+  async function loadMore() {
+    setLoadingMore(true);
+    setLoadMoreError(null);
+    try {
+      const page = await getUserWorkoutsPage(MOCK_USER_ID, {
+        limit: PAGE_SIZE,
+        cursor: nextCursor,
+        fields: SUMMARY_FIELDS,
+      });
+      setWorkouts((current) => [...current, ...page.workouts]);
+      setNextCursor(page.nextCursor);
+    } catch (err) {
+      setLoadMoreError("Failed to load more workouts");
+      console.error(err);
+    } finally {
+      setLoadingMore(false);
+    }
+  }
 
   useEffect(() => {
     async function fetchWorkouts() {
       try {
-        const data = await getUserWorkouts(MOCK_USER_ID);
-        setWorkouts(data);
+        const page = await getUserWorkoutsPage(MOCK_USER_ID, {
+          limit: PAGE_SIZE,
+          fields: SUMMARY_FIELDS,
+        });
+        setWorkouts(page.workouts);
+        setNextCursor(page.nextCursor);
         setLoading(false);
       } catch (err) {
         setError("Failed to load workouts");
@@ -111,13 +141,22 @@ export default function WorkoutsPage() {
                   {format(new Date(workout.date), "PPP")}
                 </div>
                 <div className="text-sm">
-                  {workout.exercises?.length || 0} exercises
+                  {workout.exercise_count ?? workout.exercises?.length ?? 0} exercises
                 </div>
               </CardContent>
             </Card>
           </Link>
         ))}
       </div>
+
+      {nextCursor && (
+        <div className="flex flex-col items-center gap-2 mt-6">
+          {loadMoreError && <p className="text-red-500">{loadMoreError}</p>}
+          <Button variant="outline" onClick={loadMore} disabled={loadingMore}>
+            {loadingMore ? "Loading..." : "Load More"}
+          </Button>
+        </div>
+      )}
     </div>
   );
 }
@@ -99,6 +99,14 @@ export interface Routine {
   updated_at: string;
 }
 
+// Routine with its ordered exercises, served from a single precomputed document
+export interface RoutinePlan {
+  id: string;
+  routine: Routine;
+  exercises: Exercise[];
+  updated_at: string;
+}
+
 export interface RoutineWithExercises extends Routine {
   exercises: Exercise[];
   duration: number; // Calculated based on exercises
@@ -128,6 +136,38 @@ export async function getRoutine(routineId: string): Promise<Routine | null> {
   }
 }
 
+// Fetch a routine together with its ordered exercises in one request
+export async function getRoutinePlan(routineId: string): Promise<RoutinePlan | null> {
+  try {
+    const response = await fetchWithErrorHandling(`${API_BASE_URL}/routines/${routineId}/plan`);
+    const data = await response.json();
+    return data.plan;
+  } catch (error) {
+    console.error(`Error fetching routine plan ${routineId}:`, error);
+    return null;
+  }
+}
+
+// Text and pre-rendered audio for every cue played during a routine
+export interface AudioManifest {
+  routine_id: string;
+  cues: Record<string, { text: string; audio_url: string | null }>;
+  ready: number;
+  total: number;
+}
+
+// Fetch a routine's audio manifest so its cues can be prefetched in one request
+export async function getRoutineAudioManifest(routineId: string): Promise<AudioManifest | null> {
+  try {
+    const response = await fetchWithErrorHandling(`${API_BASE_URL}/routines/${routineId}/audio-manifest`);
+    const data = await response.json();
+    return data.manifest;
+  } catch (error) {
+    console.error(`Error fetching audio manifest for routine ${routineId}:`, error);
+    return null;
+  }
+}
+
 // Fetch exercises for a specific routine
 export async function getExercisesByRoutine(routineId: string): Promise<Exercise[]> {
   try {
@@ -178,6 +218,30 @@ export async function getRoutineExercises(routineId: string): Promise<RoutineExe
   }
 }
 
+// Result for one item of a batch create request
+export interface BatchItemResult {
+  index: number;
+  id: string;
+  status: 'created' | 'failed';
+  error?: string;
+}
+
+// Save all of a routine's exercise links in one request
+export async function createRoutineExercisesBatch(
+  routineExercises: Omit<RoutineExercise, 'id' | 'created_at' | 'updated_at'>[]
+): Promise<BatchItemResult[]> {
+  const response = await fetchWithErrorHandling(
+    `${API_BASE_URL}/routine-exercises:batch`,
+    {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ items: routineExercises })
+    }
+  );
+  const data = await response.json();
+  return data.results;
+}
+
 // Fetch a routine with its exercises
 export async function getRoutineWithExercises(routineId: string): Promise<RoutineWithExercises | null> {
   try {
@@ -8,10 +8,22 @@ export interface Workout {
   date: string;
   exercises: Exercise[];
   notes?: string;
+  exercise_count?: number;
   created_at?: string;
   updated_at?: string;
 }
 
+export interface WorkoutsPage {
+  workouts: Workout[];
+  nextCursor: string | null;
+}
+
+export interface WorkoutsPageOptions {
+  limit?: number;
+  cursor?: string | null;
+  fields?: string[];
+}
+
 export interface Exercise {
   name: string;
   sets: Set[];
@@ -43,6 +55,35 @@ export async function getUserWorkouts(userId: string): Promise<Workout[]> {
   }
 }
 
+// Get one page of a user's workouts, newest first
+export async function getUserWorkoutsPage(
+  userId: string,
+  { limit = 20, cursor, fields }: WorkoutsPageOptions = {}
+): Promise<WorkoutsPage> {
+  try {
+    const params = new URLSearchParams({ user_id: userId, limit: String(limit) });
+    if (cursor) {
+      params.set('start_after', cursor);
+    }
+    if (fields && fields.length > 0) {
+      params.set('fields', fields.join(','));
+    }
+    
+    const response = await fetch(`${API_BASE_URL}/workouts?${params.toString()}`);
+    
+    if (!response.ok) {
+      throw new Error(`Error: ${response.status}`);
+    }
+    
+    const data = await response.json();
+    return { workouts: data.workouts || [], nextCursor: data.next_cursor || null };
+  } catch (error) {
+    // Rethrown so the list can tell a failed page from the end of the history
+    console.error('Failed to fetch workouts page:', error);
+    throw error;
+  }
+}
+
 // Get a specific workout
 export async function getWorkout(workoutId: string): Promise<Workout | null> {
   try {
@@ -119,6 +160,44 @@ export async function updateWorkout(
   }
 }
 
+export interface LoggedSet extends Set {
+  exercise_id?: string;
+  name?: string;
+  set_id?: string;
+}
+
+// Append sets to a workout in progress instead of resending the whole workout.
+// Give each set a set_id (or pass an idempotencyKey) so retries aren't logged twice.
+// Returns the set_ids that were appended, or null if the request failed.
+export async function logWorkoutSets(
+  workoutId: string,
+  sets: LoggedSet[],
+  idempotencyKey?: string
+): Promise<string[] | null> {
+  try {
+    const headers: Record<string, string> = { 'Content-Type': 'application/json' };
+    if (idempotencyKey) {
+      headers['Idempotency-Key'] = idempotencyKey;
+    }
+
+    const response = await fetch(`${API_BASE_URL}/workouts/${workoutId}/sets`, {
+      method: 'POST',
+      headers,
+      body: JSON.stringify({ sets }),
+    });
+
+    if (!response.ok) {
+      throw new Error(`Error: ${response.status}`);
+    }
+
+    const data = await response.json();
+    return data.appended || [];
+  } catch (error) {
+    console.error(`Failed to log sets for workout ${workoutId}:`, error);
+    return null;
+  }
+}
+
 // Delete a workout
 export async function deleteWorkout(workoutId: string): Promise<boolean> {
   try {